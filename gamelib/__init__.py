@@ -5,25 +5,42 @@ The GameState class in game_state.py is the main class most players interact wit
 It contains functions that let you get information about resources, deploy units, and help you strategize your move. \n
 
 The GameMap class in game_map.py represents the current game map. It can be used to access information related to the locations of units. 
-Investigating it is useful for any player that wants to access more information about the current state of the game. \n
+Investigating it is useful for any player that wants to access more information about the current state of the game. 
+ArrayGameMap in array_map.py stores the same data in flat arrays, select it with GameState(config, serialized_string, array_map=True). \n
 
 The GameUnit class in unit.py represetns a single unit. 
-Investigating it is useful for any player that wants to access information about units. \n
+Investigating it is useful for any player that wants to access information about units. 
+UnitSpecs compiles the unit stats of the config once per game, GameState.unit_specs gives access to it. \n
 
 The AlgoCore class in algocore.py handles communication with the game engine, and forms the bones of an algo. AlgoStrategy inherits from it. 
 Investigating it is useful for advanced players interested in getting data from the action phase or communicating directly with the game engine. \n
 
 The Navigation class in navigation.py contains functions related to pathfinding, which are used by GameState in pathing related functions. 
-Investigating it is useful for advanced player who want to optimize the slow default pathing algorithm we provide. \n 
+Investigating it is useful for advanced player who want to optimize the slow default pathing algorithm we provide. 
+ArrayPathFinder gives the same paths using flat arrays, select it with GameState.set_path_finder(). \n 
 
-util.py contains a small handful of functions that help with communication, including the debug-printing function, debug_write().
+The ThreatField class in threat.py tracks the damage per frame stationary units deal on every tile. 
+GameMap keeps one up to date, GameState.get_threat and get_path_damage read it. \n
+
+The ActionPhaseSimulator class in simulator.py plays out the action phase frame by frame, 
+GameState.simulate_action_phase predicts what the turn's deploys will do. 
+replay.py records the engine's action frames and measures how closely the simulator matches them. \n
+
+parallel.py spreads expensive evaluations, such as GameState.evaluate_wall_placements and GameState.evaluate_attack_plans, over a shared process pool. \n
+
+util.py contains a small handful of functions that help with communication, including the debug-printing function, debug_write(), 
+and parse_json(), which decodes game state strings with a fast JSON library when one is installed.
 """
 
 from .algocore import AlgoCore
-from .util import debug_write
+from .util import debug_write, parse_json
 from .game_state import GameState
-from .unit import GameUnit
+from .unit import GameUnit, UnitSpecs
 from .game_map import GameMap
+from .array_map import ArrayGameMap
+from .navigation import ShortestPathFinder, ArrayPathFinder, DynamicPathFinder
+from .simulator import ActionPhaseSimulator
+from .replay import ActionFrameRecorder, compare_recordings
 
-__all__ = ["algocore", "game_state", "game_map", "navigation", "unit", "util"]
+__all__ = ["algocore", "array_map", "game_state", "game_map", "navigation", "parallel", "replay", "simulator", "threat", "unit", "util"]
  
\ No newline at end of file
@@ -1,7 +1,6 @@
-import json
-
 from .game_state import GameState
-from .util import get_command, debug_write, BANNER_TEXT, send_command
+from .unit import UnitSpecs
+from .util import get_command, debug_write, parse_json, BANNER_TEXT, send_command
 
 class AlgoCore(object):
     """
@@ -10,10 +9,18 @@ class AlgoCore(object):
 
     Attributes :
         * config (JSON): json object containing information about the game
+        * unit_specs (:obj: UnitSpecs): The unit stats compiled from the config when the game starts
+        * frame_recorder (:obj: ActionFrameRecorder): Set it, for example in on_game_start, to record every action frame.
+          The recording is saved when the game ends if the recorder has a path.
+        * parsed_state (dict): The decoded message passed to the current on_turn or on_action_frame call.
+          Pass it to GameState as parsed_state so the message is only decoded once.
 
     """
     def __init__(self):
         self.config = None
+        self.unit_specs = None
+        self.frame_recorder = None
+        self.parsed_state = None
 
     def on_game_start(self, config):
         """
@@ -61,10 +68,13 @@ class AlgoCore(object):
                 """
                 This means this must be the config file. So, load in the config file as a json and add it to your AlgoStrategy class.
                 """
-                parsed_config = json.loads(game_state_string)
+                parsed_config = parse_json(game_state_string)
+                # Compiled before on_game_start, which algo_strategy.py overrides without calling this class
+                self.unit_specs = UnitSpecs.for_config(parsed_config)
                 self.on_game_start(parsed_config)
             elif "turnInfo" in game_state_string:
-                state = json.loads(game_state_string)
+                state = parse_json(game_state_string)
+                self.parsed_state = state
                 stateType = int(state.get("turnInfo")[0])
                 if stateType == 0:
                     """
@@ -76,12 +86,16 @@ class AlgoCore(object):
                     """
                     If stateType == 1, this game_state_string string represents a single frame of an action phase
                     """
+                    if self.frame_recorder is not None:
+                        self.frame_recorder.record(game_state_string)
                     self.on_action_frame(game_state_string)
                 elif stateType == 2:
                     """
                     This is the end game message. This means the game is over so break and finish the program.
                     """
                     debug_write("Got end state, game over. Stopping algo.")
+                    if self.frame_recorder is not None and self.frame_recorder.path:
+                        self.frame_recorder.save()
                     break
                 else:
                     """
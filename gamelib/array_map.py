@@ -0,0 +1,431 @@
+import abc
+from array import array
+
+from .game_map import GameMap
+from .threat import range_stencil
+from .unit import GameUnit
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+"""
+A GameMap that stores units in flat per-tile arrays instead of nested lists of GameUnit objects.
+Select it with GameState(config, serialized_string, array_map=True).
+
+Whole-board queries such as count_units, get_stationary_mask and get_threat_grid
+run as NumPy operations over the arrays when NumPy is installed, and as plain loops over them otherwise.
+"""
+
+# Field order shared by the tile columns, the mobile unit records and the views
+TYPE, OWNER, HEALTH, MAX_HEALTH, UPGRADED, PENDING_REMOVAL = range(6)
+
+# Positions of the remove and upgrade entries in the config's unitInformation, as in GameState
+REMOVE_INDEX = 6
+UPGRADE_INDEX = 7
+
+
+class _UnitView(GameUnit, metaclass=abc.ABCMeta):
+    """Base class of the unit-like objects returned by ArrayGameMap[x, y].
+    Stats that only depend on the unit type and upgrade are read from the shared UnitSpecs.
+    Assigning a stat gives the view its own copy of the spec, as it does for a GameUnit. The copy belongs
+    to the view: other views of the same unit keep the shared stats. Only max_health, which the map stores
+    per unit, is written to the map.
+    Subclasses say where a unit's fields are stored by implementing _get and _set.
+    """
+    __slots__ = ("_override",)
+
+    @abc.abstractmethod
+    def _get(self, field):
+        """Reads one of the TYPE ... PENDING_REMOVAL fields of the unit"""
+
+    @abc.abstractmethod
+    def _set(self, field, value):
+        """Writes one of the TYPE ... PENDING_REMOVAL fields of the unit"""
+
+    @property
+    def _spec(self):
+        if self._override is not None:
+            return self._override
+        return self._map._prototype(self._get(TYPE), self._get(UPGRADED))
+
+    @_spec.setter
+    def _spec(self, spec):
+        self._override = spec
+
+    @property
+    def config(self):
+        return self._map.config
+
+    @property
+    def unit_type(self):
+        return self._map._type_names[self._get(TYPE)]
+
+    @property
+    def player_index(self):
+        return self._get(OWNER)
+
+    @property
+    def health(self):
+        return self._get(HEALTH)
+
+    @health.setter
+    def health(self, value):
+        self._set(HEALTH, value)
+
+    @property
+    def max_health(self):
+        return self._get(MAX_HEALTH)
+
+    @max_health.setter
+    def max_health(self, value):
+        self._set(MAX_HEALTH, value)
+
+    @property
+    def upgraded(self):
+        return bool(self._get(UPGRADED))
+
+    @property
+    def pending_removal(self):
+        return bool(self._get(PENDING_REMOVAL))
+
+    @pending_removal.setter
+    def pending_removal(self, value):
+        self._set(PENDING_REMOVAL, 1 if value else 0)
+
+    def upgrade(self):
+        self._override = None
+        self._set(UPGRADED, 1)
+        self._set(MAX_HEALTH, self._spec.max_health)
+
+    def __copy__(self):
+        """Copies the unit into a plain GameUnit, detached from the map"""
+        unit = GameUnit.__new__(GameUnit)
+        unit.player_index = self.player_index
+        unit.x = self.x
+        unit.y = self.y
+        unit.health = self.health
+        unit.pending_removal = self.pending_removal
+        unit.upgraded = self.upgraded
+        unit._specs = self._map._unit_specs
+        unit._spec = self._spec
+        return unit
+
+    def __deepcopy__(self, memo):
+        return self.__copy__()
+
+
+class StationaryUnitView(_UnitView):
+    """The stationary unit on a tile of an ArrayGameMap.
+
+    Reads and writes go straight to the map's arrays. Once the tile is emptied or given a new
+    stationary unit the view detaches and keeps the values it had when it was created,
+    so a list taken from game_map[x, y] can still be assigned back to restore the tile.
+    """
+    __slots__ = ("_map", "_index", "_serial", "_values")
+
+    def __init__(self, game_map, index):
+        self._map = game_map
+        self._override = None
+        self._index = index
+        self._serial = game_map._serials[index]
+        self._values = [column[index] for column in game_map._columns]
+        self.x, self.y = divmod(index, game_map.ARENA_SIZE)
+
+    def _attached(self):
+        return self._map._serials[self._index] == self._serial
+
+    def _get(self, field):
+        if self._attached():
+            return self._map._columns[field][self._index]
+        return self._values[field]
+
+    def _set(self, field, value):
+        self._values[field] = value
+        if self._attached():
+            self._map._columns[field][self._index] = value
+
+
+class MobileUnitView(_UnitView):
+    """A mobile unit of an ArrayGameMap, backed by its record in the map's side table
+    """
+    __slots__ = ("_map", "_record")
+
+    def __init__(self, game_map, record, x, y):
+        self._map = game_map
+        self._override = None
+        self._record = record
+        self.x = x
+        self.y = y
+
+    def _get(self, field):
+        return self._record[field]
+
+    def _set(self, field, value):
+        self._record[field] = value
+
+
+class ArrayGameMap(GameMap):
+    """A GameMap backed by flat arrays indexed by x * ARENA_SIZE + y.
+
+    Each tile stores the type, owner, health, max health, upgrade and removal flags of its stationary unit.
+    Mobile units, which are few and stack on tiles, are kept as small records in a side table.
+    game_map[x, y] still returns a list of unit-like views with the attributes and methods of GameUnit,
+    and the map supports every GameMap method.
+
+    Attributes :
+        * ARENA_SIZE (int): The size of the arena
+        * USES_NUMPY (bool): True if whole-board queries run as NumPy operations. Defaults to whether NumPy is installed,
+          set it to False on a map to use the plain loops instead
+
+    """
+    USES_NUMPY = numpy is not None
+
+    def __init__(self, config):
+        """Initializes constants and the empty arrays
+
+        Args:
+            config (JSON): Contains information about the game
+
+        """
+        super().__init__(config)
+        tiles = self.ARENA_SIZE * self.ARENA_SIZE
+        self._type_names = self._unit_specs.types
+        self._type_indexes = self._unit_specs.type_indexes
+        self._stationary_types = frozenset(self._type_indexes[unit_type] for unit_type in self._unit_specs.firewall_types)
+        self._columns = [
+            array('b', [-1]) * tiles,
+            array('b', [-1]) * tiles,
+            array('d', [0.0]) * tiles,
+            array('d', [0.0]) * tiles,
+            bytearray(tiles),
+            bytearray(tiles)]
+        self._serials = array('L', [0]) * tiles
+        self._mobile = {}
+
+    def _prototype(self, type_index, upgraded):
+        return self._unit_specs.get(self._type_names[type_index], upgraded)
+
+    def _index(self, location):
+        return int(location[0]) * self.ARENA_SIZE + int(location[1])
+
+    def __getitem__(self, location):
+        if len(location) == 2 and self.in_arena_bounds(location):
+            index = self._index(location)
+            units = [] if self._columns[TYPE][index] < 0 else [StationaryUnitView(self, index)]
+            for record in self._mobile.get(index, ()):
+                units.append(MobileUnitView(self, record, int(location[0]), int(location[1])))
+            return units
+        self._invalid_coordinates(location)
+
+    def __setitem__(self, location, val):
+        if type(location) == tuple and len(location) == 2 and self.in_arena_bounds(location):
+            self.record_tile(location)
+            index = self._index(location)
+            self._update_unit_index(location, self[location], False)
+            self.__clear(index)
+            for unit in val:
+                self.__place(index, self._type_indexes[unit.unit_type], unit.player_index, unit.health,
+                             unit.max_health, unit.upgraded, unit.pending_removal)
+            self._update_unit_index(location, self[location], True)
+            self._wall_changed(location)
+            return
+        self._invalid_coordinates(location)
+
+    def _snapshot_tile(self, x, y):
+        index = x * self.ARENA_SIZE + y
+        return [column[index] for column in self._columns], [list(record) for record in self._mobile.get(index, ())]
+
+    def _restore_tile(self, location, snapshot):
+        index = self._index(location)
+        values, records = snapshot
+        was_blocked = self._columns[TYPE][index] >= 0
+        self._update_unit_index(location, self[location], False)
+        self._serials[index] += 1
+        for column, value in zip(self._columns, values):
+            column[index] = value
+        self._mobile.pop(index, None)
+        if records:
+            self._mobile[index] = records
+        self._update_unit_index(location, self[location], True)
+        # Paths only change if the tile stops or starts being blocked, an upgrade or damage only changes the threat
+        if was_blocked != (values[TYPE] >= 0):
+            self._wall_changed(location)
+        elif was_blocked:
+            self.refresh_unit_stats(location)
+
+    def __clear(self, index):
+        if self._columns[TYPE][index] >= 0:
+            self._columns[TYPE][index] = -1
+            self._columns[OWNER][index] = -1
+            self._columns[HEALTH][index] = 0.0
+            self._columns[MAX_HEALTH][index] = 0.0
+            self._columns[UPGRADED][index] = 0
+            self._columns[PENDING_REMOVAL][index] = 0
+            self._serials[index] += 1
+        self._mobile.pop(index, None)
+
+    def __place(self, index, type_index, player_index, health, max_health, upgraded=False, pending_removal=False):
+        values = [type_index, player_index, health, max_health, 1 if upgraded else 0, 1 if pending_removal else 0]
+        if type_index in self._stationary_types:
+            self._serials[index] += 1
+            for column, value in zip(self._columns, values):
+                column[index] = value
+        else:
+            self._mobile.setdefault(index, []).append(values)
+
+    def add_unit(self, unit_type, location, player_index=0, health=None):
+        """Add a single unit to the map at the given location. See GameMap.add_unit
+        """
+        if not self.in_arena_bounds(location):
+            self._invalid_coordinates(location)
+            return
+        if player_index < 0 or player_index > 1:
+            self.warn("Player index {} is invalid. Player index should be 0 or 1.".format(player_index))
+
+        self.record_tile(location)
+        index = self._index(location)
+        type_index = self._type_indexes[unit_type]
+        prototype = self._prototype(type_index, False)
+        if prototype.stationary:
+            self._update_unit_index(location, self[location], False)
+            self.__clear(index)
+        self.__place(index, type_index, player_index, health if health else prototype.max_health, prototype.max_health)
+        self._update_unit_index(location, self[location], True)
+        if prototype.stationary:
+            self._wall_changed(location)
+
+    def remove_unit(self, location):
+        """Remove all units on the map in the given location. See GameMap.remove_unit
+        """
+        if not self.in_arena_bounds(location):
+            self._invalid_coordinates(location)
+            return
+
+        self.record_tile(location)
+        index = self._index(location)
+        had_wall = self._columns[TYPE][index] >= 0
+        self._update_unit_index(location, self[location], False)
+        self.__clear(index)
+        if had_wall:
+            self._wall_changed(location)
+
+    def load_units(self, units, player_index):
+        """Adds one player's units from a serialized game state, writing them straight into the arrays.
+        No GameUnit is created until a tile is read.
+
+        Args:
+            units: The p1Units or p2Units list of the game state, one list of [x, y, health, id] entries per unit type
+            player_index: The player controlling the units, 0 for you 1 for the enemy
+
+        Remove and upgrade entries, the last two unit types, flag the stationary unit on their tile.
+        """
+        size = self.ARENA_SIZE
+        bounds_mask = self.geometry.bounds_mask
+        types, owners, health, max_health, upgraded, pending_removal = self._columns
+        for type_index, entries in enumerate(units):
+            if not entries:
+                continue
+            stationary = type_index in self._stationary_types
+            if type_index < REMOVE_INDEX:
+                prototype = self._prototype(type_index, False)
+                locations = self._unit_index.setdefault((player_index, self._type_names[type_index]), set())
+            for entry in entries:
+                x, y = int(entry[0]), int(entry[1])
+                index = x * size + y
+                if not (0 <= x < size and 0 <= y < size and bounds_mask[index]):
+                    self._invalid_coordinates([x, y])
+                    continue
+                if type_index == REMOVE_INDEX:
+                    if types[index] >= 0:
+                        pending_removal[index] = 1
+                elif type_index == UPGRADE_INDEX:
+                    if types[index] >= 0:
+                        upgraded[index] = 1
+                        max_health[index] = self._prototype(types[index], 1).max_health
+                        self.refresh_unit_stats([x, y])
+                else:
+                    unit_health = float(entry[2]) or prototype.max_health
+                    locations.add((x, y))
+                    if stationary:
+                        self._serials[index] += 1
+                        types[index] = type_index
+                        owners[index] = player_index
+                        health[index] = unit_health
+                        max_health[index] = prototype.max_health
+                        self._wall_changed((x, y))
+                    else:
+                        self._mobile.setdefault(index, []).append([type_index, player_index, unit_health, prototype.max_health, 0, 0])
+
+    def __type_index(self, unit_type):
+        return None if unit_type is None else self._type_indexes.get(unit_type, -2)
+
+    def __grid(self, field, dtype):
+        return numpy.frombuffer(self._columns[field], dtype=dtype).reshape(self.ARENA_SIZE, self.ARENA_SIZE)
+
+    def __numpy_mask(self, player_index, type_index, upgraded=None):
+        types = self.__grid(TYPE, numpy.int8)
+        mask = types >= 0
+        if type_index is not None:
+            mask &= types == type_index
+        if player_index is not None:
+            mask &= self.__grid(OWNER, numpy.int8) == player_index
+        if upgraded is not None:
+            mask &= self.__grid(UPGRADED, numpy.uint8) == upgraded
+        return mask
+
+    def __matches(self, index, player_index, type_index):
+        return (self._columns[TYPE][index] >= 0
+                and (type_index is None or self._columns[TYPE][index] == type_index)
+                and (player_index is None or self._columns[OWNER][index] == player_index))
+
+    def count_units(self, player_index=None, unit_type=None):
+        """Counts the units on the map. See GameMap.count_units
+        """
+        type_index = self.__type_index(unit_type)
+        if self.USES_NUMPY:
+            count = int(numpy.count_nonzero(self.__numpy_mask(player_index, type_index)))
+        else:
+            count = sum(1 for index in range(len(self._serials)) if self.__matches(index, player_index, type_index))
+        for records in self._mobile.values():
+            count += sum(1 for record in records
+                         if (type_index is None or record[TYPE] == type_index) and (player_index is None or record[OWNER] == player_index))
+        return count
+
+    def get_stationary_mask(self, player_index=None, unit_type=None):
+        """Gets which tiles hold a stationary unit. See GameMap.get_stationary_mask
+        """
+        type_index = self.__type_index(unit_type)
+        if self.USES_NUMPY:
+            return bytearray(self.__numpy_mask(player_index, type_index).astype(numpy.uint8).tobytes())
+        return bytearray(1 if self.__matches(index, player_index, type_index) else 0 for index in range(len(self._serials)))
+
+    def get_threat_grid(self, player_index=0):
+        """Gets the damage per frame a unit of the given player would take on every tile. See GameMap.get_threat_grid
+
+        With NumPy, each kind of attacking unit adds its shifted damage grid once per offset of its range,
+        instead of each unit adding its damage tile by tile.
+        """
+        if not self.USES_NUMPY:
+            return super().get_threat_grid(player_index)
+
+        size = self.ARENA_SIZE
+        hit_radius = self._unit_specs.hit_radius
+        grid = numpy.zeros((size, size))
+        for type_index in sorted(self._stationary_types):
+            for upgraded in (0, 1):
+                stats = self._prototype(type_index, upgraded)
+                if stats.damage_i <= 0 or stats.attackRange <= 0:
+                    continue
+                towers = self.__numpy_mask(1 - player_index, type_index, upgraded)
+                if not towers.any():
+                    continue
+                damage = towers * float(stats.damage_i)
+                for dx, dy in range_stencil(stats.attackRange, hit_radius):
+                    grid[max(dx, 0):size + min(dx, 0), max(dy, 0):size + min(dy, 0)] += \
+                        damage[max(-dx, 0):size - max(dx, 0), max(-dy, 0):size - max(dy, 0)]
+        grid *= numpy.frombuffer(self.geometry.bounds_mask, dtype=numpy.uint8).reshape(size, size)
+        field = array('d')
+        field.frombytes(grid.tobytes())
+        return field
@@ -1,7 +1,80 @@
+import copy
 import math
-from .unit import GameUnit
+from .unit import GameUnit, UnitSpecs
+from .threat import ThreatField, range_stencil
 from .util import debug_write
 
+def _diamond_contains(x, y, arena_size):
+    half_board = int(arena_size / 2)
+
+    row_size = y + 1
+    startx = half_board - row_size
+    endx = startx + (2 * row_size) - 1
+    top_half_check = (y < half_board and x >= startx and x <= endx)
+
+    row_size = (arena_size - 1 - y) + 1
+    startx = half_board - row_size
+    endx = startx + (2 * row_size) - 1
+    bottom_half_check = (y >= half_board and x >= startx and x <= endx)
+
+    return bottom_half_check or top_half_check
+
+
+class ArenaGeometry:
+    """Tables describing the diamond shaped arena, computed once per arena size and shared by every GameMap
+
+    Attributes :
+        * ARENA_SIZE (int): The size of the arena
+        * locations (tuple): Every in-arena location as an (x, y) tuple, bottom row first and left to right within a row
+        * bounds_mask (bytes): Indexed by x * ARENA_SIZE + y, 1 for in-arena tiles and 0 elsewhere
+        * halves (tuple): The locations on player 0's half of the arena, then the locations on player 1's half
+        * quadrants (tuple): The locations of each quadrant, indexed by the edge constants of GameMap. The TOP_RIGHT quadrant is the one touching the top right edge
+        * edges (tuple): The locations of each edge, indexed by the edge constants of GameMap, in the order get_edges returns them
+        * edge_mask (bytes): Indexed by x * ARENA_SIZE + y, 1 + the edge constant for tiles on an edge and 0 elsewhere
+
+    """
+    _tables = {}
+
+    def __init__(self, arena_size):
+        half_board = int(arena_size / 2)
+        self.ARENA_SIZE = arena_size
+        self.locations = tuple((x, y) for y in range(arena_size) for x in range(arena_size) if _diamond_contains(x, y, arena_size))
+        bounds_mask = bytearray(arena_size * arena_size)
+        for x, y in self.locations:
+            bounds_mask[x * arena_size + y] = 1
+        self.bounds_mask = bytes(bounds_mask)
+        self.halves = (tuple(location for location in self.locations if location[1] < half_board),
+                       tuple(location for location in self.locations if location[1] >= half_board))
+        # In the order TOP_RIGHT, TOP_LEFT, BOTTOM_LEFT, BOTTOM_RIGHT
+        self.quadrants = tuple(tuple(location for location in self.locations if (location[0] >= half_board) == right and (location[1] >= half_board) == top)
+                               for right, top in [(True, True), (False, True), (False, False), (True, False)])
+        self.edges = (tuple((half_board + num, arena_size - 1 - num) for num in range(half_board)),
+                      tuple((half_board - 1 - num, arena_size - 1 - num) for num in range(half_board)),
+                      tuple((half_board - 1 - num, num) for num in range(half_board)),
+                      tuple((half_board + num, num) for num in range(half_board)))
+        edge_mask = bytearray(arena_size * arena_size)
+        for edge, edge_locations in enumerate(self.edges):
+            for x, y in edge_locations:
+                edge_mask[x * arena_size + y] = edge + 1
+        self.edge_mask = bytes(edge_mask)
+
+    @classmethod
+    def for_size(cls, arena_size):
+        """Gets the shared geometry of an arena size, computing it the first time
+
+        Args:
+            arena_size: The size of the arena
+
+        Returns:
+            The ArenaGeometry for that size
+
+        """
+        geometry = cls._tables.get(arena_size)
+        if geometry is None:
+            geometry = cls._tables[arena_size] = cls(arena_size)
+        return geometry
+
+
 class GameMap:
     """Holds data about the current game map and provides functions
     useful for getting information related to the map.
@@ -18,8 +91,13 @@ class GameMap:
         * TOP_LEFT (int): A constant that represents the top left edge
         * BOTTOM_LEFT (int): Hidden challenge! Can you guess what this constant represents???
         * BOTTOM_RIGHT (int): A constant that represents the bottom right edge
+        * wall_version (int): Incremented whenever a stationary unit is added to or removed from the map. Used by the pathfinder to know when cached paths are stale
+        * geometry (:obj: ArenaGeometry): Precomputed in-arena locations and bounds mask, shared between maps. Do not modify
+        * MAX_WALL_CHANGES (int): How many of the latest wall changes are kept for wall_changes_since
 
     """
+    MAX_WALL_CHANGES = 256
+
     def __init__(self, config):
         """Initializes constants and game map
 
@@ -35,8 +113,17 @@ class GameMap:
         self.TOP_LEFT = 1
         self.BOTTOM_LEFT = 2
         self.BOTTOM_RIGHT = 3
+        self.wall_version = 0
+        self._wall_changes = []
+        self._wall_changes_base = 0
+        self._threat_field = None
+        self._undo_log = None
+        self._unit_index = {}
+        self.geometry = ArenaGeometry.for_size(self.ARENA_SIZE)
+        self._unit_specs = UnitSpecs.for_config(config)
+        self.__hit_radius = self._unit_specs.hit_radius
+        self.__bounds_mask = self.geometry.bounds_mask
         self.__map = self.__empty_grid()
-        self.__start = [13,0]
     
     def __getitem__(self, location):
         if len(location) == 2 and self.in_arena_bounds(location):
@@ -46,26 +133,16 @@ class GameMap:
 
     def __setitem__(self, location, val):
         if type(location) == tuple and len(location) == 2 and self.in_arena_bounds(location):
+            self.record_tile(location)
+            self._update_unit_index(location, self.__map[location[0]][location[1]], False)
             self.__map[location[0]][location[1]] = val
+            self._update_unit_index(location, val, True)
+            self._wall_changed(location)
             return
         self._invalid_coordinates(location)
 
     def __iter__(self):
-        self.__start = [13,0]
-        return self
-    
-    def __next__(self):
-        location = self.__start
-        if location == [15,27]:
-            raise StopIteration
-        new_location = [location[0]+1, location[1]]
-        while not self.in_arena_bounds(new_location) and not location == [14,27]:
-            if new_location[0] == self.ARENA_SIZE:
-                new_location = [0, new_location[1]+1]
-            else:
-                new_location = [new_location[0]+1, new_location[1]]
-        self.__start = new_location
-        return location 
+        return ([x, y] for x, y in self.geometry.locations)
 
     def __empty_grid(self):
         grid = []
@@ -75,6 +152,120 @@ class GameMap:
                 grid[x].append([])
         return grid
 
+    def _wall_changed(self, location):
+        self.wall_version += 1
+        self._wall_changes.append((int(location[0]), int(location[1])))
+        # Trimmed in batches so that adding a change stays cheap on average
+        if len(self._wall_changes) >= 2 * self.MAX_WALL_CHANGES:
+            dropped = len(self._wall_changes) - self.MAX_WALL_CHANGES
+            del self._wall_changes[:dropped]
+            self._wall_changes_base += dropped
+        if self._threat_field is not None:
+            self._threat_field.update_location(location)
+
+    def record_tile(self, location):
+        """Saves the units on a tile so that a rollback of the GameState that owns this map can restore them.
+        Does nothing unless a savepoint is active. add_unit, remove_unit and assignments to game_map[x, y] call it,
+        call it yourself before editing the units returned by game_map[x, y] directly.
+
+        Args:
+            location: The location about to change
+
+        """
+        if self._undo_log is not None:
+            x, y = int(location[0]), int(location[1])
+            self._undo_log.append((self._restore_tile, ((x, y), self._snapshot_tile(x, y))))
+
+    def _snapshot_tile(self, x, y):
+        return [copy.copy(unit) for unit in self.__map[x][y]]
+
+    def _restore_tile(self, location, snapshot):
+        current = self.__map[location[0]][location[1]]
+        self._update_unit_index(location, current, False)
+        self.__map[location[0]][location[1]] = snapshot
+        self._update_unit_index(location, snapshot, True)
+        # Paths only change if the tile stops or starts being blocked, an upgrade or damage only changes the threat
+        was_blocked = any(unit.stationary for unit in current)
+        is_blocked = any(unit.stationary for unit in snapshot)
+        if was_blocked != is_blocked:
+            self._wall_changed(location)
+        elif is_blocked:
+            self.refresh_unit_stats(location)
+
+    def _update_unit_index(self, location, units, present):
+        location = (int(location[0]), int(location[1]))
+        for unit in units:
+            if present:
+                self._unit_index.setdefault((unit.player_index, unit.unit_type), set()).add(location)
+            else:
+                locations = self._unit_index.get((unit.player_index, unit.unit_type))
+                if locations is not None:
+                    locations.discard(location)
+
+    def units_of(self, player_index=None, unit_type=None, x_range=None, y_range=None):
+        """Gets the units of a player and type, looking up the locations they occupy instead of scanning the map.
+        The lookup is kept up to date by add_unit, remove_unit and assignments to game_map[x, y].
+
+        Args:
+            player_index: 0 for your units, 1 for the enemy's, or None for both
+            unit_type: The type of the units, or None for every type
+            x_range: Only return units whose x coordinate is in this range or list, or None for any
+            y_range: Only return units whose y coordinate is in this range or list, or None for any
+
+        Returns:
+            A list of matching units, ordered by location
+
+        """
+        locations = set()
+        for (unit_player_index, unit_unit_type), unit_locations in self._unit_index.items():
+            if (player_index is None or unit_player_index == player_index) and (unit_type is None or unit_unit_type == unit_type):
+                locations.update(unit_locations)
+        units = []
+        for x, y in sorted(locations):
+            if (x_range is None or x in x_range) and (y_range is None or y in y_range):
+                units.extend(unit for unit in self[x, y]
+                             if (player_index is None or unit.player_index == player_index) and (unit_type is None or unit.unit_type == unit_type))
+        return units
+
+    def get_threat_field(self):
+        """Gets the ThreatField of this map, building it on first use.
+        It is kept up to date as stationary units are added, removed or upgraded through the map.
+
+        Returns:
+            The map's ThreatField
+
+        """
+        if self._threat_field is None:
+            self._threat_field = ThreatField(self)
+        return self._threat_field
+
+    def refresh_unit_stats(self, location):
+        """Updates data derived from the stats of the stationary unit at a location, such as the threat field.
+        GameState calls this after upgrading a unit. Call it yourself if you upgrade a unit on the map directly.
+
+        Args:
+            location: The location of the changed unit
+
+        """
+        if self._threat_field is not None:
+            self._threat_field.update_location(location)
+
+    def wall_changes_since(self, version):
+        """Gets the locations where stationary units were added or removed after a given wall_version
+
+        Args:
+            version: A previous value of wall_version
+
+        Returns:
+            A list of (x, y) tuples in the order the changes happened, possibly with repeats, or None if version
+            is not a wall_version of this map or is older than the MAX_WALL_CHANGES to 2 * MAX_WALL_CHANGES changes
+            that are kept. Callers should then assume any location may have changed.
+
+        """
+        if version < self._wall_changes_base or version > self.wall_version:
+            return None
+        return self._wall_changes[version - self._wall_changes_base:]
+
     def _invalid_coordinates(self, location):
         self.warn("{} is out of bounds.".format(str(location)))
 
@@ -89,19 +280,9 @@ class GameMap:
         
         """
         x, y = location
-        half_board = self.HALF_ARENA
-
-        row_size = y + 1
-        startx = half_board - row_size
-        endx = startx + (2 * row_size) - 1
-        top_half_check = (y < self.HALF_ARENA and x >= startx and x <= endx)
-
-        row_size = (self.ARENA_SIZE - 1 - y) + 1
-        startx = half_board - row_size
-        endx = startx + (2 * row_size) - 1
-        bottom_half_check = (y >= self.HALF_ARENA and x >= startx and x <= endx)
-
-        return bottom_half_check or top_half_check
+        if type(x) is int and type(y) is int:
+            return 0 <= x < self.ARENA_SIZE and 0 <= y < self.ARENA_SIZE and self.__bounds_mask[x * self.ARENA_SIZE + y] == 1
+        return _diamond_contains(x, y, self.ARENA_SIZE)
 
     def get_edge_locations(self, quadrant_description):
         """Takes in an edge description and returns a list of locations.
@@ -117,8 +298,7 @@ class GameMap:
             self.warn("Passed invalid quadrant_description '{}'. See the documentation for valid inputs for get_edge_locations.".format(quadrant_description))
             return
 
-        edges = self.get_edges()
-        return edges[quadrant_description]
+        return [[x, y] for x, y in self.geometry.edges[quadrant_description]]
 
     def get_edges(self):
         """Gets all of the edges and their edge locations
@@ -127,51 +307,85 @@ class GameMap:
             A list with four lists inside of it of locations corresponding to the four edges.
             [0] = top_right, [1] = top_left, [2] = bottom_left, [3] = bottom_right.
         """
-        top_right = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA + num
-            y = self.ARENA_SIZE - 1 - num
-            top_right.append([int(x), int(y)])
-        top_left = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA - 1 - num
-            y = self.ARENA_SIZE - 1 - num
-            top_left.append([int(x), int(y)])
-        bottom_left = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA - 1 - num
-            y = num
-            bottom_left.append([int(x), int(y)])
-        bottom_right = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA + num
-            y = num
-            bottom_right.append([int(x), int(y)])
-        return [top_right, top_left, bottom_left, bottom_right]
+        return [[[x, y] for x, y in edge] for edge in self.geometry.edges]
+
+    def get_location_edge(self, location):
+        """Gets the edge a location lies on
+
+        Args:
+            location: A map location
+
+        Returns:
+            The edge constant, such as game_map.BOTTOM_LEFT, or None if the location is not on an edge
+
+        """
+        x, y = location
+        if not self.in_arena_bounds(location) or x != int(x) or y != int(y):
+            return None
+        edge = self.geometry.edge_mask[int(x) * self.ARENA_SIZE + int(y)]
+        return edge - 1 if edge else None
     
-    def add_unit(self, unit_type, location, player_index=0):
+    def get_half_locations(self, player_index=0):
+        """Gets the locations on one player's half of the arena
+
+        Args:
+            player_index: 0 for your half (the bottom), 1 for the enemy's half (the top)
+
+        Returns:
+            A list of locations
+
+        """
+        if player_index < 0 or player_index > 1:
+            self.warn("Player index {} is invalid. Player index should be 0 or 1.".format(player_index))
+            return
+        return [[x, y] for x, y in self.geometry.halves[player_index]]
+
+    def get_quadrant_locations(self, quadrant_description):
+        """Gets the locations of the quadrant touching an edge
+
+        Args:
+            quadrant_description: A constant corresponding to one of the 4 edges. See game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, and similar constants.
+
+        Returns:
+            A list of locations in that quadrant
+
+        """
+        if not quadrant_description in [self.TOP_LEFT, self.TOP_RIGHT, self.BOTTOM_LEFT, self.BOTTOM_RIGHT]:
+            self.warn("Passed invalid quadrant_description '{}'. See the documentation for valid inputs for get_quadrant_locations.".format(quadrant_description))
+            return
+        return [[x, y] for x, y in self.geometry.quadrants[quadrant_description]]
+
+    def add_unit(self, unit_type, location, player_index=0, health=None):
         """Add a single GameUnit to the map at the given location.
 
         Args:
             unit_type: The type of the new unit. Use the constants provided in algo_strategy.
             location: A list of two integers representing the [x,y] coordinate of the new unit
             player_index: The index corresponding to the player controlling the new unit, 0 for you 1 for the enemy
+            health: The health of the new unit, or None for its max_health
 
         This function does not affect your turn and only changes the data stored in GameMap. The intended use of this function
         is to allow you to create arbitrary gamestates. Using this function on the game_map provided with game_state will 
         desynchronize it from the actual gamestate, and can cause issues. 
+
+        Adding a stationary unit increments wall_version. If you edit the unit lists returned by game_map[x, y] directly,
+        increment wall_version yourself so that cached paths are recomputed.
         """
         if not self.in_arena_bounds(location):
             self._invalid_coordinates(location)
         if player_index < 0 or player_index > 1:
             self.warn("Player index {} is invalid. Player index should be 0 or 1.".format(player_index))
 
+        self.record_tile(location)
         x, y = location
-        new_unit = GameUnit(unit_type, self.config, player_index, None, location[0], location[1])
+        new_unit = GameUnit(unit_type, self._unit_specs, player_index, health, location[0], location[1])
         if not new_unit.stationary:
             self.__map[x][y].append(new_unit)
         else:
+            self._update_unit_index(location, self.__map[x][y], False)
             self.__map[x][y] = [new_unit]
+            self._wall_changed(location)
+        self._update_unit_index(location, [new_unit], True)
 
     def remove_unit(self, location):
         """Remove all units on the map in the given location.
@@ -185,8 +399,69 @@ class GameMap:
         if not self.in_arena_bounds(location):
             self._invalid_coordinates(location)
         
+        self.record_tile(location)
         x, y = location
+        had_wall = any(unit.stationary for unit in self.__map[x][y])
+        self._update_unit_index(location, self.__map[x][y], False)
         self.__map[x][y] = []
+        if had_wall:
+            self._wall_changed(location)
+
+    def count_units(self, player_index=None, unit_type=None):
+        """Counts the units on the map
+
+        Args:
+            player_index: Only count units of this player, or None to count both
+            unit_type: Only count units of this type, or None to count every type
+
+        Returns:
+            The number of matching units, stationary and mobile
+
+        """
+        return sum(1 for location in list(self) for unit in self[location]
+                   if (player_index is None or unit.player_index == player_index) and (unit_type is None or unit.unit_type == unit_type))
+
+    def get_stationary_mask(self, player_index=None, unit_type=None):
+        """Gets which tiles hold a stationary unit
+
+        Args:
+            player_index: Only include units of this player, or None to include both
+            unit_type: Only include units of this type, or None to include every type
+
+        Returns:
+            A bytearray indexed by x * ARENA_SIZE + y, 1 where a matching stationary unit stands and 0 elsewhere
+
+        """
+        mask = bytearray(self.ARENA_SIZE * self.ARENA_SIZE)
+        for x, y in list(self):
+            for unit in self[x, y]:
+                if unit.stationary and (player_index is None or unit.player_index == player_index) and (unit_type is None or unit.unit_type == unit_type):
+                    mask[x * self.ARENA_SIZE + y] = 1
+        return mask
+
+    def get_threat_grid(self, player_index=0):
+        """Gets the damage per frame a unit of the given player would take on every tile
+
+        Args:
+            player_index: The player controlling the hypothetical mobile units, 0 for you 1 for the enemy
+
+        Returns:
+            An array of floats indexed by x * ARENA_SIZE + y, 0 outside of the arena
+
+        """
+        return self.get_threat_field().get_field(player_index)
+
+    def get_coverage_mask(self, player_index=0):
+        """Gets which tiles are within attack range of at least one of a player's stationary units
+
+        Args:
+            player_index: The player whose stationary units to consider, 0 for you 1 for the enemy
+
+        Returns:
+            A bytearray indexed by x * ARENA_SIZE + y, 1 on covered tiles and 0 elsewhere
+
+        """
+        return bytearray(1 if count > 0 else 0 for count in self.get_threat_field().get_attacker_counts(1 - player_index))
 
     def get_locations_in_range(self, location, radius):
         """Gets locations in a circular area around a location
@@ -205,17 +480,45 @@ class GameMap:
             self._invalid_coordinates(location)
 
         x, y = location
+        if type(x) is int and type(y) is int:
+            size = self.ARENA_SIZE
+            bounds_mask = self.__bounds_mask
+            # A unit with a given range affects all locations who's centers are within that range + get hit radius
+            return [[x + dx, y + dy] for dx, dy in range_stencil(radius, self.__hit_radius)
+                    if 0 <= x + dx < size and 0 <= y + dy < size and bounds_mask[(x + dx) * size + y + dy]]
+
         locations = []
         search_radius = math.ceil(radius)
-        getHitRadius = self.config["unitInformation"][0]['getHitRadius']
         for i in range(int(x - search_radius), int(x + search_radius + 1)):
             for j in range(int(y - search_radius), int(y + search_radius + 1)):
                 new_location = [i, j]
-                # A unit with a given range affects all locations who's centers are within that range + get hit radius
-                if self.in_arena_bounds(new_location) and self.distance_between_locations(location, new_location) < radius + getHitRadius:
+                if self.in_arena_bounds(new_location) and self.distance_between_locations(location, new_location) < radius + self.__hit_radius:
                     locations.append(new_location)
         return locations
 
+    def get_range_mask(self, locations, radius):
+        """Gets every tile within range of any of several locations, for example all tiles a group of destructors can hit
+
+        Args:
+            locations: A list of locations
+            radius: The radius around each location, or a list with one radius per location
+
+        Returns:
+            A bytearray indexed by x * ARENA_SIZE + y, 1 on tiles in range of at least one location and 0 elsewhere
+
+        """
+        size = self.ARENA_SIZE
+        bounds_mask = self.__bounds_mask
+        mask = bytearray(size * size)
+        radii = radius if isinstance(radius, (list, tuple)) else [radius] * len(locations)
+        for location, location_radius in zip(locations, radii):
+            x, y = int(location[0]), int(location[1])
+            for dx, dy in range_stencil(location_radius, self.__hit_radius):
+                tx, ty = x + dx, y + dy
+                if 0 <= tx < size and 0 <= ty < size and bounds_mask[tx * size + ty]:
+                    mask[tx * size + ty] = 1
+        return mask
+
     def distance_between_locations(self, location_1, location_2):
         """Euclidean distance
 
@@ -1,11 +1,22 @@
 import math
 import json
 import sys
+import time
+from contextlib import contextmanager
 
-from .navigation import ShortestPathFinder
-from .util import send_command, debug_write
-from .unit import GameUnit
+from .navigation import ShortestPathFinder, ArrayPathFinder, DynamicPathFinder
+from .parallel import split_chunks, run_parallel, RESULT_MARGIN
+from .util import send_command, debug_write, parse_json
+from .unit import GameUnit, UnitSpecs
 from .game_map import GameMap
+from .array_map import ArrayGameMap
+from .threat import nearest_target
+from .simulator import ActionPhaseSimulator, MAX_FRAMES
+
+BITS = 1
+CORES = 0
+# The UnitSpecs the unit type constants below were last set from by GameState
+_constants_specs = None
 
 def is_stationary(unit_type):
     """
@@ -17,12 +28,48 @@ def is_stationary(unit_type):
     """
     return unit_type in FIREWALL_TYPES
 
+def _wall_placement_worker(config, serialized_string, walls, placements):
+    """
+    Runs GameState.evaluate_wall_placements for a chunk of placements in a worker process.
+    Rebuilds the turn's GameState and brings its firewalls in line with walls first.
+    """
+    game_state = GameState(config, serialized_string)
+    game_state.suppress_warnings(True)
+    wanted = {(x, y): (unit_type, player_index) for unit_type, x, y, player_index in walls}
+    for location in list(game_state.game_map):
+        if game_state.contains_stationary_unit(location) and tuple(location) not in wanted:
+            game_state.game_map.remove_unit(location)
+    for (x, y), (unit_type, player_index) in wanted.items():
+        existing = game_state.contains_stationary_unit([x, y])
+        if not existing or existing.unit_type != unit_type or existing.player_index != player_index:
+            game_state.game_map.add_unit(unit_type, [x, y], player_index)
+    return game_state._wall_placement_impacts(placements)
+
+def _attack_plan_worker(config, serialized_string, units, plans, deadline):
+    """
+    Runs GameState.evaluate_attack_plans for a chunk of plans in a worker process.
+    Rebuilds the turn's GameState and replaces its units with units first.
+    """
+    game_state = GameState(config, serialized_string)
+    game_state.suppress_warnings(True)
+    for location in list(game_state.game_map):
+        if game_state.game_map[location]:
+            game_state.game_map.remove_unit(location)
+    for unit_type, x, y, player_index, health, upgraded, pending_removal in units:
+        game_state.game_map.add_unit(unit_type, [x, y], player_index, health)
+        game_state.game_map[x, y][-1].pending_removal = pending_removal
+        if upgraded:
+            game_state.game_map[x, y][-1].upgrade()
+            game_state.game_map.refresh_unit_stats([x, y])
+    return game_state._attack_plan_estimates(plans, deadline)
+
 class GameState:
     """Represents the entire gamestate for a given turn
     Provides methods related to resources and unit deployment
 
     Attributes :
         * UNIT_TYPE_TO_INDEX (dict): Maps a unit to a corresponding index
+        * unit_specs (:obj: UnitSpecs): The compiled stats of every unit type, shared by every GameState of the game
         * FILTER (str): A constant representing the filter unit
         * ENCRYPTOR (str): A constant representing the encryptor unit
         * DESTRUCTOR (str): A constant representing the destructor unit
@@ -47,63 +94,59 @@ class GameState:
 
     """
 
-    def __init__(self, config, serialized_string):
+    def __init__(self, config, serialized_string, array_map=False, parsed_state=None):
         """ Setup a turns variables using arguments passed
 
         Args:
             * config (JSON): A json object containing information about the game
             * serialized_string (string): A string containing information about the game state at the start of this turn
+            * array_map (bool): If true, game_map is an ArrayGameMap, which stores units in flat arrays and only creates
+              a GameUnit when its tile is read. A GameMap creates every GameUnit of the state up front
+            * parsed_state (dict): serialized_string already decoded, for example AlgoCore.parsed_state, to skip decoding it again.
+              It is only read, never modified
 
         """
         self.serialized_string = serialized_string
         self.config = config
         self.enable_warnings = True
 
-        global FILTER, ENCRYPTOR, DESTRUCTOR, PING, EMP, SCRAMBLER, REMOVE, UPGRADE, FIREWALL_TYPES, ALL_UNITS, UNIT_TYPE_TO_INDEX
-        UNIT_TYPE_TO_INDEX = {}
-        FILTER = config["unitInformation"][0]["shorthand"]
-        UNIT_TYPE_TO_INDEX[FILTER] = 0
-        ENCRYPTOR = config["unitInformation"][1]["shorthand"]
-        UNIT_TYPE_TO_INDEX[ENCRYPTOR] = 1
-        DESTRUCTOR = config["unitInformation"][2]["shorthand"]
-        UNIT_TYPE_TO_INDEX[DESTRUCTOR] = 2
-        PING = config["unitInformation"][3]["shorthand"]
-        UNIT_TYPE_TO_INDEX[PING] = 3
-        EMP = config["unitInformation"][4]["shorthand"]
-        UNIT_TYPE_TO_INDEX[EMP] = 4
-        SCRAMBLER = config["unitInformation"][5]["shorthand"]
-        UNIT_TYPE_TO_INDEX[SCRAMBLER] = 5
-        REMOVE = config["unitInformation"][6]["shorthand"]
-        UNIT_TYPE_TO_INDEX[REMOVE] = 6
-        UPGRADE = config["unitInformation"][7]["shorthand"]
-        UNIT_TYPE_TO_INDEX[UPGRADE] = 7
-
-        ALL_UNITS = [PING, EMP, SCRAMBLER, FILTER, ENCRYPTOR, DESTRUCTOR]
-        FIREWALL_TYPES = [FILTER, ENCRYPTOR, DESTRUCTOR]
+        self.unit_specs = UnitSpecs.for_config(config)
+        # The module constants only change with the unit information, not with every turn
+        global _constants_specs, FILTER, ENCRYPTOR, DESTRUCTOR, PING, EMP, SCRAMBLER, REMOVE, UPGRADE, FIREWALL_TYPES, ALL_UNITS, UNIT_TYPE_TO_INDEX
+        if _constants_specs is not self.unit_specs:
+            _constants_specs = self.unit_specs
+            UNIT_TYPE_TO_INDEX = self.unit_specs.type_indexes
+            FILTER, ENCRYPTOR, DESTRUCTOR, PING, EMP, SCRAMBLER, REMOVE, UPGRADE = self.unit_specs.types[:8]
+
+            ALL_UNITS = [PING, EMP, SCRAMBLER, FILTER, ENCRYPTOR, DESTRUCTOR]
+            FIREWALL_TYPES = [FILTER, ENCRYPTOR, DESTRUCTOR]
 
         self.ARENA_SIZE = 28
         self.HALF_ARENA = int(self.ARENA_SIZE / 2)
-        self.BITS = 1
-        self.CORES = 0
-        global BITS, CORES
-        BITS = self.BITS
-        CORES = self.CORES
+        self.BITS = BITS
+        self.CORES = CORES
 
-        self.game_map = GameMap(self.config)
+        self.game_map = ArrayGameMap(self.config) if array_map else GameMap(self.config)
         self._shortest_path_finder = ShortestPathFinder()
+        self._dynamic_path_finder = None
+        self._simulator = None
+        self._resource_projections = {}
         self._build_stack = []
         self._deploy_stack = []
+        self._undo_log = []
+        self._savepoints = []
         self._player_resources = [
                 {'cores': 0, 'bits': 0},  # player 0, which is you
                 {'cores': 0, 'bits': 0}]  # player 1, which is the opponent
-        self.__parse_state(serialized_string)
+        self.__parse_state(serialized_string, parsed_state)
 
-    def __parse_state(self, state_line):
+    def __parse_state(self, state_line, state=None):
         """
         Fills in map based on the serialized game state so that self.game_map[x,y] is a list of GameUnits at that location.
-        state_line is the game state as a json string.
+        state_line is the game state as a json string, state the same state if it was already decoded.
         """
-        state = json.loads(state_line)
+        if state is None:
+            state = parse_json(state_line)
 
         turn_info = state["turnInfo"]
         self.turn_number = int(turn_info[1])
@@ -129,7 +172,11 @@ class GameState:
     def __create_parsed_units(self, units, player_number):
         """
         Helper function for __parse_state to add units to the map.
+        An ArrayGameMap loads them straight into its arrays.
         """
+        if isinstance(self.game_map, ArrayGameMap):
+            self.game_map.load_units(units, player_number)
+            return
         typedef = self.config.get("unitInformation")
         for i, unit_types in enumerate(units):
             for uinfo in unit_types:
@@ -145,9 +192,9 @@ class GameState:
                 elif unit_type == UPGRADE:
                     if self.contains_stationary_unit([x,y]):
                         self.game_map[x,y][0].upgrade()
+                        self.game_map.refresh_unit_stats([x,y])
                 else:
-                    unit = GameUnit(unit_type, self.config, player_number, hp, x, y)
-                    self.game_map[x,y].append(unit)
+                    self.game_map.add_unit(unit_type, [x,y], player_number, hp)
 
     def __resource_required(self, unit_type):
         return self.CORES if is_stationary(unit_type) else self.BITS
@@ -163,11 +210,102 @@ class GameState:
         elif resource_type == self.CORES:
             resource_key = 'cores'
         held_resource = self.get_resource(resource_type, player_index)
+        self._record_undo(self._player_resources[player_index].__setitem__, resource_key, held_resource)
         self._player_resources[player_index][resource_key] = held_resource + amount
 
+    def _record_undo(self, function, *args):
+        """
+        Adds function(*args) to the undo log if a savepoint is active.
+        Rolling back calls the logged functions in reverse order.
+        """
+        if self._savepoints:
+            self._undo_log.append((function, args))
+
+    def savepoint(self):
+        """Starts recording changes so that they can be undone with rollback. Savepoints can be nested.
+
+        Changes made by attempt_spawn, attempt_remove, attempt_upgrade and the add_unit, remove_unit
+        and assignment functions of game_map are recorded, so trying a hypothetical move costs time
+        proportional to what it changes instead of a copy of the whole state.
+        If you edit units returned by game_map[x, y] directly, call game_map.record_tile first.
+
+        Returns:
+            An id for the savepoint, to pass to rollback or release_savepoint
+
+        """
+        self._savepoints.append(len(self._undo_log))
+        self.game_map._undo_log = self._undo_log
+        return len(self._savepoints)
+
+    def __savepoint_depth(self, savepoint):
+        if savepoint is None:
+            savepoint = len(self._savepoints)
+        if savepoint < 1 or savepoint > len(self._savepoints):
+            self.warn("Savepoint {} is not active. There are {} active savepoints.".format(savepoint, len(self._savepoints)))
+            return None
+        return savepoint
+
+    def __stop_recording(self):
+        if not self._savepoints:
+            self._undo_log.clear()
+            self.game_map._undo_log = None
+
+    def rollback(self, savepoint=None):
+        """Undoes every change recorded since a savepoint and ends that savepoint and the ones nested in it.
+        Units taken from game_map before the rollback may be out of date, fetch them again.
+
+        Args:
+            savepoint: An id returned by savepoint, or None for the most recent one
+
+        """
+        savepoint = self.__savepoint_depth(savepoint)
+        if savepoint is None:
+            return
+        start = self._savepoints[savepoint - 1]
+        del self._savepoints[savepoint - 1:]
+        while len(self._undo_log) > start:
+            function, args = self._undo_log.pop()
+            function(*args)
+        self.__stop_recording()
+
+    def release_savepoint(self, savepoint=None):
+        """Keeps the changes made since a savepoint and ends that savepoint and the ones nested in it.
+        The changes can still be undone by rolling back an enclosing savepoint.
+
+        Args:
+            savepoint: An id returned by savepoint, or None for the most recent one
+
+        """
+        savepoint = self.__savepoint_depth(savepoint)
+        if savepoint is None:
+            return
+        del self._savepoints[savepoint - 1:]
+        self.__stop_recording()
+
+    @contextmanager
+    def hypothetical(self):
+        """Lets you try changes that are rolled back afterwards, for example
+
+            with game_state.hypothetical():
+                game_state.attempt_spawn(FILTER, [13, 11])
+                path = game_state.find_path_to_edge([13, 0])
+
+        Returns:
+            A context manager that yields this GameState
+
+        """
+        savepoint = self.savepoint()
+        try:
+            yield self
+        finally:
+            self.rollback(savepoint)
+
     def _invalid_player_index(self, index):
         self.warn("Invalid player index {} passed, player index should always be 0 (yourself) or 1 (your opponent)".format(index))
     
+    def _invalid_coordinates(self, location):
+        self.warn("Location {} is not in the arena bounds.".format(location))
+
     def _invalid_unit(self, unit):
         self.warn("Invalid unit {}".format(unit))
 
@@ -271,13 +409,59 @@ class GameState:
             self.warn("Invalid current bits ({}). Current bits cannot be negative.".format(current_bits))
 
         bits = self.get_resource(self.BITS, player_index) if not current_bits else current_bits
+        return self.__project_bits(bits, turns_in_future)[-1] if turns_in_future >= 1 else bits
+
+    def __project_bits(self, bits, turns_in_future):
+        resources = self.config["resources"]
+        keep = 1 - resources["bitDecayPerRound"]
+        projection = []
         for increment in range(1, turns_in_future + 1):
             current_turn = self.turn_number + increment
-            bits *= (1 - self.config["resources"]["bitDecayPerRound"])
-            bits_gained = self.config["resources"]["bitsPerRound"] + (self.config["resources"]["bitGrowthRate"] * (current_turn // self.config["resources"]["turnIntervalForBitSchedule"]))
-            bits += bits_gained
-            bits = round(bits, 1)
-        return bits
+            bits_gained = resources["bitsPerRound"] + (resources["bitGrowthRate"] * (current_turn // resources["turnIntervalForBitSchedule"]))
+            bits = round(bits * keep + bits_gained, 1)
+            projection.append(bits)
+        return projection
+
+    def project_resources(self, turns_in_future=10, spend=None):
+        """Predicts the resources of both players on each of the next turns, computed in one pass per player
+
+        Bits follow the same rules as project_future_bits. Cores grow by the config's coresPerRound
+        and stay constant if the config does not define it.
+        Results are cached until the resources of a player change, so repeated calls during a turn are lookups.
+
+        Args:
+            turns_in_future: The number of turns to project, between 1 and 99
+            spend: Optional [[cores, bits], [cores, bits]], what each player spends this turn before the projection.
+                For example [[0, 6], [0, 0]] asks what happens if you spend 6 bits now.
+
+        Returns:
+            A tuple indexed [player_index][resource_type][turn - 1] where resource_type is CORES (0) or BITS (1).
+            For example project_resources(10)[0][BITS][9] is the number of bits you will have in 10 turns.
+
+        """
+        if turns_in_future < 1 or turns_in_future > 99:
+            self.warn("Invalid turns in future used ({}). Turns in future should be between 1 and 99".format(turns_in_future))
+            return
+        if spend is None:
+            spend = [[0, 0], [0, 0]]
+        starting = []
+        for player_index in [0, 1]:
+            cores = self.get_resource(self.CORES, player_index) - spend[player_index][self.CORES]
+            bits = self.get_resource(self.BITS, player_index) - spend[player_index][self.BITS]
+            if cores < 0 or bits < 0:
+                self.warn("Player {} cannot spend {}, they only have {}".format(player_index, spend[player_index], self.get_resources(player_index)))
+            starting.append((cores, bits))
+
+        key = (self.turn_number, turns_in_future, tuple(starting))
+        projection = self._resource_projections.get(key)
+        if projection is None:
+            cores_per_round = self.config["resources"].get("coresPerRound", 0)
+            projection = tuple(
+                (tuple(cores + cores_per_round * increment for increment in range(1, turns_in_future + 1)),
+                 tuple(self.__project_bits(bits, turns_in_future)))
+                for cores, bits in starting)
+            self._resource_projections[key] = projection
+        return projection
 
     def type_cost(self, unit_type, upgrade=False):
         """Gets the cost of a unit based on its type
@@ -293,12 +477,9 @@ class GameState:
             self._invalid_unit(unit_type)
             return
         
-        unit_def = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[unit_type]]
-        cost_base = [unit_def.get('cost1', 0), unit_def.get('cost2', 0)]
         if upgrade:
-            return [unit_def.get('upgrade', {}).get('cost1', cost_base[CORES]), unit_def.get('upgrade', {}).get('cost2', cost_base[BITS])]
-
-        return cost_base
+            return list(self.unit_specs.upgrade_costs[unit_type])
+        return list(self.unit_specs.get(unit_type).cost)
 
 
     def can_spawn(self, unit_type, location, num=1):
@@ -330,7 +511,7 @@ class GameState:
         stationary = is_stationary(unit_type)
         blocked = self.contains_stationary_unit(location) or (stationary and len(self.game_map[location[0],location[1]]) > 0)
         correct_territory = location[1] < self.HALF_ARENA
-        on_edge = location in (self.game_map.get_edge_locations(self.game_map.BOTTOM_LEFT) + self.game_map.get_edge_locations(self.game_map.BOTTOM_RIGHT))
+        on_edge = self.game_map.get_location_edge(location) in (self.game_map.BOTTOM_LEFT, self.game_map.BOTTOM_RIGHT)
 
         if self.enable_warnings:
             fail_reason = ""
@@ -349,6 +530,35 @@ class GameState:
                 (stationary or on_edge) and
                 (not stationary or num == 1))
 
+    def get_spawnable_mask(self, unit_type):
+        """Gets every location where you could spawn one unit of a given type right now, in one pass over your half.
+        Uses the same rules as can_spawn.
+
+        Args:
+            unit_type: The type of the unit
+
+        Returns:
+            A bytearray indexed by x * ARENA_SIZE + y, 1 where can_spawn(unit_type, location) is True and 0 elsewhere
+
+        """
+        if unit_type not in ALL_UNITS:
+            self._invalid_unit(unit_type)
+            return
+
+        size = self.game_map.ARENA_SIZE
+        mask = bytearray(size * size)
+        if self.number_affordable(unit_type) < 1:
+            return mask
+        stationary = is_stationary(unit_type)
+        geometry = self.game_map.geometry
+        candidates = geometry.halves[0] if stationary else geometry.edges[self.game_map.BOTTOM_LEFT] + geometry.edges[self.game_map.BOTTOM_RIGHT]
+        for x, y in candidates:
+            units = self.game_map[x, y]
+            blocked = len(units) > 0 if stationary else any(unit.stationary for unit in units)
+            if not blocked:
+                mask[x * size + y] = 1
+        return mask
+
     def attempt_spawn(self, unit_type, locations, num=1):
         """Attempts to spawn new units with the type given in the given locations.
 
@@ -380,8 +590,10 @@ class GameState:
                     self.__set_resource(BITS, 0 - costs[BITS])
                     self.game_map.add_unit(unit_type, location, 0)
                     if is_stationary(unit_type):
+                        self._record_undo(self._build_stack.pop)
                         self._build_stack.append((unit_type, x, y))
                     else:
+                        self._record_undo(self._deploy_stack.pop)
                         self._deploy_stack.append((unit_type, x, y))
                     spawned_units += 1
                 else:
@@ -404,6 +616,7 @@ class GameState:
         for location in locations:
             if location[1] < self.HALF_ARENA and self.contains_stationary_unit(location):
                 x, y = map(int, location)
+                self._record_undo(self._build_stack.pop)
                 self._build_stack.append((REMOVE, x, y))
                 removed_units += 1
             else:
@@ -432,13 +645,16 @@ class GameState:
                     if unit.stationary:
                         existing_unit = unit
 
-                if not existing_unit.upgraded and self.config["unitInformation"][UNIT_TYPE_TO_INDEX[existing_unit.unit_type]].get("upgrade", None) is not None:
+                if not existing_unit.upgraded and self.unit_specs.has_upgrade[existing_unit.unit_type]:
                     costs = self.type_cost(existing_unit.unit_type, True)
                     resources = self.get_resources()
                     if resources[CORES] >= costs[CORES] and resources[BITS] >= costs[BITS]:
                         self.__set_resource(CORES, 0 - costs[CORES])
                         self.__set_resource(BITS, 0 - costs[BITS])
+                        self.game_map.record_tile([x, y])
                         existing_unit.upgrade()
+                        self.game_map.refresh_unit_stats([x, y])
+                        self._record_undo(self._build_stack.pop)
                         self._build_stack.append((UPGRADE, x, y))
                         spawned_units += 1
             else:
@@ -480,6 +696,9 @@ class GameState:
             A list of locations corresponding to the path the unit would take 
             to get from it's starting location to the best available end location
 
+        Paths are cached until a firewall is added to or removed from game_map, so calling this
+        repeatedly within a turn is cheap.
+
         """
         if self.contains_stationary_unit(start_location):
             self.warn("Attempted to perform pathing from blocked starting location {}".format(start_location))
@@ -491,6 +710,137 @@ class GameState:
         end_points = self.game_map.get_edge_locations(target_edge)
         return self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
 
+    def get_distance_field(self, target_edge):
+        """Gets the number of moves from every tile to a target edge, as used by pathing.
+        Computed once per wall layout and shared with find_path_to_edge, so reading it is much cheaper than
+        finding paths one by one. For any location whose path reaches target_edge, the path has
+        field[x * ARENA_SIZE + y] moves.
+
+        Args:
+            target_edge: The edge units are heading for. game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc.
+
+        Returns:
+            An array of int16 indexed by x * ARENA_SIZE + y. Locations that are blocked, outside of the arena
+            or cut off from the edge are -1.
+
+        """
+        end_points = self.game_map.get_edge_locations(target_edge)
+        if end_points is None:
+            return
+        return self._shortest_path_finder.get_distance_field(end_points, self)
+
+    def find_edge_spawn_paths(self):
+        """Gets the path a unit would take from every location on your two edges at once.
+        Much faster than calling find_path_to_edge for each location, since starts heading
+        for the same edge share a single search.
+
+        Returns:
+            A dict mapping each location on game_map.BOTTOM_LEFT and game_map.BOTTOM_RIGHT, as an (x, y) tuple,
+            to a tuple (path, path_length, end_location). path is the list of locations find_path_to_edge would return,
+            path_length is the number of moves along it and end_location is its final location, which is a self
+            destruct location if it is not on the target edge. Locations blocked by a firewall map to None.
+
+        """
+        spawn_paths = {}
+        for edge in [self.game_map.BOTTOM_LEFT, self.game_map.BOTTOM_RIGHT]:
+            start_points = self.game_map.get_edge_locations(edge)
+            end_points = self.game_map.get_edge_locations(self.get_target_edge(start_points[0]))
+            paths = self._shortest_path_finder.navigate_multiple_starts(start_points, end_points, self)
+            for start, path in paths.items():
+                spawn_paths[start] = None if path is None else (path, len(path) - 1, path[-1])
+        return spawn_paths
+
+    def evaluate_wall_placements(self, placements, processes=None):
+        """Measures how each of several hypothetical firewall changes would alter the paths from every edge.
+        Each placement is tried on its own against the current map, which is left unchanged.
+        Large batches are spread over a process pool, small ones are evaluated in this process.
+
+        Args:
+            placements: A list of [unit_type, location] pairs. unit_type is a firewall type to place one at location,
+                or REMOVE to take away the firewall at location.
+            processes: The number of worker processes to use. Defaults to one per CPU, 1 forces serial evaluation.
+
+        Returns:
+            A list with one dict per placement, in order. Each dict maps the start location, as an (x, y) tuple,
+            of every edge location on either side whose path changes to a tuple (path_length, end_location, self_destructs),
+            where self_destructs is True if end_location is not on the target edge. Starts the placement blocks map to None.
+
+        """
+        for unit_type, location in placements:
+            if unit_type != REMOVE and not is_stationary(unit_type):
+                self._invalid_unit(unit_type)
+                return
+            if not self.game_map.in_arena_bounds(location):
+                self._invalid_coordinates(location)
+                return
+
+        chunks = split_chunks(placements, processes)
+        if len(chunks) == 1:
+            return self._wall_placement_impacts(placements)
+
+        walls = []
+        for location in list(self.game_map):
+            unit = self.contains_stationary_unit(location)
+            if unit:
+                walls.append((unit.unit_type, location[0], location[1], unit.player_index))
+        calls = [(self.config, self.serialized_string, walls, chunk) for chunk in chunks]
+        results = run_parallel(_wall_placement_worker, calls, processes)
+        if results is None:
+            return self._wall_placement_impacts(placements)
+
+        impacts = []
+        for chunk, result in zip(chunks, results):
+            impacts.extend(result if result is not None else self._wall_placement_impacts(chunk))
+        return impacts
+
+    def _wall_placement_impacts(self, placements):
+        """
+        Serial implementation of evaluate_wall_placements.
+        Applies each placement to game_map under a savepoint, lets an ArrayPathFinder repair its paths, then rolls the map back.
+        """
+        path_finder = ArrayPathFinder()
+        targets = {}
+        for edge in [self.game_map.TOP_RIGHT, self.game_map.TOP_LEFT, self.game_map.BOTTOM_LEFT, self.game_map.BOTTOM_RIGHT]:
+            start_points = self.game_map.get_edge_locations(edge)
+            target_edge = self.get_target_edge(start_points[0])
+            end_points = self.game_map.get_edge_locations(target_edge)
+            path_finder.navigate_multiple_starts(start_points, end_points, self)
+            for start in start_points:
+                targets[tuple(start)] = end_points
+        path_finder.update_walls(self)
+
+        impacts = []
+        for unit_type, location in placements:
+            x, y = map(int, location)
+            with self.hypothetical():
+                if unit_type == REMOVE:
+                    self.game_map.remove_unit([x, y])
+                else:
+                    self.game_map.add_unit(unit_type, [x, y], 0 if y < self.HALF_ARENA else 1)
+
+                impact = {}
+                for start, path in path_finder.update_walls(self).items():
+                    if path is None:
+                        impact[start] = None
+                    else:
+                        impact[start] = (len(path) - 1, path[-1], path[-1] not in targets[start])
+            impacts.append(impact)
+            path_finder.update_walls(self)
+        return impacts
+
+    def set_path_finder(self, path_finder):
+        """Chooses the pathfinding engine used by find_path_to_edge and find_edge_spawn_paths
+
+        Args:
+            path_finder: A ShortestPathFinder or a subclass of it, for example navigation.ArrayPathFinder(),
+                which gives identical paths using flat arrays and is considerably faster
+
+        """
+        if not isinstance(path_finder, ShortestPathFinder):
+            self.warn("Passed a {} to set_path_finder. Expected a ShortestPathFinder.".format(type(path_finder)))
+            return
+        self._shortest_path_finder = path_finder
+
     def contains_stationary_unit(self, location):
         """Check if a location is blocked, return firewall unit if it is
 
@@ -608,6 +958,263 @@ class GameState:
                     target_x_distance = unit_x_distance
         return target
 
+    def get_targets(self, attacking_units=None):
+        """Finds the targets of many attackers at once, choosing the same targets as get_target.
+
+        The units on the board are sorted once into the best candidate of each tile, per owner and per
+        stationary or mobile. Each attacker then looks for the nearest of them with threat.nearest_target,
+        which the action phase simulator uses as well.
+
+        Args:
+            attacking_units: A list of GameUnits on the map, or None for every unit on the map that deals damage
+
+        Returns:
+            A list of (attacking_unit, target) tuples in the order of attacking_units, where target is None if nothing is in range
+
+        """
+        units = self.game_map.units_of()
+        if attacking_units is None:
+            attacking_units = [unit for unit in units if unit.damage_f > 0 or unit.damage_i > 0]
+
+        size = self.ARENA_SIZE
+        center = self.HALF_ARENA - 0.5
+        hit_radius = self.unit_specs.hit_radius
+        tile_best = {}
+        for unit in units:
+            tiles = tile_best.setdefault((unit.player_index, unit.stationary), {})
+            best = tiles.get(unit.x * size + unit.y)
+            if best is None or unit.health < best.health:
+                tiles[unit.x * size + unit.y] = unit
+        # The tiles each player's attackers can target, mobile and stationary, gathered once for every attacker
+        candidates = {(player_index, stationary): [tiles for (owner, unit_stationary), tiles in tile_best.items()
+                                                   if unit_stationary == stationary and owner != player_index]
+                      for player_index in [0, 1] for stationary in [False, True]}
+
+        targets = []
+        for attacking_unit in attacking_units:
+            target = None
+            # Mobile units are preferred, stationary ones are only targeted if no mobile unit is in range
+            for stationary, damage in [(False, attacking_unit.damage_i), (True, attacking_unit.damage_f)]:
+                if damage == 0:
+                    continue
+                target = nearest_target(attacking_unit.x, attacking_unit.y, attacking_unit.player_index, attacking_unit.attackRange, hit_radius,
+                                        candidates[attacking_unit.player_index, stationary], size, center)
+                if target is not None:
+                    break
+            targets.append((attacking_unit, target))
+        return targets
+
+    def get_threat(self, location, player_index=0):
+        """Gets the damage per frame a mobile unit would take from enemy stationary units at a location.
+        Reads the map's ThreatField, so it costs a single lookup and accounts for upgrades.
+
+        Args:
+            location: The location of a hypothetical mobile unit
+            player_index: The index corresponding to the player controlling that unit, 0 for you 1 for the enemy
+
+        Returns:
+            The summed damage per frame of every enemy stationary unit in range of the location
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return
+        if not self.game_map.in_arena_bounds(location):
+            self.warn("Location {} is not in the arena bounds.".format(location))
+            return
+        return self.game_map.get_threat_field().damage_at(location, player_index)
+
+    def get_path_damage(self, path, player_index=0):
+        """Estimates the damage a mobile unit would take walking a path, one frame of fire per location
+
+        Args:
+            path: A list of locations, for example from find_path_to_edge
+            player_index: The index corresponding to the player controlling the unit, 0 for you 1 for the enemy
+
+        Returns:
+            The sum of get_threat over the locations of the path
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return
+        return self.game_map.get_threat_field().path_damage(path, player_index)
+
+    def get_path_timeline(self, path, unit_type):
+        """Works out when a mobile unit walking a path arrives on each of its locations.
+        A unit moves once every 1/speed frames, starting on the first location of the path at frame 0.
+
+        Args:
+            path: A list of locations, for example from find_path_to_edge or find_edge_spawn_paths
+            unit_type: The type of the mobile unit, PING, EMP or SCRAMBLER
+
+        Returns:
+            A tuple (timeline, total_frames). timeline is a list of (frame, location) pairs, one per location of the path,
+            giving the frame the unit arrives there. total_frames is the frame it reaches the last location,
+            where it breaches if that location is on its target edge and self destructs otherwise.
+
+        """
+        if not path:
+            self.warn("Cannot build a timeline for path {}, there is no location to walk".format(path))
+            return
+        if unit_type not in ALL_UNITS or is_stationary(unit_type):
+            self._invalid_unit(unit_type)
+            return
+        speed = self.unit_specs.get(unit_type).speed
+        if speed <= 0:
+            self.warn("Unit {} has no speed, it never moves".format(unit_type))
+            return
+
+        timeline = [(math.ceil(round(step / speed, 6)), location) for step, location in enumerate(path)]
+        return timeline, timeline[-1][0]
+
+    def find_dynamic_path(self, start_location, unit_type, removals, target_edge=None):
+        """Gets the route a mobile unit actually takes when firewalls are destroyed during the action phase.
+        The unit re-paths from where it is each time a firewall is removed, as it does in game.
+
+        Args:
+            start_location: The location the unit is spawned at
+            unit_type: The type of the mobile unit, PING, EMP or SCRAMBLER
+            removals: A list of (frame, location) pairs giving the firewalls that are destroyed and the frame it happens.
+                A firewall destroyed on a frame affects the unit's move on that same frame.
+            target_edge: The edge the unit wants to reach. Induced from start_location if None.
+
+        Returns:
+            A tuple (timeline, total_frames) in the same format as get_path_timeline, following the route actually taken
+
+        """
+        if not self.game_map.in_arena_bounds(start_location):
+            self._invalid_coordinates(start_location)
+            return
+        if self.contains_stationary_unit(start_location):
+            self.warn("Attempted to perform pathing from blocked starting location {}".format(start_location))
+            return
+        if unit_type not in ALL_UNITS or is_stationary(unit_type):
+            self._invalid_unit(unit_type)
+            return
+        speed = self.unit_specs.get(unit_type).speed
+        if speed <= 0:
+            self.warn("Unit {} has no speed, it never moves".format(unit_type))
+            return
+
+        if target_edge is None:
+            target_edge = self.get_target_edge(start_location)
+        if self._dynamic_path_finder is None:
+            self._dynamic_path_finder = DynamicPathFinder()
+        end_points = self.game_map.get_edge_locations(target_edge)
+        timeline = self._dynamic_path_finder.navigate_with_removals(start_location, end_points, self, speed, removals)
+        if not timeline:
+            self.warn("No route found from {}".format(start_location))
+            return
+        return timeline, timeline[-1][0]
+
+    def get_timeline_damage(self, timeline, player_index=0):
+        """Estimates the damage a mobile unit takes from enemy stationary units while following a timeline.
+        Every enemy stationary unit in range fires once per frame the unit stands on a location, as in get_threat.
+        The unit takes no fire on the last location, where it breaches or self destructs.
+
+        Args:
+            timeline: A timeline from get_path_timeline
+            player_index: The index corresponding to the player controlling the unit, 0 for you 1 for the enemy
+
+        Returns:
+            A list with, for each entry of the timeline, the total damage taken by the time the unit leaves that location
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return
+        threat_field = self.game_map.get_threat_field()
+        damage = 0
+        cumulative = []
+        for (frame, location), (next_frame, _) in zip(timeline, timeline[1:]):
+            damage += threat_field.damage_at(location, player_index) * (next_frame - frame)
+            cumulative.append(damage)
+        if timeline:
+            cumulative.append(damage)
+        return cumulative
+
+    def simulate_action_phase(self, build_stacks=None, deploy_stacks=None, max_frames=MAX_FRAMES, on_frame=None):
+        """Predicts the action phase that follows this turn, frame by frame.
+        See simulator.py for the order of events within a frame. The GameState is left unchanged.
+
+        Units already on game_map take part as they are, including the ones you placed with attempt_spawn,
+        so only pass the actions that are not on the map yet, typically the enemy's.
+
+        Args:
+            build_stacks: Optional [your actions, the enemy's actions], lists of (unit_type, x, y) firewall, REMOVE or UPGRADE actions
+            deploy_stacks: Optional [your actions, the enemy's actions], lists of (unit_type, x, y) mobile units to deploy
+            max_frames: The frame after which the simulation stops even if mobile units remain
+            on_frame: Optional function called with each FrameOutcome, the units and the health once the frame has played out,
+                see ActionPhaseSimulator.simulate
+
+        Returns:
+            An ActionPhaseResult with a FrameOutcome per frame and the units, health and cores after the phase
+
+        """
+        if self._simulator is None:
+            self._simulator = ActionPhaseSimulator(self)
+        return self._simulator.simulate(build_stacks, deploy_stacks, max_frames, on_frame)
+
+    def evaluate_attack_plans(self, plans, time_budget=None, processes=None):
+        """Simulates the action phase after each of several candidate attacks, to compare them before spawning any.
+        Each plan is deployed on its own against the units currently on game_map, which is left unchanged.
+        Plans are spread over a process pool when there are enough of them, otherwise they are evaluated in this process.
+
+        Args:
+            plans: A list of plans. Each plan is a list of [unit_type, location, count] mobile unit deployments for you
+            time_budget: Seconds of wall-clock time to spend, or None to evaluate every plan
+            processes: The number of worker processes to use. Defaults to one per CPU, 1 forces serial evaluation.
+
+        Returns:
+            A list with an AttackEstimate per plan, in order. Plans that could not be evaluated within time_budget map to None.
+
+        """
+        deadline = None if time_budget is None else time.time() + time_budget
+        for plan in plans:
+            for unit_type, location, count in plan:
+                if not self.unit_specs.get(unit_type) or is_stationary(unit_type):
+                    self._invalid_unit(unit_type)
+                    return
+                if not self.game_map.in_arena_bounds(location):
+                    self._invalid_coordinates(location)
+                    return
+
+        # A simulation takes milliseconds, so a few plans are already worth sending to another process
+        chunks = split_chunks(plans, processes, min_chunk_size=4)
+        if len(chunks) == 1:
+            return self._attack_plan_estimates(plans, deadline)
+
+        units = [(unit.unit_type, unit.x, unit.y, unit.player_index, unit.health, unit.upgraded, unit.pending_removal)
+                 for unit in self.game_map.units_of()]
+        worker_deadline = None if deadline is None else deadline - RESULT_MARGIN
+        calls = [(self.config, self.serialized_string, units, chunk, worker_deadline) for chunk in chunks]
+        results = run_parallel(_attack_plan_worker, calls, processes, None if deadline is None else max(0, deadline - time.time()))
+        if results is None:
+            return self._attack_plan_estimates(plans, deadline)
+
+        estimates = []
+        for chunk, result in zip(chunks, results):
+            estimates.extend(result if result is not None else self._attack_plan_estimates(chunk, deadline))
+        return estimates
+
+    def _attack_plan_estimates(self, plans, deadline=None):
+        """
+        Serial implementation of evaluate_attack_plans.
+        Stops starting simulations once the slowest one so far would not finish before deadline, a time.time() value.
+        """
+        estimates = []
+        slowest = 0
+        for plan in plans:
+            start = time.time()
+            if deadline is not None and start + slowest >= deadline:
+                estimates.append(None)
+                continue
+            deploys = [(unit_type, int(location[0]), int(location[1])) for unit_type, location, count in plan for _ in range(int(count))]
+            estimates.append(self.simulate_action_phase(deploy_stacks=[deploys, []]).get_attack_estimate(0))
+            slowest = max(slowest, time.time() - start)
+        return estimates
+
     def get_attackers(self, location, player_index):
         """Gets the stationary units threatening a given location
 
@@ -616,26 +1223,37 @@ class GameState:
             player_index: The index corresponding to the defending player, 0 for you 1 for the enemy
 
         Returns:
-            A list of units that would attack a unit controlled by the given player at the given location
+            A list of units that would attack a unit controlled by the given player at the given location, ordered by location.
+            These are the enemy stationary units that deal damage to mobile units and whose range covers the location.
+            They are read from the map's ThreatField, which keeps track of them as units are added, removed or upgraded.
 
         """
 
         if not player_index == 0 and not player_index == 1:
             self._invalid_player_index(player_index)
+            return
         if not self.game_map.in_arena_bounds(location):
             self.warn("Location {} is not in the arena bounds.".format(location))
+            return
+
+        threat_field = self.game_map.get_threat_field()
+        return [self.contains_stationary_unit(attacker_location) for attacker_location in threat_field.attacker_locations(location, player_index)]
+
+    def get_attacker_count(self, location, player_index):
+        """Gets the number of stationary units threatening a given location, without building the list
+
+        Args:
+            location: The location of a hypothetical defender
+            player_index: The index corresponding to the defending player, 0 for you 1 for the enemy
+
+        Returns:
+            The number of units get_attackers would return
 
-        attackers = []
-        """
-        Get locations in the range of DESTRUCTOR units
         """
-        max_range = 0
-        for unit in self.config["unitInformation"]:
-            if unit.get('attackRange', 0) >= max_range:
-                max_range = unit.get('attackRange', 0)
-        possible_locations= self.game_map.get_locations_in_range(location, max_range)
-        for location_unit in possible_locations:
-            for unit in self.game_map[location_unit]:
-                if unit.damage_i + unit.damage_f > 0 and unit.player_index != player_index and self.game_map.distance_between_locations(location, location_unit) >= unit.attackRange:
-                    attackers.append(unit)
-        return attackers
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return
+        if not self.game_map.in_arena_bounds(location):
+            self.warn("Location {} is not in the arena bounds.".format(location))
+            return
+        return self.game_map.get_threat_field().attacker_count(location, player_index)
@@ -2,6 +2,8 @@ import heapq
 import math
 import sys
 import queue
+from array import array
+from collections import deque
 from .util import debug_write
 
 class Node:
@@ -35,11 +37,26 @@ class ShortestPathFinder:
         * game_state (:obj: GameState): The current gamestate
         * game_map (:obj: GameMap): The current gamemap
 
+    Paths are cached by start point, end points and the wall_version of the GameMap they were
+    computed on, so repeated queries against an unchanged wall layout do not rerun the search.
+
+    The neighbor table of each arena size and the idealness table of each set of end points are
+    computed once and shared by every pathfinder for the rest of the game.
+
     """
+    _arena_tables = {}
+    _idealness_tables = {}
+
     def __init__(self):
         self.HORIZONTAL = 1
         self.VERTICAL = 2
         self.initialized = False
+        self._size = 0
+        self._cached_map = None
+        self._cached_version = -1
+        self._blocked_locations = []
+        self._path_cache = {}
+        self._distance_fields = {}
 
     def initialize_map(self, game_state):
         """Initializes the map
@@ -51,6 +68,45 @@ class ShortestPathFinder:
         self.initialized = True
         self.game_state = game_state
         self.game_map = [[Node() for x in range(self.game_state.ARENA_SIZE)] for y in range(self.game_state.ARENA_SIZE)]
+        #The same nodes, indexed by x * ARENA_SIZE + y
+        self._nodes = [node for column in self.game_map for node in column]
+        if self._size != game_state.game_map.ARENA_SIZE:
+            self._load_arena_tables(game_state.game_map)
+
+    def _load_arena_tables(self, game_map):
+        """Loads the in-arena mask and neighbor table for the map's arena size, computing them the first time
+
+        Tiles are indexed as x * ARENA_SIZE + y. Each in-arena tile has a tuple of its in-arena neighbors,
+        in the same order as _get_neighbors.
+        """
+        size = game_map.ARENA_SIZE
+        if size not in ShortestPathFinder._arena_tables:
+            tile_count = size * size
+            in_arena = game_map.geometry.bounds_mask
+            neighbors = [()] * tile_count
+            for index in range(tile_count):
+                if not in_arena[index]:
+                    continue
+                x, y = divmod(index, size)
+                neighbors[index] = tuple(nx * size + ny for nx, ny in self._get_neighbors([x, y])
+                                         if 0 <= nx < size and 0 <= ny < size and in_arena[nx * size + ny])
+            ShortestPathFinder._arena_tables[size] = (in_arena, tuple(neighbors))
+        self._size = size
+        self._in_arena, self._neighbors = ShortestPathFinder._arena_tables[size]
+
+    def _idealness_table(self, end_points):
+        """Gets the idealness of every tile towards end_points, indexed by x * ARENA_SIZE + y.
+        End points have an idealness of sys.maxsize, as in _get_idealness.
+        """
+        key = (self._size, tuple(tuple(location) for location in end_points))
+        table = ShortestPathFinder._idealness_tables.get(key)
+        if table is None:
+            size = self._size
+            table = [0] * (size * size)
+            for index in range(size * size):
+                table[index] = self._get_idealness(list(divmod(index, size)), end_points)
+            table = ShortestPathFinder._idealness_tables[key] = tuple(table)
+        return table
 
     def navigate_multiple_endpoints(self, start_point, end_points, game_state):
         """Finds the path a unit would take to reach a set of endpoints
@@ -68,46 +124,178 @@ class ShortestPathFinder:
         if game_state.contains_stationary_unit(start_point):
             return
 
-        #Initialize map 
+        self._sync_cache(game_state)
+        key = (tuple(start_point), tuple(tuple(location) for location in end_points))
+        path = self._path_cache.get(key)
+        if path is None:
+            self._prepare_grid(game_state)
+            #Do pathfinding
+            ideal_endpoints = self._idealness_search(start_point, end_points)
+            self._validate(ideal_endpoints, end_points)
+            path = [list(location) for location in self._get_path(start_point, end_points)]
+            self._path_cache[key] = path
+        return [list(location) for location in path]
+
+    def navigate_multiple_starts(self, start_points, end_points, game_state):
+        """Finds the paths units at several start points would take to reach the same set of endpoints
+
+        Every start that can reach the endpoints shares a single validation search, and starts that are
+        walled into the same pocket share the search of that pocket. The paths are identical to calling
+        navigate_multiple_endpoints once per start.
+
+        Args:
+            * start_points: The starting locations of the units
+            * end_points: The end points of the units, should be a list of edge locations
+            * game_state: The current game state
+
+        Returns:
+            A dict mapping each start point, as an (x, y) tuple, to the path a unit there would take.
+            Starts that are blocked by a firewall map to None.
+
+        """
+        self._sync_cache(game_state)
+        end_key = tuple(tuple(location) for location in end_points)
+        paths = {}
+        pending = []
+        for start_point in start_points:
+            start_key = tuple(start_point)
+            if game_state.contains_stationary_unit(start_point):
+                paths[start_key] = None
+                self._path_cache.setdefault((start_key, end_key), None)
+            elif self._path_cache.get((start_key, end_key)) is not None:
+                paths[start_key] = [list(location) for location in self._path_cache[(start_key, end_key)]]
+            else:
+                pending.append(start_point)
+        if not pending:
+            return paths
+
+        #Validate from the edge once, every start it reaches uses the same pathlengths
+        self._prepare_grid(game_state)
+        self._validate(end_points[0], end_points)
+        pocketed = []
+        for start_point in pending:
+            if self._reached(start_point):
+                self._store_path(paths, start_point, end_points, end_key)
+            else:
+                pocketed.append(start_point)
+
+        #Starts cut off from the edge self destruct, search each pocket once
+        while pocketed:
+            self._prepare_grid(game_state)
+            ideal_tile = self._idealness_search(pocketed[0], end_points)
+            self._validate(ideal_tile, end_points)
+            remaining = []
+            for start_point in pocketed:
+                if self._reached(start_point):
+                    self._store_path(paths, start_point, end_points, end_key)
+                else:
+                    remaining.append(start_point)
+            pocketed = remaining
+        return paths
+
+    def _store_path(self, paths, start_point, end_points, end_key):
+        """Walks the current pathlengths from start_point, caching and recording the resulting path
+        """
+        path = [list(location) for location in self._get_path(start_point, end_points)]
+        self._path_cache[(tuple(start_point), end_key)] = path
+        paths[tuple(start_point)] = [list(location) for location in path]
+
+    def _reached(self, location):
+        """True if the last validation search reached location
+        """
+        return self.game_map[location[0]][location[1]].visited_validate
+
+    def _prepare_grid(self, game_state):
+        """Creates a fresh grid with the cached wall layout filled in
+        """
         self.initialize_map(game_state)
-        #Fill in walls
-        for location in self.game_state.game_map:
-            if self.game_state.contains_stationary_unit(location):
-                self.game_map[location[0]][location[1]].blocked = True
-        #Do pathfinding
-        ideal_endpoints = self._idealness_search(start_point, end_points)
-        self._validate(ideal_endpoints, end_points)
-        return self._get_path(start_point, end_points)
+        for x, y in self._blocked_locations:
+            self.game_map[x][y].blocked = True
+
+    def _sync_cache(self, game_state):
+        """Drops cached paths and rescans the walls if the map or its wall layout changed since the last query
+
+        Returns:
+            True if the walls were rescanned
+        """
+        game_map = game_state.game_map
+        if self._cached_map is game_map and self._cached_version == game_map.wall_version:
+            return False
+        self._cached_map = game_map
+        self._cached_version = game_map.wall_version
+        self._path_cache = {}
+        self._distance_fields = {}
+        self._blocked_locations = [location for location in game_map if game_state.contains_stationary_unit(location)]
+        return True
+
+    def clear_cache(self):
+        """Forgets all cached paths. Only needed if the map was edited without updating game_map.wall_version
+        """
+        self._cached_map = None
+        self._cached_version = -1
+        self._path_cache = {}
+        self._distance_fields = {}
+
+    def get_distance_field(self, end_points, game_state):
+        """Gets the number of moves from every tile to the nearest of a set of endpoints
+
+        These are the pathlengths the validation step computes for any unit that can reach the endpoints,
+        so path_length = field[x * ARENA_SIZE + y] for every such start. The field is cached until the walls change.
+
+        Args:
+            * end_points: The end points, should be a list of edge locations
+            * game_state: The current game state
+
+        Returns:
+            An array of int16 indexed by x * ARENA_SIZE + y. Tiles that are blocked, outside of the arena
+            or cannot reach the endpoints are -1.
+
+        """
+        self._sync_cache(game_state)
+        end_key = tuple(tuple(location) for location in end_points)
+        field = self._distance_fields.get(end_key)
+        if field is None:
+            self._prepare_grid(game_state)
+            self._validate(end_points[0], end_points)
+            field = array('h', [-1]) * (self._size * self._size)
+            for index, node in enumerate(self._nodes):
+                if not node.blocked:
+                    field[index] = node.pathlength
+            self._distance_fields[end_key] = field
+        return array('h', field)
 
     def _idealness_search(self, start, end_points):
         """
         Finds the most ideal tile in our 'pocket' of pathable space. 
         The edge if it is available, or the best self destruct location otherwise
         """
-        current = queue.Queue()
-        current.put(start)
-        best_idealness = self._get_idealness(start, end_points)
-        self.game_map[start[0]][start[1]].visited_idealness = True
-        most_ideal = start
+        size = self._size
+        nodes = self._nodes
+        neighbors = self._neighbors
+        idealness = self._idealness_table(end_points)
+        start_index = start[0] * size + start[1]
+        current = deque([start_index])
+        best_idealness = idealness[start_index]
+        nodes[start_index].visited_idealness = True
+        most_ideal = start_index
 
-        while not current.empty():
-            search_location = current.get()
-            for neighbor in self._get_neighbors(search_location):
-                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+        while current:
+            for neighbor in neighbors[current.popleft()]:
+                node = nodes[neighbor]
+                if node.blocked:
                     continue
 
-                x, y = neighbor
-                current_idealness = self._get_idealness(neighbor, end_points)
-
-                if current_idealness > best_idealness:
-                    best_idealness = current_idealness
+                if idealness[neighbor] > best_idealness:
+                    best_idealness = idealness[neighbor]
                     most_ideal = neighbor
 
-                if not self.game_map[x][y].visited_idealness and not self.game_map[x][y].blocked:
-                    self.game_map[x][y].visited_idealness = True
-                    current.put(neighbor)
+                if not node.visited_idealness:
+                    node.visited_idealness = True
+                    current.append(neighbor)
 
-        return most_ideal
+        if most_ideal == start_index:
+            return start
+        return list(divmod(most_ideal, size))
 
     def _get_neighbors(self, location):
         """Get the locations adjacent to a location
@@ -314,3 +502,601 @@ class ShortestPathFinder:
             sys.stderr.write(" ")
         sys.stderr.write(str(number))
         sys.stderr.write(" ")
+
+
+class ArrayPathFinder(ShortestPathFinder):
+    """Handles pathfinding using flat preallocated arrays instead of a grid of Nodes
+
+    Tiles are indexed as x * ARENA_SIZE + y. Walls are kept in a bytearray, pathlengths in an int16 array,
+    and each in-arena tile has a precomputed tuple of its in-arena neighbors, in the same order as
+    ShortestPathFinder._get_neighbors. The searches are the same as ShortestPathFinder's, so the paths are identical.
+    Use it with game_state.set_path_finder(ArrayPathFinder()).
+
+    The distance field towards each set of end points is kept between queries. When a few firewalls are added or
+    removed, the fields are repaired around the changed tiles instead of being recomputed, and the cached paths
+    are rewalked. update_walls reports which of them changed.
+
+    Attributes :
+        * HORIZONTAL (int): A constant representing a horizontal movement
+        * VERTICAL (int): A constant representing a vertical movement
+        * MAX_REPAIRS (int): The most wall changes repaired incrementally, larger changes rebuild the fields
+
+        * game_state (:obj: GameState): The current gamestate
+
+    """
+    MAX_REPAIRS = 16
+
+    def __init__(self):
+        super().__init__()
+        self._edge_fields = {}
+        self._pending_changes = {}
+        self._path_dependencies = {}
+
+    def _build_tables(self, game_map):
+        """Loads the arena tables and allocates the search arrays, once per arena size
+        """
+        self._load_arena_tables(game_map)
+        tile_count = self._size * self._size
+        self._unvisited = array('h', [-1]) * tile_count
+        self._walls = bytearray(tile_count)
+        self._blocked = bytearray(tile_count)
+        self._pathlength = array('h', self._unvisited)
+        self._visited = bytearray(tile_count)
+
+    def initialize_map(self, game_state):
+        """Initializes the map
+
+        Args:
+            game_state: A GameState object representing the gamestate we want to traverse
+        """
+        self.initialized = True
+        self.game_state = game_state
+        if self._size != game_state.game_map.ARENA_SIZE:
+            self._build_tables(game_state.game_map)
+        self._blocked[:] = bytes(len(self._blocked))
+        self._pathlength[:] = self._unvisited
+        self._visited[:] = bytes(len(self._visited))
+
+    def _sync_cache(self, game_state):
+        game_map = game_state.game_map
+        if self._size != game_map.ARENA_SIZE:
+            self._build_tables(game_map)
+            self._cached_map = None
+        if self._cached_map is game_map and self._cached_version == game_map.wall_version:
+            return False
+
+        if self._cached_map is not game_map:
+            super()._sync_cache(game_state)
+            self._fill_walls()
+            self._pending_changes = {}
+            self._path_dependencies = {}
+            return True
+
+        old_cache = self._path_cache
+        changes = game_map.wall_changes_since(self._cached_version)
+        touched = set()
+        if changes is None or len(changes) > self.MAX_REPAIRS:
+            super()._sync_cache(game_state)
+            self._fill_walls()
+            touched = None
+        else:
+            self._cached_version = game_map.wall_version
+            self.game_state = game_state
+            size = self._size
+            for x, y in dict.fromkeys(changes):
+                index = x * size + y
+                now_blocked = 1 if game_state.contains_stationary_unit([x, y]) else 0
+                if self._walls[index] == now_blocked:
+                    continue
+                self._walls[index] = now_blocked
+                touched.add(index)
+                if now_blocked:
+                    self._blocked_locations.append([x, y])
+                else:
+                    self._blocked_locations.remove([x, y])
+                for field, end_mask in self._edge_fields.values():
+                    self._repair_field(field, end_mask, index, touched)
+        self._rewalk_cached_paths(old_cache, touched, game_state)
+        return True
+
+    def _fill_walls(self):
+        """Rebuilds the wall bytearray from the blocked locations and drops the kept distance fields
+        """
+        size = self._size
+        self._walls[:] = bytes(len(self._walls))
+        for x, y in self._blocked_locations:
+            self._walls[x * size + y] = 1
+        self._edge_fields = {}
+
+    def _rewalk_cached_paths(self, old_cache, touched, game_state):
+        """Recomputes the previously cached paths after the walls changed, noting the ones that changed for update_walls.
+        A path walked over an edge field only reads the tiles along it and their neighbors, so if none of those
+        were touched by the repair it is kept as is. touched is None after a full rebuild.
+        """
+        old_dependencies = self._path_dependencies
+        self._path_cache = {}
+        self._path_dependencies = {}
+        for (start_key, end_key), old_path in old_cache.items():
+            dependencies = old_dependencies.get((start_key, end_key))
+            if touched is not None and old_path is not None and dependencies is not None and touched.isdisjoint(dependencies):
+                self._path_cache[(start_key, end_key)] = old_path
+                self._path_dependencies[(start_key, end_key)] = dependencies
+                continue
+            start_point = list(start_key)
+            end_points = [list(location) for location in end_key]
+            new_path = self.navigate_multiple_endpoints(start_point, end_points, game_state)
+            baseline, _ = self._pending_changes.get((start_key, end_key), (old_path, None))
+            if new_path == baseline:
+                self._pending_changes.pop((start_key, end_key), None)
+            else:
+                self._pending_changes[(start_key, end_key)] = (baseline, new_path)
+
+    def update_walls(self, game_state):
+        """Brings the pathfinder up to date with the walls on game_state's map and reports changed paths.
+        Intended for trying out firewall placements: add or remove a unit on game_state.game_map,
+        call update_walls, then undo the change and call it again.
+
+        Args:
+            game_state: The GameState whose map was changed
+
+        Returns:
+            A dict mapping the start point, as an (x, y) tuple, of every previously queried path that is now
+            different to its new path, or None if the start is now blocked. Paths are compared to what they were
+            when update_walls was last called. A start is normally queried towards a single edge; if it was queried
+            towards several sets of end points and more than one of those paths changed, the path to the end points
+            that sort first is reported.
+
+        """
+        self._sync_cache(game_state)
+        changed = {}
+        for (start_key, _), (_, new_path) in sorted(self._pending_changes.items(), key=lambda item: item[0]):
+            changed.setdefault(start_key, new_path)
+        self._pending_changes = {}
+        return changed
+
+    def navigate_multiple_endpoints(self, start_point, end_points, game_state):
+        """Finds the path a unit would take to reach a set of endpoints
+
+        Args:
+            * start_point: The starting location of the unit
+            * end_points: The end points of the unit, should be a list of edge locations
+            * game_state: The current game state
+
+        Returns:
+            The path a unit at start_point would take when trying to reach end_points given the current game state.
+
+        """
+        self._sync_cache(game_state)
+        key = (tuple(start_point), tuple(tuple(location) for location in end_points))
+        if game_state.contains_stationary_unit(start_point):
+            #Remember the blocked start so update_walls can report when it opens up
+            self._path_cache.setdefault(key, None)
+            return
+
+        path = self._path_cache.get(key)
+        if path is None:
+            self.game_state = game_state
+            field = self._edge_field(end_points)
+            if field[start_point[0] * self._size + start_point[1]] != -1:
+                path = self._get_path(start_point, end_points, field)
+            else:
+                self._prepare_grid(game_state)
+                ideal_tile = self._idealness_search(start_point, end_points)
+                self._validate(ideal_tile, end_points)
+                path = self._get_path(start_point, end_points)
+            path = [list(location) for location in path]
+            self._path_cache[key] = path
+            self._note_dependencies(key, path, end_points)
+        return [list(location) for location in path]
+
+    def _store_path(self, paths, start_point, end_points, end_key):
+        super()._store_path(paths, start_point, end_points, end_key)
+        key = (tuple(start_point), end_key)
+        self._note_dependencies(key, self._path_cache[key], end_points)
+
+    def _note_dependencies(self, key, path, end_points):
+        """Records the tiles a path walked over an edge field depends on, the path and its neighbors.
+        Self destruct paths depend on their whole pocket, so they are always rewalked.
+        """
+        if path[-1] not in end_points:
+            self._path_dependencies.pop(key, None)
+            return
+        size = self._size
+        neighbors = self._neighbors
+        dependencies = set()
+        for x, y in path:
+            index = x * size + y
+            dependencies.add(index)
+            dependencies.update(neighbors[index])
+        self._path_dependencies[key] = dependencies
+
+    def get_distance_field(self, end_points, game_state):
+        self._sync_cache(game_state)
+        self.game_state = game_state
+        field = array('h', self._edge_field(end_points))
+        size = self._size
+        for x, y in self._blocked_locations:
+            field[x * size + y] = -1
+        return field
+
+    def _edge_field(self, end_points):
+        """Gets the kept distance field towards end_points, computing it if needed
+        """
+        end_key = tuple(tuple(location) for location in end_points)
+        if end_key not in self._edge_fields:
+            size = self._size
+            field = array('h', self._unvisited)
+            end_mask = bytearray(size * size)
+            for x, y in end_points:
+                end_mask[x * size + y] = 1
+                field[x * size + y] = 0
+            self._breadth_first(field, self._walls, [x * size + y for x, y in end_points])
+            self._edge_fields[end_key] = (field, end_mask)
+        return self._edge_fields[end_key][0]
+
+    def _breadth_first(self, pathlength, blocked, current):
+        """Spreads pathlengths out from the already set tiles in current, which are expanded in order
+        """
+        neighbors = self._neighbors
+        current = deque(current)
+        while current:
+            index = current.popleft()
+            if blocked[index]:
+                continue
+            next_pathlength = pathlength[index] + 1
+            for neighbor in neighbors[index]:
+                if not blocked[neighbor] and pathlength[neighbor] == -1:
+                    pathlength[neighbor] = next_pathlength
+                    current.append(neighbor)
+
+    def _repair_field(self, field, end_mask, index, touched):
+        """Repairs a distance field after the wall at index was added or removed, adding every tile whose pathlength changed to touched
+
+        A new wall invalidates the tiles whose every shortest route ran through it, these are found
+        in order of distance, then refilled from their still valid neighbors. A removed wall can only
+        shorten routes, so the field is relaxed outwards from it.
+        """
+        walls = self._walls
+        neighbors = self._neighbors
+
+        if not walls[index]:
+            if not end_mask[index]:
+                best = -1
+                for neighbor in neighbors[index]:
+                    if not walls[neighbor] and field[neighbor] != -1 and (best == -1 or field[neighbor] < best):
+                        best = field[neighbor]
+                if best == -1:
+                    return
+                field[index] = best + 1
+                touched.add(index)
+            current = deque([index])
+            while current:
+                tile = current.popleft()
+                next_pathlength = field[tile] + 1
+                for neighbor in neighbors[tile]:
+                    if walls[neighbor] or end_mask[neighbor]:
+                        continue
+                    if field[neighbor] == -1 or field[neighbor] > next_pathlength:
+                        field[neighbor] = next_pathlength
+                        touched.add(neighbor)
+                        current.append(neighbor)
+            return
+
+        old_pathlength = field[index]
+        if not end_mask[index]:
+            field[index] = -1
+        if old_pathlength == -1:
+            return
+
+        queued = {index}
+        current = deque()
+        for neighbor in neighbors[index]:
+            if not walls[neighbor] and not end_mask[neighbor] and field[neighbor] == old_pathlength + 1:
+                queued.add(neighbor)
+                current.append(neighbor)
+        affected = set()
+        while current:
+            tile = current.popleft()
+            pathlength = field[tile]
+            supported = False
+            for neighbor in neighbors[tile]:
+                if not walls[neighbor] and neighbor not in affected and field[neighbor] == pathlength - 1:
+                    supported = True
+                    break
+            if supported:
+                continue
+            affected.add(tile)
+            for neighbor in neighbors[tile]:
+                if neighbor not in queued and not walls[neighbor] and not end_mask[neighbor] and field[neighbor] == pathlength + 1:
+                    queued.add(neighbor)
+                    current.append(neighbor)
+
+        touched.update(affected)
+        for tile in affected:
+            field[tile] = -1
+        frontier = []
+        for tile in affected:
+            for neighbor in neighbors[tile]:
+                if not walls[neighbor] and neighbor not in affected and field[neighbor] != -1:
+                    if field[tile] == -1 or field[neighbor] + 1 < field[tile]:
+                        field[tile] = field[neighbor] + 1
+            if field[tile] != -1:
+                heapq.heappush(frontier, (field[tile], tile))
+        while frontier:
+            pathlength, tile = heapq.heappop(frontier)
+            if pathlength != field[tile]:
+                continue
+            for neighbor in neighbors[tile]:
+                if walls[neighbor] or end_mask[neighbor]:
+                    continue
+                if field[neighbor] == -1 or field[neighbor] > pathlength + 1:
+                    field[neighbor] = pathlength + 1
+                    heapq.heappush(frontier, (pathlength + 1, neighbor))
+
+    def _prepare_grid(self, game_state):
+        self.initialized = True
+        self.game_state = game_state
+        self._blocked[:] = self._walls
+        self._pathlength[:] = self._unvisited
+        self._visited[:] = bytes(len(self._visited))
+
+    def _reached(self, location):
+        return self._pathlength[location[0] * self._size + location[1]] != -1
+
+    def _idealness_search(self, start, end_points):
+        """
+        Finds the most ideal tile in our 'pocket' of pathable space. 
+        The edge if it is available, or the best self destruct location otherwise
+        """
+        size = self._size
+        blocked = self._blocked
+        visited = self._visited
+        neighbors = self._neighbors
+        idealness = self._idealness_table(end_points)
+        start_index = start[0] * size + start[1]
+        current = deque([start_index])
+        visited[start_index] = 1
+        best_idealness = idealness[start_index]
+        most_ideal = start_index
+
+        while current:
+            for neighbor in neighbors[current.popleft()]:
+                if blocked[neighbor]:
+                    continue
+                if idealness[neighbor] > best_idealness:
+                    best_idealness = idealness[neighbor]
+                    most_ideal = neighbor
+                if not visited[neighbor]:
+                    visited[neighbor] = 1
+                    current.append(neighbor)
+
+        if most_ideal == start_index:
+            return start
+        return list(divmod(most_ideal, size))
+
+    def _validate(self, ideal_tile, end_points):
+        """Breadth first search of the grid, setting the pathlengths of each tile
+        """
+        if ideal_tile in end_points:
+            self._pathlength[:] = self._edge_field(end_points)
+            return
+        index = ideal_tile[0] * self._size + ideal_tile[1]
+        self._pathlength[index] = 0
+        self._breadth_first(self._pathlength, self._blocked, [index])
+
+    def _get_path(self, start_point, end_points, pathlength=None):
+        """Once all tiles are validated, and a target is found, the unit can path to its target
+        """
+        size = self._size
+        if pathlength is None:
+            pathlength = self._pathlength
+        direction = self._get_direction_from_endpoints(end_points)
+        path = [start_point]
+        current = start_point[0] * size + start_point[1]
+        move_direction = 0
+
+        while pathlength[current] != 0:
+            next_index = self._next_index(current, move_direction, pathlength, direction)
+            if next_index // size == current // size:
+                move_direction = self.VERTICAL
+            else:
+                move_direction = self.HORIZONTAL
+            path.append(list(divmod(next_index, size)))
+            current = next_index
+        return path
+
+    def _next_index(self, current, move_direction, pathlength, direction):
+        """Index form of ShortestPathFinder._choose_next_move
+        """
+        size = self._size
+        blocked = self._walls
+        current_x, current_y = divmod(current, size)
+        ideal_neighbor = current
+        best_pathlength = pathlength[current]
+        for neighbor in self._neighbors[current]:
+            if blocked[neighbor]:
+                continue
+            current_pathlength = pathlength[neighbor]
+            if current_pathlength > best_pathlength:
+                continue
+            if current_pathlength == best_pathlength:
+                new_x, new_y = divmod(neighbor, size)
+                best_x, best_y = divmod(ideal_neighbor, size)
+                if not self._better_direction_xy(current_x, current_y, new_x, new_y, best_x, best_y,
+                                                 move_direction, direction[0], direction[1]):
+                    continue
+            ideal_neighbor = neighbor
+            best_pathlength = current_pathlength
+        return ideal_neighbor
+
+    def _better_direction_xy(self, prev_x, prev_y, new_x, new_y, best_x, best_y, previous_move_direction, direction_x, direction_y):
+        """Coordinate form of ShortestPathFinder._better_direction
+        """
+        if previous_move_direction == self.HORIZONTAL and new_x != best_x:
+            return prev_y != new_y
+        if previous_move_direction == self.VERTICAL and new_y != best_y:
+            return prev_x != new_x
+        if previous_move_direction == 0:
+            return prev_y != new_y
+        if new_y == best_y:
+            return (direction_x == 1 and new_x > best_x) or (direction_x == -1 and new_x < best_x)
+        if new_x == best_x:
+            return (direction_y == 1 and new_y > best_y) or (direction_y == -1 and new_y < best_y)
+        return True
+
+    def print_map(self):
+        """Prints an ASCII version of the current game map for debug purposes
+
+        """
+        if not self.initialized:
+            debug_write("Attempted to print_map before pathfinder initialization. Use 'this_object.initialize_map(game_state)' to initialize the map first")
+            return
+
+        size = self._size
+        for y in range(size):
+            for x in range(size):
+                index = x * size + size - y - 1
+                if not self._blocked[index] and not self._pathlength[index] == -1:
+                    self._print_justified(self._pathlength[index])
+                else:
+                    sys.stderr.write("   ")
+            debug_write("")
+
+
+class DynamicPathFinder(ArrayPathFinder):
+    """Follows mobile units through the action phase, re-pathing them as firewalls are destroyed
+
+    Units re-path from wherever they are whenever a firewall is removed, keeping the direction of their
+    last move for tie-breaking, and head for the same edge they were spawned towards. Removals are applied to
+    the kept distance fields with the same local repair update_walls uses, so the grid is never rebuilt.
+    Each navigation restores the walls afterwards, so one DynamicPathFinder can be reused for many units.
+    Use a separate instance from the GameState's own path finder.
+
+    Stepping can also be driven by hand: begin_dynamic, then remove_wall and next_step as the frames
+    play out, then end_dynamic.
+
+    """
+    def __init__(self):
+        super().__init__()
+        self._snapshot = None
+        self._pockets = []
+
+    def navigate_with_removals(self, start_point, end_points, game_state, speed, removals):
+        """Finds the route a unit actually takes when firewalls are removed while it walks
+
+        The unit starts on start_point at frame 0 and moves once every 1/speed frames.
+        Removals scheduled for a frame take effect before the unit moves on that frame.
+
+        Args:
+            * start_point: The starting location of the unit
+            * end_points: The end points of the unit, should be a list of edge locations
+            * game_state: The current game state
+            * speed: The speed of the unit
+            * removals: A list of (frame, location) pairs, the firewalls destroyed and when
+
+        Returns:
+            A list of (frame, location) pairs, the frame the unit arrives at each location of its route.
+            The last location is on the edge if the unit breaches, otherwise the unit self destructs there.
+
+        """
+        if game_state.contains_stationary_unit(start_point):
+            return
+        removals = sorted(removals, key=lambda removal: removal[0])
+        self.begin_dynamic(game_state)
+        try:
+            timeline = [(0, list(start_point))]
+            location = list(start_point)
+            move_direction = 0
+            step = 0
+            next_removal = 0
+            while True:
+                step += 1
+                frame = math.ceil(round(step / speed, 6))
+                while next_removal < len(removals) and removals[next_removal][0] <= frame:
+                    self.remove_wall(removals[next_removal][1])
+                    next_removal += 1
+                move = self.next_step(location, move_direction, end_points)
+                if move is None:
+                    return timeline
+                location, move_direction = move
+                timeline.append((frame, location))
+        finally:
+            self.end_dynamic()
+
+    def begin_dynamic(self, game_state):
+        """Syncs with game_state's walls and remembers them, so end_dynamic can undo any remove_wall
+
+        Args:
+            game_state: The current game state
+
+        """
+        self._sync_cache(game_state)
+        self.game_state = game_state
+        self._snapshot = (bytearray(self._walls), {key: (array('h', field), end_mask) for key, (field, end_mask) in self._edge_fields.items()})
+        self._pockets = []
+
+    def end_dynamic(self):
+        """Restores the walls and distance fields remembered by begin_dynamic
+        """
+        if self._snapshot is None:
+            return
+        walls, edge_fields = self._snapshot
+        self._walls[:] = walls
+        self._edge_fields = edge_fields
+        self._pockets = []
+        self._snapshot = None
+
+    def remove_wall(self, location):
+        """Removes the firewall at a location for the rest of the current dynamic navigation
+
+        Args:
+            location: The location of the destroyed firewall
+
+        """
+        index = int(location[0]) * self._size + int(location[1])
+        if not self._walls[index]:
+            return
+        self._walls[index] = 0
+        touched = set()
+        for field, end_mask in self._edge_fields.values():
+            self._repair_field(field, end_mask, index, touched)
+        self._pockets = []
+
+    def next_step(self, location, previous_move_direction, end_points):
+        """Gets the next move of a unit from its current location
+
+        Args:
+            * location: The unit's current location
+            * previous_move_direction: HORIZONTAL or VERTICAL for the unit's last move, or 0 if it has not moved
+            * end_points: The end points the unit is heading for
+
+        Returns:
+            A tuple (next_location, move_direction), or None if the unit has reached its end point
+            and breaches or self destructs there.
+
+        """
+        size = self._size
+        index = int(location[0]) * size + int(location[1])
+        pathlength = self._edge_field(end_points)
+        if pathlength[index] == -1:
+            pathlength = self._pocket_field(location, end_points)
+        if pathlength[index] == 0:
+            return None
+        next_index = self._next_index(index, previous_move_direction, pathlength, self._get_direction_from_endpoints(end_points))
+        move_direction = self.VERTICAL if next_index // size == index // size else self.HORIZONTAL
+        return list(divmod(next_index, size)), move_direction
+
+    def _pocket_field(self, location, end_points):
+        """Gets the pathlengths towards the self destruct tile of the pocket containing location, searching it once
+        """
+        end_key = tuple(tuple(end) for end in end_points)
+        index = int(location[0]) * self._size + int(location[1])
+        for pocket_key, visited, field in self._pockets:
+            if pocket_key == end_key and visited[index]:
+                return field
+        self._prepare_grid(self.game_state)
+        ideal_tile = self._idealness_search(location, end_points)
+        self._validate(ideal_tile, end_points)
+        field = array('h', self._pathlength)
+        self._pockets.append((end_key, bytes(self._visited), field))
+        return field
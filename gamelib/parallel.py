@@ -0,0 +1,122 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from .util import debug_write
+
+"""
+Helpers for spreading expensive, independent evaluations over several processes.
+The pool is created on first use and kept for the rest of the game, so only the
+first parallel call of the game pays for starting the workers.
+"""
+
+MIN_ITEMS_PER_PROCESS = 16
+# Seconds a worker with a deadline keeps aside for sending its results back
+RESULT_MARGIN = 0.02
+
+_pool = None
+_pool_size = 0
+
+
+def process_count(processes=None):
+    """Gets the number of worker processes to use
+
+    Args:
+        processes: The requested number of processes, or None to use one per CPU
+
+    Returns:
+        The number of processes, at least 1
+
+    """
+    if processes is None:
+        processes = os.cpu_count() or 1
+    return max(1, int(processes))
+
+
+def split_chunks(items, processes=None, min_chunk_size=MIN_ITEMS_PER_PROCESS):
+    """Splits items into contiguous chunks, one per process, without making chunks smaller than min_chunk_size
+
+    Args:
+        items: A list of work items
+        processes: The number of processes available, or None to use one per CPU
+        min_chunk_size: The smallest chunk worth sending to another process
+
+    Returns:
+        A list of lists of items. A single chunk means the work should be done serially.
+
+    """
+    chunk_count = min(process_count(processes), len(items) // max(1, min_chunk_size))
+    if chunk_count <= 1:
+        return [list(items)]
+    chunk_size = math.ceil(len(items) / chunk_count)
+    return [list(items[start:start + chunk_size]) for start in range(0, len(items), chunk_size)]
+
+
+def get_process_pool(processes=None):
+    """Gets the shared process pool, starting it if needed
+
+    Args:
+        processes: The number of worker processes, or None to use one per CPU
+
+    Returns:
+        A concurrent.futures.ProcessPoolExecutor
+
+    """
+    global _pool, _pool_size
+    processes = process_count(processes)
+    if _pool is None or _pool_size != processes:
+        shutdown_process_pool()
+        _pool = ProcessPoolExecutor(max_workers=processes)
+        _pool_size = processes
+    return _pool
+
+
+def shutdown_process_pool():
+    """Stops the shared process pool's workers, if it was started
+    """
+    global _pool, _pool_size
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+    _pool = None
+    _pool_size = 0
+
+
+def run_parallel(function, calls, processes=None, timeout=None):
+    """Runs function(*args) for each args in calls on the shared process pool
+
+    function and its arguments must be picklable, so function has to be defined at module level.
+    Calls still running at the timeout cannot be stopped, so the shared pool is then replaced by a new one.
+
+    Args:
+        function: The function to run in the workers
+        calls: A list of argument tuples, one per call
+        processes: The number of worker processes, or None to use one per CPU
+        timeout: Seconds to wait for the results, or None to wait for all of them
+
+    Returns:
+        A list with the result of each call in order, or None for the calls that did not finish in time.
+        If the pool cannot be used, for example because processes cannot be started, returns None.
+
+    """
+    try:
+        pool = get_process_pool(processes)
+        futures = [pool.submit(function, *args) for args in calls]
+        done, not_done = wait(futures, timeout=timeout)
+    except (OSError, RuntimeError) as error:
+        debug_write("Could not use a process pool, running serially instead: {}".format(error))
+        shutdown_process_pool()
+        return None
+
+    # Calls that already started cannot be cancelled. Their workers are left to finish on their own
+    # and the next call starts a fresh pool, so that it does not queue behind them.
+    if not all([future.cancel() for future in not_done]):
+        shutdown_process_pool()
+    results = []
+    for future in futures:
+        if future in done and future.exception() is None:
+            results.append(future.result())
+        else:
+            if future in done:
+                debug_write("A parallel evaluation failed: {}".format(future.exception()))
+            results.append(None)
+    return results
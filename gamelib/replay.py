@@ -0,0 +1,246 @@
+import json
+from collections import namedtuple
+
+from .game_state import GameState
+from .util import parse_json
+
+"""
+Tools to check the action phase simulator against the game engine.
+
+Record the engine's action frames with an ActionFrameRecorder, for example by setting AlgoCore.frame_recorder,
+then replay each recorded turn with compare_recordings. The first frame of a turn is the board the simulation
+starts from, and the simulated frame i is compared with the recorded frame that follows it by i + 1.
+Boards are compared unit by unit, on owner, type, location and health, and on both players' health.
+"""
+
+
+class UnitDifference(namedtuple("UnitDifference", ["player_index", "unit_type", "x", "y", "simulated", "recorded"])):
+    """The units of one owner and type on a tile, when they differ between the simulation and the engine
+
+    Attributes :
+        * player_index (integer): The owner of the units
+        * unit_type (string): Their type
+        * x (integer): The x coordinate of the tile
+        * y (integer): The y coordinate of the tile
+        * simulated (list): The sorted healths of the simulated units, empty if there are none
+        * recorded (list): The sorted healths of the units in the engine's frame, empty if there are none
+
+    """
+    __slots__ = ()
+
+
+class TurnDiff(namedtuple("TurnDiff", ["turn", "frames_compared", "frames_matching", "first_divergence", "units", "health"])):
+    """The comparison of one recorded action phase with its simulation
+
+    Attributes :
+        * turn (integer): The turn number
+        * frames_compared (integer): The number of recorded frames compared with the simulation
+        * frames_matching (integer): How many of them matched
+        * first_divergence (integer): The engine frame number of the first frame that did not match, None if all matched
+        * units (list): The UnitDifferences on the first frame that did not match
+        * health (tuple): ((your health, enemy health) simulated, (your health, enemy health) recorded) on that frame, None if it matched
+
+    """
+    __slots__ = ()
+
+
+class ActionFrameRecorder:
+    """Keeps the action frames the engine sends, grouped by turn, and saves them for later comparison
+
+    Attributes :
+        * config (JSON): The config of the game
+        * path (string): Where save writes the recording by default, may be None
+        * frames (dict): Maps each turn number to the list of its frames, as the JSON strings the engine sent
+
+    """
+    def __init__(self, config, path=None):
+        """Starts an empty recording
+
+        Args:
+            config (JSON): The config of the game
+            path: Optional file to save the recording to
+
+        """
+        self.config = config
+        self.path = path
+        self.frames = {}
+
+    def record(self, frame_string):
+        """Adds an action frame to the recording
+
+        Args:
+            frame_string: A frame as received by AlgoCore.on_action_frame
+
+        """
+        state = parse_json(frame_string)
+        self.frames.setdefault(int(state["turnInfo"][1]), []).append(frame_string)
+
+    def save(self, path=None):
+        """Writes the recording as JSON lines, the config first and then one frame per line
+
+        Args:
+            path: The file to write, or None to use self.path
+
+        """
+        with open(path or self.path, "w") as recording:
+            recording.write(json.dumps(self.config) + "\n")
+            for turn in sorted(self.frames):
+                for frame_string in self.frames[turn]:
+                    recording.write(frame_string.strip() + "\n")
+
+    @classmethod
+    def load(cls, path):
+        """Reads a recording written by save
+
+        Args:
+            path: The file to read
+
+        Returns:
+            An ActionFrameRecorder holding the recording
+
+        """
+        with open(path) as recording:
+            recorder = cls(json.loads(recording.readline()), path)
+            for line in recording:
+                if line.strip():
+                    recorder.record(line.strip())
+        return recorder
+
+
+class ReplayReport:
+    """The accuracy of the simulator over recorded turns
+
+    Attributes :
+        * turns (list): A TurnDiff for every compared turn
+
+    """
+    def __init__(self, turns):
+        self.turns = turns
+
+    def frame_accuracy(self):
+        """Gets the share of compared frames that matched
+
+        Returns:
+            A float between 0 and 1, or None if no frames were compared
+
+        """
+        compared = sum(turn.frames_compared for turn in self.turns)
+        if not compared:
+            return None
+        return sum(turn.frames_matching for turn in self.turns) / compared
+
+    def turn_accuracy(self):
+        """Gets the share of compared turns in which every frame matched
+
+        Returns:
+            A float between 0 and 1, or None if no turns were compared
+
+        """
+        if not self.turns:
+            return None
+        return sum(1 for turn in self.turns if turn.first_divergence is None) / len(self.turns)
+
+    def get_divergent_turns(self):
+        """Gets the turns in which the simulation diverged, in the order they were compared
+
+        Returns:
+            A list of TurnDiffs
+
+        """
+        return [turn for turn in self.turns if turn.first_divergence is not None]
+
+
+def _recorded_board(state, type_names):
+    board = {}
+    for player_index, key in enumerate(["p1Units", "p2Units"]):
+        for type_index, entries in enumerate(state[key]):
+            unit_type = type_names[type_index] if type_index < len(type_names) else None
+            if unit_type is None:
+                continue
+            for entry in entries:
+                board.setdefault((player_index, unit_type, int(entry[0]), int(entry[1])), []).append(float(entry[2]))
+    return board
+
+
+def _simulated_board(units):
+    board = {}
+    for unit in units:
+        board.setdefault((unit.player_index, unit.unit_type, unit.x, unit.y), []).append(unit.health)
+    return board
+
+
+def _board_differences(simulated, recorded, tolerance):
+    differences = []
+    for key in sorted(set(simulated) | set(recorded)):
+        simulated_health = sorted(simulated.get(key, []))
+        recorded_health = sorted(recorded.get(key, []))
+        if len(simulated_health) != len(recorded_health) or any(abs(a - b) > tolerance for a, b in zip(simulated_health, recorded_health)):
+            differences.append(UnitDifference(*key, simulated_health, recorded_health))
+    return differences
+
+
+def compare_turn(config, frames, tolerance=0.01):
+    """Simulates a recorded action phase and compares it with the engine frame by frame
+
+    Args:
+        config (JSON): The config of the game
+        frames: The turn's action frames in order, as JSON strings
+        tolerance: The largest health difference still counted as a match
+
+    Returns:
+        A TurnDiff, or None if there are fewer than two frames to compare
+
+    """
+    if len(frames) < 2:
+        return None
+    game_state = GameState(config, frames[0])
+    game_state.suppress_warnings(True)
+    # The remove and upgrade markers are not units
+    type_names = [unit_type if game_state.unit_specs.get(unit_type) else None for unit_type in game_state.unit_specs.types]
+
+    recorded = [parse_json(frame_string) for frame_string in frames[1:]]
+    simulated = [(_simulated_board(game_state.game_map.units_of()), [game_state.my_health, game_state.enemy_health])]
+
+    def on_frame(outcome, units, health):
+        simulated.append((_simulated_board(unit for unit in units if unit.alive), health))
+    game_state.simulate_action_phase(max_frames=len(recorded) - 1, on_frame=on_frame)
+
+    frames_matching = 0
+    first_divergence = None
+    units = []
+    health = None
+    for index, state in enumerate(recorded):
+        # Once every mobile unit is gone the board stays as the simulation left it
+        board, simulated_health = simulated[min(index + 1, len(simulated) - 1)]
+        recorded_health = (float(state["p1Stats"][0]), float(state["p2Stats"][0]))
+        differences = _board_differences(board, _recorded_board(state, type_names), tolerance)
+        health_matches = all(abs(a - b) <= tolerance for a, b in zip(simulated_health, recorded_health))
+        if not differences and health_matches:
+            frames_matching += 1
+        elif first_divergence is None:
+            first_divergence = int(state["turnInfo"][2])
+            units = differences
+            health = None if health_matches else (tuple(simulated_health), recorded_health)
+    return TurnDiff(int(recorded[0]["turnInfo"][1]), len(recorded), frames_matching, first_divergence, units, health)
+
+
+def compare_recordings(recordings, tolerance=0.01):
+    """Compares every recorded turn of a corpus of games with the simulator
+
+    Args:
+        recordings: A list of ActionFrameRecorders or paths of recordings written by ActionFrameRecorder.save
+        tolerance: The largest health difference still counted as a match
+
+    Returns:
+        A ReplayReport
+
+    """
+    turns = []
+    for recording in recordings:
+        if not isinstance(recording, ActionFrameRecorder):
+            recording = ActionFrameRecorder.load(recording)
+        for turn in sorted(recording.frames):
+            diff = compare_turn(recording.config, recording.frames[turn], tolerance)
+            if diff is not None:
+                turns.append(diff)
+    return ReplayReport(turns)
@@ -0,0 +1,404 @@
+import math
+from collections import namedtuple
+
+from .array_map import REMOVE_INDEX, UPGRADE_INDEX
+from .navigation import DynamicPathFinder
+from .threat import range_stencil, nearest_target
+from .unit import GameUnit
+
+"""
+A deterministic, frame by frame simulation of the action phase, built on the same pathing,
+targeting and range rules as GameState. Use it through GameState.simulate_action_phase.
+
+Each frame plays out in this order:
+    1. Shields above a unit's max health decay by shieldDecayPerFrame.
+    2. Every encryptor shields each friendly mobile unit in its shieldRange, once per unit.
+    3. Mobile units whose move is due take one step, re-pathing around firewalls destroyed on earlier frames.
+       A unit arriving on its target edge breaches. A unit arriving at the end of a blocked path self destructs,
+       damaging enemy firewalls within selfDestructRadius by its starting health if it moved stepsRequiredSelfDestruct tiles.
+    4. Every unit picks its target as get_target does, then all of them deal their damage at once.
+    5. Units with no health left are destroyed.
+"""
+
+MAX_FRAMES = 1000
+
+
+class FrameOutcome(namedtuple("FrameOutcome", ["frame", "moves", "shields", "attacks", "breaches", "self_destructs", "destroyed"])):
+    """What happened on one frame of a simulated action phase. Units are referred to by their SimulatedUnit id.
+
+    Attributes :
+        * frame (integer): The frame number, starting at 0 when mobile units are spawned
+        * moves (list): (unit id, x, y) for every unit that moved, with the location it moved to
+        * shields (list): (encryptor id, unit id, amount) for every shield given
+        * attacks (list): (attacker id, target id, damage) for every hit, including the damage of self destructs
+        * breaches (list): (unit id, x, y) for every unit that reached its target edge
+        * self_destructs (list): (unit id, x, y) for every unit that self destructed
+        * destroyed (list): The ids of the units destroyed at the end of the frame
+
+    """
+    __slots__ = ()
+
+
+class AttackEstimate(namedtuple("AttackEstimate", ["breaches", "damage_dealt", "firewalls_destroyed", "units_lost", "frames"])):
+    """The simulated outcome of deploying an attack plan, see GameState.evaluate_attack_plans
+
+    Attributes :
+        * breaches (integer): The number of your units that reach their target edge
+        * damage_dealt (float): The damage your units deal to enemy units, including self destructs
+        * firewalls_destroyed (integer): The number of enemy firewalls destroyed
+        * units_lost (integer): The number of your mobile units destroyed or self destructed
+        * frames (integer): The number of frames the action phase lasts
+
+    """
+    __slots__ = ()
+
+
+class SimulatedUnit(GameUnit):
+    """A copy of a GameUnit that a simulation updates as the frames play out
+
+    Attributes :
+        * id (integer): The position of the unit in ActionPhaseResult.units
+        * alive (bool): False once the unit is destroyed, breaches or self destructs
+        * target_edge (integer): The edge a mobile unit is heading for, None for stationary units
+        * steps (integer): The number of moves the unit made
+
+    """
+    __slots__ = ("id", "alive", "target_edge", "steps", "_move_direction", "_next_frame", "_shielded_by")
+
+    def __init__(self, unit, unit_id, unit_specs):
+        self.player_index = unit.player_index
+        self.x = unit.x
+        self.y = unit.y
+        self.health = unit.health
+        self.pending_removal = unit.pending_removal
+        self.upgraded = unit.upgraded
+        self._specs = unit_specs
+        self._spec = unit._spec
+        self.id = unit_id
+        self.alive = True
+        self.target_edge = None
+        self.steps = 0
+        self._move_direction = 0
+        self._next_frame = 0
+        self._shielded_by = set()
+
+
+class ActionPhaseResult:
+    """The outcome of a simulated action phase
+
+    Attributes :
+        * frames (list): A FrameOutcome for every frame that had mobile units on the board
+        * units (list): Every unit that took part as a SimulatedUnit, indexed by id, with its state after the phase
+        * health ([float, float]): Your health and your opponent's health after the phase
+        * cores_gained ([float, float]): The cores each player earned by breaching
+        * breaches ([int, int]): The number of units of each player that reached their target edge
+
+    """
+    def __init__(self, frames, units, health, cores_gained, breaches):
+        self.frames = frames
+        self.units = units
+        self.health = health
+        self.cores_gained = cores_gained
+        self.breaches = breaches
+
+    def get_destroyed(self, player_index=None, stationary=None):
+        """Gets the units destroyed during the phase. Units that breached or self destructed are not included.
+
+        Args:
+            player_index: The owner of the units, or None for both players
+            stationary: True for firewalls only, False for mobile units only, None for both
+
+        Returns:
+            A list of SimulatedUnits in the order they were destroyed
+
+        """
+        destroyed = [self.units[unit_id] for frame in self.frames for unit_id in frame.destroyed]
+        return [unit for unit in destroyed if (player_index is None or unit.player_index == player_index)
+                and (stationary is None or unit.stationary == stationary)]
+
+    def get_attack_estimate(self, player_index=0):
+        """Summarizes the phase from the point of view of one player's attack
+
+        Args:
+            player_index: The attacking player
+
+        Returns:
+            An AttackEstimate
+
+        """
+        damage_dealt = sum(damage for frame in self.frames for attacker_id, target_id, damage in frame.attacks
+                           if self.units[attacker_id].player_index == player_index and self.units[target_id].player_index != player_index)
+        mobile_gone = sum(1 for unit in self.units if unit.player_index == player_index and not unit.stationary and not unit.alive)
+        return AttackEstimate(self.breaches[player_index], damage_dealt, len(self.get_destroyed(1 - player_index, True)),
+                              mobile_gone - self.breaches[player_index], len(self.frames))
+
+
+class ActionPhaseSimulator:
+    """Plays out the action phase of a GameState frame by frame
+
+    The GameState is left unchanged: the extra actions are applied under a savepoint that is rolled back afterwards,
+    and the simulation updates copies of the units. One simulator can run many simulations of the same GameState,
+    reusing its path finder's distance fields between them.
+
+    Attributes :
+        * game_state (:obj: GameState): The state simulations start from
+
+    """
+    def __init__(self, game_state):
+        """Sets up a simulator for a GameState
+
+        Args:
+            game_state: The GameState to simulate
+
+        """
+        self.game_state = game_state
+        self._path_finder = DynamicPathFinder()
+        self._next_steps = {}
+
+    def simulate(self, build_stacks=None, deploy_stacks=None, max_frames=MAX_FRAMES, on_frame=None):
+        """Simulates the action phase that follows the given actions
+
+        Units already on game_state.game_map take part as they are. This includes the units you placed this turn with
+        attempt_spawn and attempt_upgrade, so do not pass those actions again. Stacks are not checked against resources.
+
+        Args:
+            build_stacks: Optional [your actions, the enemy's actions]. Each is a list of (unit_type, x, y), as in
+                GameState's build stack, where unit_type may be a firewall, REMOVE or UPGRADE
+            deploy_stacks: Optional [your actions, the enemy's actions], lists of (unit_type, x, y) mobile units to deploy
+            max_frames: The frame after which the simulation stops even if mobile units remain
+            on_frame: Optional function called as on_frame(frame_outcome, units, health) once each frame has played out,
+                with every SimulatedUnit, alive or not, and the current [your health, enemy health]
+
+        Returns:
+            An ActionPhaseResult
+
+        """
+        game_state = self.game_state
+        with game_state.hypothetical():
+            for player_index, stack in enumerate(build_stacks or []):
+                for unit_type, x, y in stack:
+                    self.__build(unit_type, [x, y], player_index)
+            # Deployed units only exist in the simulation, so the map's walls and cached paths are left alone
+            deployed = []
+            for player_index, stack in enumerate(deploy_stacks or []):
+                for unit_type, x, y in stack:
+                    if self.__can_deploy(unit_type, [x, y], player_index):
+                        deployed.append(GameUnit(unit_type, game_state.unit_specs, player_index, None, x, y))
+
+            self._path_finder.begin_dynamic(game_state)
+            self._next_steps.clear()
+            try:
+                return self.__run(game_state.game_map.units_of() + deployed, max_frames, on_frame)
+            finally:
+                self._path_finder.end_dynamic()
+
+    def __build(self, unit_type, location, player_index):
+        game_state = self.game_state
+        game_map = game_state.game_map
+        types = game_state.unit_specs.types
+        on_own_half = (location[1] < game_state.HALF_ARENA) == (player_index == 0)
+        if not game_map.in_arena_bounds(location) or not on_own_half:
+            game_state.warn("Player {} cannot build at {}".format(player_index, location))
+            return
+        existing = game_state.contains_stationary_unit(location)
+        if unit_type == types[REMOVE_INDEX] or unit_type == types[UPGRADE_INDEX]:
+            if not existing or existing.player_index != player_index:
+                game_state.warn("Player {} has no firewall at {}".format(player_index, location))
+                return
+            game_map.record_tile(location)
+            if unit_type == types[REMOVE_INDEX]:
+                existing.pending_removal = True
+            elif not existing.upgraded and game_state.unit_specs.has_upgrade[existing.unit_type]:
+                existing.upgrade()
+                game_map.refresh_unit_stats(location)
+            return
+        spec = game_state.unit_specs.get(unit_type)
+        if spec is None or not spec.stationary or existing:
+            game_state.warn("Player {} cannot build {} at {}".format(player_index, unit_type, location))
+            return
+        game_map.add_unit(unit_type, location, player_index)
+
+    def __can_deploy(self, unit_type, location, player_index):
+        game_state = self.game_state
+        game_map = game_state.game_map
+        spec = game_state.unit_specs.get(unit_type)
+        edges = [game_map.BOTTOM_LEFT, game_map.BOTTOM_RIGHT] if player_index == 0 else [game_map.TOP_LEFT, game_map.TOP_RIGHT]
+        if spec is None or spec.stationary or game_map.get_location_edge(location) not in edges or game_state.contains_stationary_unit(location):
+            game_state.warn("Player {} cannot deploy {} at {}".format(player_index, unit_type, location))
+            return False
+        return True
+
+    def __run(self, starting_units, max_frames, on_frame):
+        game_state = self.game_state
+        game_map = game_state.game_map
+        mechanics = game_state.config.get("mechanics", {})
+        resources = game_state.config.get("resources", {})
+        size = game_map.ARENA_SIZE
+        center = game_state.HALF_ARENA - 0.5
+        edge_mask = game_map.geometry.edge_mask
+        edge_points = game_map.get_edges()
+        finder = self._path_finder
+        threat_field = game_map.get_threat_field()
+        hit_radius = game_state.unit_specs.hit_radius
+        shield_decay = mechanics.get("shieldDecayPerFrame", 0)
+        breach_damage = mechanics.get("basePlayerHealthDamage", 1)
+        breach_cores = resources.get("coresForPlayerDamage", 0)
+        self_destruct_steps = mechanics.get("stepsRequiredSelfDestruct", 0)
+        self_destruct_offsets = range_stencil(mechanics.get("selfDestructRadius", 0), 0)
+
+        units = [SimulatedUnit(unit, unit_id, game_state.unit_specs) for unit_id, unit in enumerate(starting_units)]
+        stationary = {}
+        towers = [{}, {}]
+        mobile = [{}, {}]
+        movers = []
+        for unit in units:
+            index = unit.x * size + unit.y
+            if unit._spec.stationary:
+                stationary[index] = towers[unit.player_index][index] = unit
+            else:
+                mobile[unit.player_index].setdefault(index, []).append(unit)
+                unit.target_edge = game_state.get_target_edge([unit.x, unit.y])
+                movers.append(unit)
+        # The encryptors covering each tile, so that only units that just arrived somewhere need checking
+        shield_cover = [{}, {}]
+        for shielder in sorted(stationary.values(), key=lambda unit: unit.id):
+            if shielder._spec.shieldPerUnit > 0 and shielder._spec.shieldRange > 0:
+                for dx, dy in range_stencil(shielder._spec.shieldRange, hit_radius):
+                    if 0 <= shielder.x + dx < size and 0 <= shielder.y + dy < size:
+                        shield_cover[shielder.player_index].setdefault((shielder.x + dx) * size + shielder.y + dy, []).append(shielder)
+        free_towers = [unit for unit in stationary.values() if unit._spec.damage_f > 0]
+
+        health = [game_state.my_health, game_state.enemy_health]
+        cores_gained = [0, 0]
+        breach_counts = [0, 0]
+        frames = []
+        frame = 0
+        arrived = movers
+        while movers and frame <= max_frames:
+            moves, shields, attacks, breaches, self_destructs, destroyed = [], [], [], [], [], []
+
+            if shield_decay:
+                for unit in movers:
+                    if unit.health > unit._spec.max_health:
+                        unit.health = max(unit._spec.max_health, unit.health - shield_decay)
+            for unit in arrived:
+                if not unit.alive:
+                    continue
+                for shielder in shield_cover[unit.player_index].get(unit.x * size + unit.y, ()):
+                    if shielder.alive and shielder.id not in unit._shielded_by:
+                        unit._shielded_by.add(shielder.id)
+                        unit.health += shielder._spec.shieldPerUnit
+                        shields.append((shielder.id, unit.id, shielder._spec.shieldPerUnit))
+            arrived = []
+
+            for unit in [unit for unit in movers if unit._next_frame == frame]:
+                if frame > 0:
+                    move = self.__next_step(unit, edge_points)
+                    if move is not None:
+                        location, unit._move_direction = move
+                        tiles = mobile[unit.player_index]
+                        tiles[unit.x * size + unit.y].remove(unit)
+                        if not tiles[unit.x * size + unit.y]:
+                            del tiles[unit.x * size + unit.y]
+                        unit.x, unit.y = location
+                        tiles.setdefault(unit.x * size + unit.y, []).append(unit)
+                        unit.steps += 1
+                        moves.append((unit.id, unit.x, unit.y))
+                        arrived.append(unit)
+
+                index = unit.x * size + unit.y
+                if edge_mask[index] - 1 == unit.target_edge:
+                    breaches.append((unit.id, unit.x, unit.y))
+                    breach_counts[unit.player_index] += 1
+                    health[1 - unit.player_index] -= breach_damage
+                    cores_gained[unit.player_index] += breach_damage * breach_cores
+                elif self.__next_step(unit, edge_points) is None:
+                    self_destructs.append((unit.id, unit.x, unit.y))
+                    if unit.steps >= self_destruct_steps:
+                        for dx, dy in self_destruct_offsets:
+                            if 0 <= unit.x + dx < size and 0 <= unit.y + dy < size:
+                                target = stationary.get((unit.x + dx) * size + unit.y + dy)
+                                if target is not None and target.player_index != unit.player_index:
+                                    target.health -= unit._spec.max_health
+                                    attacks.append((unit.id, target.id, unit._spec.max_health))
+                else:
+                    speed = unit._spec.speed
+                    unit._next_frame = math.ceil(round((unit.steps + 1) / speed, 6)) if speed > 0 else max_frames + 1
+                    continue
+                unit.alive = False
+                mobile[unit.player_index][index].remove(unit)
+                if not mobile[unit.player_index][index]:
+                    del mobile[unit.player_index][index]
+            movers = [unit for unit in movers if unit.alive]
+
+            # Towers that only hit mobile units are looked up through the threat field's coverage of the units' tiles
+            active = {tower.id: tower for tower in free_towers if tower.alive}
+            for player_index in [0, 1]:
+                for index in mobile[player_index]:
+                    for tower_location in threat_field.attacker_locations(divmod(index, size), player_index):
+                        tower = stationary.get(tower_location[0] * size + tower_location[1])
+                        if tower is not None:
+                            active[tower.id] = tower
+            attackers = sorted(active.values(), key=lambda attacker: attacker.id)
+            attackers.extend(unit for unit in movers if unit._spec.damage_f > 0 or unit._spec.damage_i > 0)
+            # The weakest mobile unit of each tile is the one targeted there, as in get_targets
+            weakest = [{index: min(tile_units, key=lambda unit: unit.health) for index, tile_units in tiles.items()} for tiles in mobile]
+            hits = []
+            chosen = {}
+            for attacker in attackers:
+                spec = attacker._spec
+                key = (attacker.player_index, attacker.x, attacker.y, spec.attackRange, spec.damage_i > 0, spec.damage_f > 0)
+                if key not in chosen:
+                    target = None
+                    for tiles, damage in [(weakest[1 - attacker.player_index], spec.damage_i), (towers[1 - attacker.player_index], spec.damage_f)]:
+                        if damage > 0:
+                            target = nearest_target(attacker.x, attacker.y, attacker.player_index, spec.attackRange, hit_radius, [tiles], size, center)
+                            if target is not None:
+                                break
+                    chosen[key] = target
+                target = chosen[key]
+                if target is not None:
+                    hits.append((attacker, target, spec.damage_f if target._spec.stationary else spec.damage_i))
+            for attacker, target, damage in hits:
+                target.health -= damage
+                attacks.append((attacker.id, target.id, damage))
+
+            for _, target_id, _ in attacks:
+                target = units[target_id]
+                if target.alive and target.health <= 0:
+                    target.alive = False
+                    destroyed.append(target_id)
+                    index = target.x * size + target.y
+                    if target._spec.stationary:
+                        del stationary[index]
+                        del towers[target.player_index][index]
+                        finder.remove_wall([target.x, target.y])
+                        self._next_steps.clear()
+                    else:
+                        mobile[target.player_index][index].remove(target)
+                        if not mobile[target.player_index][index]:
+                            del mobile[target.player_index][index]
+            if destroyed:
+                movers = [unit for unit in movers if unit.alive]
+
+            frames.append(FrameOutcome(frame, moves, shields, attacks, breaches, self_destructs, destroyed))
+            if on_frame is not None:
+                on_frame(frames[-1], units, list(health))
+            frame += 1
+        return ActionPhaseResult(frames, units, health, cores_gained, breach_counts)
+
+    def __next_step(self, unit, edge_points):
+        """
+        Gets the next move of a unit, or None if it cannot move on from its location, either because it reached
+        the end of its path or because it is stuck, for example on a tile it shares with a firewall.
+        Units on the same tile heading the same way share the result until a firewall is destroyed.
+        """
+        key = (unit.x, unit.y, unit._move_direction, unit.target_edge)
+        if key in self._next_steps:
+            return self._next_steps[key]
+        location = [unit.x, unit.y]
+        move = self._path_finder.next_step(location, unit._move_direction, edge_points[unit.target_edge])
+        if move is not None and move[0] == location:
+            move = None
+        self._next_steps[key] = move
+        return move
@@ -1,11 +1,24 @@
 import unittest
+import copy
+import itertools
 import json
+import math
+import os
+import random
+import tempfile
+import time
+from unittest import mock
+from . import array_map, game_state
 from .game_state import GameState
-from .unit import GameUnit
+from .unit import GameUnit, UnitSpecs
+from .navigation import ShortestPathFinder, ArrayPathFinder
+from .parallel import get_process_pool, run_parallel, shutdown_process_pool
+from .replay import ActionFrameRecorder, UnitDifference, compare_recordings
+from .util import parse_json
 
 class BasicTests(unittest.TestCase):
 
-    def make_turn_0_map(self):
+    def make_turn_0_map(self, array_map=False):
         config = """
         {
             "debug":{
@@ -19,72 +32,88 @@ class BasicTests(unittest.TestCase):
             },
             "unitInformation":[
                 {
-                "damage":0.0,
-                "cost":1,
+                "unitCategory":0,
+                "cost1":1.0,
                 "getHitRadius":0.51,
                 "display":"Filter",
-                "range":3.0,
                 "shorthand":"FF",
-                "stability":60.0
+                "startHealth":60.0,
+                "upgrade":{
+                    "startHealth":120.0
+                }
                 },
                 {
-                "damage":0.0,
-                "cost":4,
+                "unitCategory":0,
+                "cost1":4.0,
                 "getHitRadius":0.51,
-                "shieldAmount":10.0,
+                "shieldPerUnit":3.0,
+                "shieldRange":3.0,
                 "display":"Encryptor",
-                "range":3.0,
                 "shorthand":"EF",
-                "stability":30.0
+                "startHealth":30.0,
+                "upgrade":{
+                    "cost1":4.0,
+                    "shieldPerUnit":5.0,
+                    "shieldRange":7.0
+                }
                 },
                 {
-                "damage":4.0,
-                "cost":3,
+                "unitCategory":0,
+                "attackDamageWalker":4.0,
+                "cost1":3.0,
                 "getHitRadius":0.51,
                 "display":"Destructor",
-                "range":3.0,
+                "attackRange":3.0,
                 "shorthand":"DF",
-                "stability":75.0
+                "startHealth":75.0,
+                "upgrade":{
+                    "cost1":6.0,
+                    "attackDamageWalker":8.0,
+                    "attackRange":3.5
+                }
                 },
                 {
-                "damageI":1.0,
-                "damageToPlayer":1.0,
-                "cost":1.0,
+                "unitCategory":1,
+                "attackDamageWalker":1.0,
+                "attackDamageTower":1.0,
+                "cost2":1.0,
                 "getHitRadius":0.51,
-                "damageF":1.0,
                 "display":"Ping",
-                "range":3.0,
+                "attackRange":3.0,
                 "shorthand":"PI",
-                "stability":15.0,
+                "startHealth":15.0,
                 "speed":0.5
                 },
                 {
-                "damageI":3.0,
-                "damageToPlayer":1.0,
-                "cost":3.0,
+                "unitCategory":1,
+                "attackDamageWalker":3.0,
+                "attackDamageTower":3.0,
+                "cost2":3.0,
                 "getHitRadius":0.51,
-                "damageF":3.0,
                 "display":"EMP",
-                "range":5.0,
+                "attackRange":5.0,
                 "shorthand":"EI",
-                "stability":5.0,
+                "startHealth":5.0,
                 "speed":0.25
                 },
                 {
-                "damageI":10.0,
-                "damageToPlayer":1.0,
-                "cost":1.0,
+                "unitCategory":1,
+                "attackDamageWalker":10.0,
+                "cost2":1.0,
                 "getHitRadius":0.51,
-                "damageF":0.0,
                 "display":"Scrambler",
-                "range":3.0,
+                "attackRange":3.0,
                 "shorthand":"SI",
-                "stability":40.0,
+                "startHealth":40.0,
                 "speed":0.25
                 },
                 {
                 "display":"Remove",
                 "shorthand":"RM"
+                },
+                {
+                "display":"Upgrade",
+                "shorthand":"UP"
                 }
             ],
             "timingAndReplay":{
@@ -128,7 +157,7 @@ class BasicTests(unittest.TestCase):
         """
         turn_0 = """{"p2Units":[[],[],[],[],[],[],[]],"turnInfo":[0,0,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[],[],[],[],[],[],[]],"p2Stats":[30.0,25.0,5.0,0],"events":{"selfDestruct":[],"breach":[],"damage":[],"shield":[],"move":[],"spawn":[],"death":[],"attack":[],"melee":[]}}"""
         
-        state = GameState(json.loads(config), turn_0)
+        state = GameState(json.loads(config), turn_0, array_map)
         state.suppress_warnings(True)
         return state
 
@@ -180,7 +209,33 @@ class BasicTests(unittest.TestCase):
         self.assertEqual(1, len(game.game_map.get_locations_in_range([13,13], 0)), "We should be in 0 range of ourself")
         self.assertEqual(37, len(game.game_map.get_locations_in_range([13,13], 3)), "Wrong number of tiles in range")
 
-    def _test_get_attackers(self):
+    def test_range_stencils(self):
+        rng = random.Random(19)
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        locations = list(game_map)
+
+        def reference(location, radius):
+            return [[i, j] for i in range(location[0] - math.ceil(radius), location[0] + math.ceil(radius) + 1)
+                for j in range(location[1] - math.ceil(radius), location[1] + math.ceil(radius) + 1)
+                if game_map.in_arena_bounds([i, j]) and game_map.distance_between_locations(location, [i, j]) < radius + 0.51]
+
+        for _ in range(200):
+            location = rng.choice(locations)
+            radius = rng.choice([0, 1, 1.5, 2.5, 3, 3.5, 4.5, 7])
+            self.assertEqual(reference(location, radius), game_map.get_locations_in_range(location, radius))
+        self.assertEqual(reference([13, 13], 3), game_map.get_locations_in_range([13.0, 13.0], 3))
+
+        centers = rng.sample(locations, 6)
+        radii = [rng.choice([2.5, 3.5]) for _ in centers]
+        expected = bytearray(game_map.ARENA_SIZE * game_map.ARENA_SIZE)
+        for center, radius in zip(centers, radii):
+            for x, y in reference(center, radius):
+                expected[x * game_map.ARENA_SIZE + y] = 1
+        self.assertEqual(expected, game_map.get_range_mask(centers, radii))
+        self.assertEqual(game_map.get_range_mask(centers, [3] * 6), game_map.get_range_mask(centers, 3))
+
+    def test_get_attackers(self):
         game = self.make_turn_0_map()
         
         self.assertEqual([], game.get_attackers([13,13], 0), "Are we being attacked by a ghost?")
@@ -195,13 +250,890 @@ class BasicTests(unittest.TestCase):
         game.game_map.add_unit("DF", [13,14], 1)
         game.game_map.add_unit("DF", [14,14], 1)
         self.assertEqual(3, len(game.get_attackers([13,13], 0)), "We should be in danger from 3 places")
+        self.assertEqual(3, game.get_attacker_count([13,13], 0))
+        game.game_map.remove_unit([13,14])
+        self.assertEqual(2, len(game.get_attackers([13,13], 0)), "A removed destructor should stop attacking")
+
+    def test_get_attackers_reference(self):
+        for array_map in [False, True]:
+            with self.subTest(array_map=array_map):
+                game = self.make_turn_0_map(array_map)
+                locations = sorted(map(tuple, game.game_map))
+
+                def reference(location, player_index):
+                    return [str(unit) for tower_location in locations for unit in game.game_map[tower_location]
+                        if unit.stationary and unit.damage_i > 0 and unit.player_index != player_index
+                        and game.game_map.distance_between_locations(location, tower_location) < unit.attackRange + 0.51]
+
+                def check(location, player_index, attacker_locations):
+                    self.assertEqual(attacker_locations, [[unit.x, unit.y] for unit in game.get_attackers(location, player_index)])
+                    for location in locations[::7]:
+                        for player_index in [0, 1]:
+                            expected = reference(location, player_index)
+                            self.assertEqual(expected, [str(unit) for unit in game.get_attackers(location, player_index)])
+                            self.assertEqual(len(expected), game.get_attacker_count(location, player_index))
+
+                for location, unit_type, player_index in [([13, 11], "DF", 0), ([11, 12], "DF", 0), ([12, 11], "FF", 0),
+                                                          ([14, 16], "DF", 1), ([13, 15], "EF", 1)]:
+                    game.game_map.add_unit(unit_type, location, player_index)
+                check([13, 13], 1, [[11, 12], [13, 11]])
+                check([13, 13], 0, [[14, 16]])
+
+                game.game_map.remove_unit([11, 12])
+                game.attempt_upgrade([13, 11])
+                game.game_map.add_unit("DF", [13, 17], 1)
+                check([13, 15], 1, [[13, 11]])
+                check([13, 13], 0, [[14, 16]])
+                with game.hypothetical():
+                    game.game_map.add_unit("DF", [16, 13], 0)
+                    game.game_map.remove_unit([14, 16])
+                    check([13, 13], 1, [[13, 11], [16, 13]])
+                    check([13, 13], 0, [])
+                check([13, 13], 1, [[13, 11]])
+                check([13, 13], 0, [[14, 16]])
+
+    def test_path_cache(self):
+        game = self.make_turn_0_map()
+        first = game.find_path_to_edge([13, 0])
+        first[0][0] = -1
+        self.assertEqual([13, 0], game.find_path_to_edge([13, 0])[0], "Cached paths should not be shared with the caller")
+        self.assertEqual(self.make_turn_0_map().find_path_to_edge([13, 0]), game.find_path_to_edge([13, 0]))
+
+        version = game.game_map.wall_version
+        game.game_map.add_unit("EI", [13, 1])
+        self.assertEqual(version, game.game_map.wall_version, "Mobile units should not change the wall layout")
+        game.game_map.add_unit("FF", [13, 1])
+        self.assertNotEqual(version, game.game_map.wall_version, "Adding a firewall should change the wall layout")
+        self.assertNotIn([13, 1], game.find_path_to_edge([13, 0]), "Path cache was not invalidated by a new firewall")
+        game.game_map.remove_unit([13, 1])
+        self.assertIn([13, 1], game.find_path_to_edge([13, 0]), "Path cache was not invalidated by a removed firewall")
+        with game.hypothetical():
+            game.game_map.add_unit("FF", [13, 1])
+            self.assertNotIn([13, 1], game.find_path_to_edge([13, 0]), "Path cache was not invalidated by a hypothetical firewall")
+        self.assertIn([13, 1], game.find_path_to_edge([13, 0]), "Path cache was not invalidated by a rollback")
+
+    def test_edge_spawn_paths(self):
+        # The reference map has the same walls but only ever answers single path queries
+        game = self.make_turn_0_map()
+        reference = self.make_turn_0_map()
+        for state in [game, reference]:
+            # Wall off the bottom rows so low starts self destruct
+            for x in range(8, 20):
+                state.game_map.add_unit("FF", [x, 5], 0)
+            state.game_map.add_unit("DF", [4, 11], 0)
+            state.game_map.add_unit("FF", [17, 3], 0)
+
+        spawn_paths = game.find_edge_spawn_paths()
+        expected_starts = game.game_map.get_edge_locations(game.game_map.BOTTOM_LEFT) + game.game_map.get_edge_locations(game.game_map.BOTTOM_RIGHT)
+        self.assertEqual(28, len(spawn_paths), "Every edge location should have an entry")
+        self.assertIsNone(spawn_paths[(17, 3)], "Blocked starts should have no path")
+        for start in expected_starts:
+            expected_path = reference.find_path_to_edge(start)
+            if expected_path is None:
+                self.assertIsNone(spawn_paths[tuple(start)])
+                continue
+            path, path_length, end_location = spawn_paths[tuple(start)]
+            self.assertEqual(expected_path, path, "Shared search disagrees with single search from {}".format(start))
+            self.assertEqual(len(path) - 1, path_length)
+            self.assertEqual(path[-1], end_location)
+        self.assertNotIn(spawn_paths[(11, 2)][2], game.game_map.get_edge_locations(game.game_map.TOP_RIGHT), "Walled in starts should self destruct")
+        self.assertIn(spawn_paths[(5, 8)][2], game.game_map.get_edge_locations(game.game_map.TOP_RIGHT), "Open starts should reach the edge")
+
+    def test_array_path_finder(self):
+        rng = random.Random(1234)
+        for density in [0.1, 0.3, 0.5]:
+            game = self.make_turn_0_map()
+            fast_game = self.make_turn_0_map()
+            fast_game.set_path_finder(ArrayPathFinder())
+            for location in game.game_map:
+                if rng.random() < density:
+                    player_index = 0 if location[1] < game.HALF_ARENA else 1
+                    game.game_map.add_unit("FF", location, player_index)
+                    fast_game.game_map.add_unit("FF", location, player_index)
+            for location in list(game.game_map):
+                self.assertEqual(game.find_path_to_edge(location), fast_game.find_path_to_edge(location),
+                    "Array pathing disagrees from {} at density {}".format(location, density))
+            self.assertEqual(game.find_edge_spawn_paths(), fast_game.find_edge_spawn_paths())
+
+    def test_incremental_path_repair(self):
+        game = self.make_turn_0_map()
+        finder = ArrayPathFinder()
+        game.set_path_finder(finder)
+        # A wall across the bottom half with a pocket above it, then gaps opened and closed in both
+        walls = {(x, 5) for x in range(8, 20)} | {(x, 9) for x in range(4, 24)} | {(3, 10), (24, 10)}
+        for location in sorted(walls):
+            game.game_map.add_unit("FF", list(location), 0)
+        game.find_edge_spawn_paths()
+        self.assertEqual({}, finder.update_walls(game), "Nothing changed yet")
+
+        for location in [[13, 5], [13, 4], [12, 5], [3, 10], [14, 9], [12, 4], [13, 5], [3, 10], [20, 16], [14, 9], [12, 5]]:
+            before = game.find_edge_spawn_paths()
+            if game.contains_stationary_unit(location):
+                game.game_map.remove_unit(location)
+                walls.remove(tuple(location))
+            else:
+                game.game_map.add_unit("FF", location, 0 if location[1] < game.HALF_ARENA else 1)
+                walls.add(tuple(location))
+            changed = finder.update_walls(game)
+            after = game.find_edge_spawn_paths()
+            expected_changed = set(start for start in after if (before[start] and before[start][0]) != (after[start] and after[start][0]))
+            self.assertEqual(expected_changed, set(changed), "Wrong paths reported as changed after toggling {}".format(location))
+
+            reference = self.make_turn_0_map()
+            reference.set_path_finder(ArrayPathFinder())
+            for x, y in walls:
+                reference.game_map.add_unit("FF", [x, y], 0)
+            self.assertEqual(reference.find_edge_spawn_paths(), after, "Repaired paths disagree with a fresh search after toggling {}".format(location))
+            for edge in range(4):
+                self.assertEqual(list(reference.get_distance_field(edge)), list(game.get_distance_field(edge)), "Repaired distance field is wrong")
+
+    def test_path_repair_several_end_sets(self):
+        game = self.make_turn_0_map()
+        finder = ArrayPathFinder()
+        game.set_path_finder(finder)
+        top_right = game.game_map.get_edge_locations(game.game_map.TOP_RIGHT)
+        top_left = game.game_map.get_edge_locations(game.game_map.TOP_LEFT)
+        to_right = finder.navigate_multiple_endpoints([13, 0], top_right, game)
+        to_left = finder.navigate_multiple_endpoints([13, 0], top_left, game)
+        wall = next(location for location in to_right[1:] if location not in to_left)
+        game.game_map.add_unit("FF", wall, 0)
+        changed = finder.update_walls(game)
+        self.assertEqual({(13, 0): finder.navigate_multiple_endpoints([13, 0], top_right, game)}, changed,
+            "Only the path to the blocked edge changed")
+        self.assertEqual(to_left, finder.navigate_multiple_endpoints([13, 0], top_left, game))
+
+    def test_wall_change_log(self):
+        game = self.make_turn_0_map()
+        finder = ArrayPathFinder()
+        game.set_path_finder(finder)
+        game_map = game.game_map
+        path = game.find_path_to_edge([13, 0])
+        start = game_map.wall_version
+        for _ in range(3 * game_map.MAX_WALL_CHANGES):
+            game_map.add_unit("FF", [13, 2])
+            game_map.remove_unit([13, 2])
+        latest = game_map.wall_changes_since(game_map.wall_version - game_map.MAX_WALL_CHANGES)
+        self.assertEqual([(13, 2)] * game_map.MAX_WALL_CHANGES, latest, "The latest wall changes should be kept")
+        self.assertIsNone(game_map.wall_changes_since(game_map.wall_version - 2 * game_map.MAX_WALL_CHANGES), "Old wall changes should be dropped")
+        self.assertIsNone(game_map.wall_changes_since(start), "Dropped changes cannot be listed")
+        recent = game_map.wall_version
+        game_map.add_unit("FF", [13, 1])
+        self.assertEqual([(13, 1)], game_map.wall_changes_since(recent))
+        game_map.remove_unit([13, 1])
+        self.assertEqual(path, game.find_path_to_edge([13, 0]), "A path finder behind the log should resync fully")
+
+    def test_evaluate_wall_placements(self):
+        rng = random.Random(7)
+        game = self.make_turn_0_map()
+        locations = list(game.game_map)
+        for location in locations:
+            if rng.random() < 0.15:
+                game.game_map.add_unit("FF", location, 0 if location[1] < game.HALF_ARENA else 1)
+        placements = [["DF", location] if not game.contains_stationary_unit(location) else ["RM", location] for location in rng.sample(locations, 40)]
+
+        def all_edge_paths(state):
+            paths = {}
+            for edge in range(4):
+                for start in state.game_map.get_edge_locations(edge):
+                    paths[tuple(start)] = state.find_path_to_edge(start)
+            return paths
+
+        def summary(state, start, path):
+            target_edge = state.game_map.get_edge_locations(state.get_target_edge(start))
+            return path and (len(path) - 1, path[-1], path[-1] not in target_edge)
+
+        game.set_path_finder(ArrayPathFinder())
+        before = all_edge_paths(game)
+        version = game.game_map.wall_version
+        impacts = game.evaluate_wall_placements(placements, processes=1)
+        self.assertEqual(len(placements), len(impacts))
+        for (unit_type, location), impact in zip(placements, impacts):
+            x, y = location
+            units = game.game_map[x, y]
+            if unit_type == "RM":
+                game.game_map.remove_unit(location)
+            else:
+                game.game_map.add_unit(unit_type, location, 0 if y < game.HALF_ARENA else 1)
+            after = all_edge_paths(game)
+            game.game_map[x, y] = units
+            expected = {start: summary(game, start, after[start]) for start in after if after[start] != before[start]}
+            self.assertEqual(expected, impact, "Wrong impact for {} at {}".format(unit_type, location))
+        self.assertEqual(before, all_edge_paths(game), "Evaluating placements should leave the map unchanged")
+        self.assertIsNone(game.evaluate_wall_placements([["PI", [13, 0]]], processes=1), "Mobile units are not placements")
+        self.assertEqual([], game.game_map[13, 0])
+        self.assertNotEqual(version, game.game_map.wall_version)
+
+        try:
+            self.assertEqual(impacts, game.evaluate_wall_placements(placements, processes=2), "Parallel evaluation disagrees with serial evaluation")
+        finally:
+            shutdown_process_pool()
+
+    def test_evaluate_attack_plans(self):
+        rng = random.Random(11)
+        game = self.make_turn_0_map()
+        for location in game.game_map.get_half_locations(1):
+            if rng.random() < 0.1:
+                game.game_map.add_unit(rng.choice(["FF", "DF"]), location, 1)
+        for location in [location for location in game.game_map.get_half_locations(1) if game.contains_stationary_unit(location)][:3]:
+            game.contains_stationary_unit(location).upgrade()
+            game.game_map.refresh_unit_stats(location)
+        game.contains_stationary_unit(location).pending_removal = True
+        edges = game.game_map.get_edge_locations(game.game_map.BOTTOM_LEFT) + game.game_map.get_edge_locations(game.game_map.BOTTOM_RIGHT)
+        plans = [[[rng.choice(["PI", "EI", "SI"]), rng.choice(edges), rng.randint(1, 5)]] for _ in range(12)]
+        plans.append([["PI", [13, 0], 3], ["EI", [14, 0], 1]])
+
+        estimates = game.evaluate_attack_plans(plans, processes=1)
+        for plan, estimate in zip(plans, estimates):
+            deploys = [(unit_type, x, y) for unit_type, (x, y), count in plan for _ in range(count)]
+            result = game.simulate_action_phase(deploy_stacks=[deploys, []])
+            self.assertEqual(result.breaches[0], estimate.breaches)
+            self.assertEqual(len(deploys) - result.breaches[0], estimate.units_lost + sum(1 for unit in result.units if unit.alive and not unit.stationary))
+            self.assertEqual(len(result.get_destroyed(1, True)), estimate.firewalls_destroyed)
+        self.assertTrue(any(estimate.damage_dealt > 0 for estimate in estimates))
+
+        self.assertEqual([None] * len(plans), game.evaluate_attack_plans(plans, time_budget=0, processes=1))
+        # Each reading of the clock is one second later, so every simulation takes a second and the budget allows three
+        with mock.patch("time.time", side_effect=itertools.count().__next__):
+            partial = game.evaluate_attack_plans(plans, time_budget=7, processes=1)
+        self.assertEqual(estimates[:3] + [None] * (len(plans) - 3), partial)
+        try:
+            self.assertEqual(estimates, game.evaluate_attack_plans(plans, processes=2), "Parallel evaluation disagrees with serial evaluation")
+        finally:
+            shutdown_process_pool()
+
+    def test_run_parallel_timeout(self):
+        try:
+            pool = get_process_pool(1)
+            self.assertEqual([1024], run_parallel(pow, [(2, 10)], 1))
+            self.assertEqual([None], run_parallel(time.sleep, [(1,)], 1, timeout=0.1))
+            self.assertIsNot(pool, get_process_pool(1), "A pool still running a timed out call should be replaced")
+            self.assertEqual([1024, 9], run_parallel(pow, [(2, 10), (3, 2)], 1, timeout=5))
+        finally:
+            shutdown_process_pool()
+
+    def test_idealness_search(self):
+        def ring(x0, y0, x1, y1):
+            return [[x, y] for x in range(x0, x1 + 1) for y in range(y0, y1 + 1) if x in (x0, x1) or y in (y0, y1)]
+
+        boards = [
+            ring(9, 2, 17, 8),  # A closed box
+            [[x, 10] for x in range(5, 23)] + [[5, y] for y in range(6, 10)] + [[22, y] for y in range(6, 10)],  # A roof open below
+            [[x, 16 - x] for x in range(1, 6)],  # A diagonal wall against the left edge
+        ]
+        for walls in boards:
+            paths = []
+            for finder in [ShortestPathFinder(), ArrayPathFinder()]:
+                game = self.make_turn_0_map()
+                game.set_path_finder(finder)
+                for location in walls:
+                    game.game_map.add_unit("FF", location, 0)
+                paths.append([game.find_path_to_edge(start) for start in game.game_map if not game.contains_stationary_unit(start)])
+            self.assertEqual(paths[0], paths[1], "Array pathing picks another most ideal tile")
+            if walls is boards[0]:
+                # Units in the box self destruct at its corner nearest their target edge
+                self.assertEqual([16, 7], game.find_path_to_edge([11, 4])[-1])
+                self.assertEqual([10, 7], game.find_path_to_edge([15, 3])[-1])
+
+    def test_threat_field(self):
+        rng = random.Random(11)
+        game = self.make_turn_0_map()
+        locations = list(game.game_map)
+
+        def reference_threat(location, player_index):
+            damage = 0
+            for tower_location in locations:
+                for unit in game.game_map[tower_location]:
+                    if unit.stationary and unit.player_index != player_index and game.game_map.distance_between_locations(location, tower_location) < unit.attackRange + 0.51:
+                        damage += unit.damage_i
+            return damage
+
+        self.assertEqual(0, game.get_threat([13, 13], 0), "Are we being attacked by a ghost?")
+        for _ in range(80):
+            location = rng.choice(locations)
+            player_index = 0 if location[1] < game.HALF_ARENA else 1
+            roll = rng.random()
+            if roll < 0.5:
+                game.game_map.add_unit(rng.choice(["DF", "DF", "FF", "EF"]), location, player_index)
+            elif roll < 0.7:
+                game.game_map.remove_unit(location)
+            elif game.contains_stationary_unit(location):
+                if player_index == 0:
+                    game.attempt_upgrade(location)
+                elif not game.game_map[location][0].upgraded:
+                    game.game_map[location][0].upgrade()
+                    game.game_map.refresh_unit_stats(location)
+        for location in locations:
+            for player_index in [0, 1]:
+                self.assertAlmostEqual(reference_threat(location, player_index), game.get_threat(location, player_index), 7,
+                    "Wrong threat at {} for player {}".format(location, player_index))
+
+        path = game.find_path_to_edge([13, 0])
+        if path:
+            self.assertAlmostEqual(sum(reference_threat(location, 0) for location in path), game.get_path_damage(path, 0))
+
+    def test_threat_field_residue(self):
+        game = self.make_turn_0_map()
+        config = copy.deepcopy(game.config)
+        config["unitInformation"][2]["attackDamageWalker"] = 0.1
+        config["unitInformation"][2]["upgrade"]["attackDamageWalker"] = 0.7
+        game = GameState(config, game.serialized_string)
+        game.game_map.get_threat_field()
+        for location in [[12, 15], [13, 16], [14, 15]]:
+            game.game_map.add_unit("DF", location, 1)
+        game.game_map[13, 16][0].upgrade()
+        game.game_map.refresh_unit_stats([13, 16])
+        self.assertEqual(0.9, round(game.get_threat([13, 14], 0), 9))
+        for location in [[13, 16], [12, 15], [14, 15]]:
+            game.game_map.remove_unit(location)
+        self.assertEqual(bytearray(len(game.game_map.get_coverage_mask(1))), game.game_map.get_coverage_mask(1))
+        self.assertTrue(all(damage == 0.0 for damage in game.game_map.get_threat_grid(0)), "Removed towers leave no damage behind")
+
+    def test_path_timeline(self):
+        game = self.make_turn_0_map()
+        path = game.find_path_to_edge([13, 0])
+        timeline, total_frames = game.get_path_timeline(path, "PI")
+        self.assertEqual([(2 * step, location) for step, location in enumerate(path)], timeline, "Pings move once every 2 frames")
+        self.assertEqual(2 * (len(path) - 1), total_frames)
+        self.assertEqual(4 * (len(path) - 1), game.get_path_timeline(path, "EI")[1], "EMPs move once every 4 frames")
+        self.assertIsNone(game.get_path_timeline(path, "FF"), "Firewalls do not move")
+        self.assertIsNone(game.get_path_timeline([], "PI"), "An empty path has no timeline")
+        game.game_map.add_unit("FF", [14, 0], 0)
+        self.assertIsNone(game.get_path_timeline(game.find_path_to_edge([14, 0]), "PI"), "A blocked start has no path to time")
+        self.assertIsNone(game.find_dynamic_path([14, 0], "PI", []), "A blocked start has no route")
+        self.assertIsNone(game.find_dynamic_path([0, 0], "PI", []), "Outside the arena there is no route")
+        game.game_map.remove_unit([14, 0])
+
+        self.assertEqual(0, game.get_timeline_damage(timeline)[-1], "No towers, no damage")
+        game.game_map.add_unit("DF", path[3], 1)
+        timeline, _ = game.get_path_timeline(game.find_path_to_edge([13, 0]), "PI")
+        damage = game.get_timeline_damage(timeline)
+        self.assertEqual(len(timeline), len(damage))
+        expected = 0
+        for (frame, location), (next_frame, _) in zip(timeline, timeline[1:]):
+            expected += game.get_threat(location) * (next_frame - frame)
+        self.assertEqual(expected, damage[-1])
+        self.assertEqual(sorted(damage), damage, "Damage should only accumulate")
+        self.assertGreater(damage[-1], 0)
+
+    def test_distance_field(self):
+        rng = random.Random(3)
+        game = self.make_turn_0_map()
+        fast_game = self.make_turn_0_map()
+        fast_game.set_path_finder(ArrayPathFinder())
+        for location in list(game.game_map):
+            if rng.random() < 0.25:
+                game.game_map.add_unit("FF", location, 0)
+                fast_game.game_map.add_unit("FF", location, 0)
+        for edge in range(4):
+            field = game.get_distance_field(edge)
+            self.assertEqual(list(field), list(fast_game.get_distance_field(edge)), "Pathfinders disagree on the distance field")
+            self.assertEqual(game.ARENA_SIZE * game.ARENA_SIZE, len(field))
+            end_points = game.game_map.get_edge_locations(edge)
+            for location in list(game.game_map):
+                pathlength = field[location[0] * game.ARENA_SIZE + location[1]]
+                if game.contains_stationary_unit(location):
+                    self.assertEqual(-1, pathlength, "Blocked tiles should have no distance")
+                    continue
+                path = game.find_path_to_edge(location, edge)
+                if path[-1] in end_points:
+                    self.assertEqual(len(path) - 1, pathlength, "Distance disagrees with the path from {}".format(location))
+                else:
+                    self.assertEqual(-1, pathlength, "Cut off tiles should have no distance")
+        self.assertEqual(-1, field[0], "Tiles outside of the arena should have no distance")
+
+    def test_dynamic_path(self):
+        game = self.make_turn_0_map()
+        # Seal the bottom rows off with a line of filters
+        for x in range(8, 20):
+            game.game_map.add_unit("FF", [x, 5], 1)
+        start = [13, 0]
+        sealed_path = game.find_path_to_edge(start)
+        self.assertEqual(game.get_path_timeline(sealed_path, "PI"), game.find_dynamic_path(start, "PI", []), "No removals should follow the static path")
+        self.assertEqual(game.get_path_timeline(sealed_path, "PI"), game.find_dynamic_path(start, "PI", [(500, [13, 5])]), "Late removals should change nothing")
+
+        timeline, total_frames = game.find_dynamic_path(start, "PI", [(0, [13, 5])])
+        game.game_map.remove_unit([13, 5])
+        self.assertEqual(game.get_path_timeline(game.find_path_to_edge(start), "PI"), (timeline, total_frames), "A removal on frame 0 should be a fresh path")
+        game.game_map.add_unit("FF", [13, 5], 1)
+
+        # Open the wall while the unit is on its way to self destruct
+        timeline, total_frames = game.find_dynamic_path(start, "PI", [(6, [16, 5])])
+        self.assertEqual(sealed_path[:4], [location for _, location in timeline[:4]], "The unit should follow its path until the wall dies")
+        self.assertIn(timeline[-1][1], game.game_map.get_edge_locations(game.game_map.TOP_RIGHT), "The unit should escape through the gap")
+        self.assertIn([16, 5], [location for _, location in timeline])
+        for (frame, location), (next_frame, next_location) in zip(timeline, timeline[1:]):
+            self.assertEqual(2, next_frame - frame)
+            self.assertEqual(1, abs(location[0] - next_location[0]) + abs(location[1] - next_location[1]), "Units move one tile at a time")
+        self.assertEqual(total_frames, timeline[-1][0])
+        self.assertEqual(sealed_path, game.find_path_to_edge(start), "Dynamic pathing should leave the walls alone")
+
+    def test_array_game_map(self):
+        rng = random.Random(13)
+        game = self.make_turn_0_map()
+        array_game = self.make_turn_0_map(array_map=True)
+        locations = list(game.game_map)
+        self.assertEqual(game.get_threat([13, 13]), array_game.get_threat([13, 13]))
+
+        for _ in range(150):
+            location = rng.choice(locations)
+            player_index = 0 if location[1] < game.HALF_ARENA else 1
+            roll = rng.random()
+            for state in [game, array_game]:
+                if roll < 0.45:
+                    state.game_map.add_unit(["DF", "DF", "FF", "EF"][int(roll * 8) % 4], location, player_index)
+                elif roll < 0.6:
+                    state.game_map.add_unit(["PI", "EI", "SI"][int(roll * 20) % 3], location, player_index)
+                elif roll < 0.75:
+                    state.game_map.remove_unit(location)
+                elif state.contains_stationary_unit(location):
+                    unit = state.game_map[location][0]
+                    if roll < 0.85 and not unit.upgraded:
+                        unit.upgrade()
+                        state.game_map.refresh_unit_stats(location)
+                    else:
+                        unit.pending_removal = True
+                        unit.health -= 7
+
+        for location in locations:
+            self.assertEqual(str(game.game_map[location]), str(array_game.game_map[location]), "Tile {} differs".format(location))
+            for unit, array_unit in zip(game.game_map[location], array_game.game_map[location]):
+                self.assertEqual((unit.stationary, unit.damage_i, unit.attackRange, unit.max_health, unit.cost),
+                    (array_unit.stationary, array_unit.damage_i, array_unit.attackRange, array_unit.max_health, array_unit.cost))
+            for player_index in [0, 1]:
+                self.assertAlmostEqual(game.get_threat(location, player_index), array_game.get_threat(location, player_index), 7)
+        for player_index in [None, 0, 1]:
+            for unit_type in [None, "DF", "PI"]:
+                self.assertEqual(game.game_map.count_units(player_index, unit_type), array_game.game_map.count_units(player_index, unit_type))
+                self.assertEqual(game.game_map.get_stationary_mask(player_index, unit_type), array_game.game_map.get_stationary_mask(player_index, unit_type))
+        for player_index in [0, 1]:
+            for damage, array_damage in zip(game.game_map.get_threat_grid(player_index), array_game.game_map.get_threat_grid(player_index)):
+                self.assertAlmostEqual(damage, array_damage, 7)
+            self.assertEqual(game.game_map.get_coverage_mask(player_index), array_game.game_map.get_coverage_mask(player_index))
+
+        self.assertEqual(game.find_path_to_edge([13, 0]), array_game.find_path_to_edge([13, 0]))
+        placements = [(rng.choice(["FF", "RM"]), location) for location in rng.sample(locations, 20)]
+        self.assertEqual(game.evaluate_wall_placements(placements, processes=1), array_game.evaluate_wall_placements(placements, processes=1))
+        for location in locations:
+            self.assertEqual(str(game.game_map[location]), str(array_game.game_map[location]), "Tile {} was not restored".format(location))
+
+    def test_array_map_queries(self):
+        game = self.make_turn_0_map(array_map=True)
+        game_map = game.game_map
+        for unit_type, location, player_index in [("DF", [13, 11], 0), ("DF", [14, 16], 1), ("FF", [3, 13], 0), ("EF", [20, 15], 1), ("DF", [12, 15], 1)]:
+            game_map.add_unit(unit_type, location, player_index)
+        game_map[12, 15][0].upgrade()
+        game_map.refresh_unit_stats([12, 15])
+        game_map.add_unit("PI", [13, 0], 0)
+        game_map.add_unit("PI", [13, 0], 0)
+        game_map.add_unit("SI", [14, 27], 1)
+
+        locations = list(game_map)
+        size = game.ARENA_SIZE
+        expected_counts = {(player_index, unit_type): sum(1 for location in locations for unit in game_map[location]
+                                                        if player_index in (None, unit.player_index) and unit_type in (None, unit.unit_type))
+                           for player_index in [None, 0, 1] for unit_type in [None, "DF", "PI"]}
+        self.assertEqual((8, 2, 2), (expected_counts[None, None], expected_counts[0, "PI"], expected_counts[1, "DF"]))
+        expected_masks = {}
+        for player_index in [None, 0, 1]:
+            for unit_type in [None, "DF", "FF"]:
+                mask = bytearray(size * size)
+                for unit in game_map.units_of(player_index, unit_type):
+                    if unit.stationary:
+                        mask[unit.x * size + unit.y] = 1
+                expected_masks[player_index, unit_type] = mask
+
+        # The plain loops always run, the NumPy operations too when NumPy is installed
+        for uses_numpy in [False, True] if array_map.numpy is not None else [False]:
+            with self.subTest(uses_numpy=uses_numpy):
+                game_map.USES_NUMPY = uses_numpy
+                for (player_index, unit_type), count in expected_counts.items():
+                    self.assertEqual(count, game_map.count_units(player_index, unit_type))
+                for (player_index, unit_type), mask in expected_masks.items():
+                    self.assertEqual(mask, game_map.get_stationary_mask(player_index, unit_type))
+                for player_index in [0, 1]:
+                    grid = game_map.get_threat_grid(player_index)
+                    for x, y in locations:
+                        self.assertAlmostEqual(game.get_threat([x, y], player_index), grid[x * size + y], 7)
+                self.assertEqual(12.0, game_map.get_threat_grid(0)[13 * size + 13], "The upgraded and plain destructors both reach [13, 13]")
+
+    def test_array_unit_copy(self):
+        game = self.make_turn_0_map(array_map=True)
+        game.game_map.add_unit("DF", [13, 11], 0)
+        game.game_map.add_unit("PI", [13, 0], 0)
+        for view in [game.game_map[13, 11][0], game.game_map[13, 0][0]]:
+            for copied in [copy.copy(view), copy.deepcopy(view)]:
+                copied.health = 1.0
+                self.assertEqual(view.max_health, view.health, "Copies should be detached from the map")
+                self.assertEqual((copied.unit_type, copied.x, copied.y, copied.damage_i), (view.unit_type, view.x, view.y, view.damage_i))
+
+    def test_array_unit_stats(self):
+        game = self.make_turn_0_map(array_map=True)
+        game.game_map.add_unit("DF", [13, 11], 0)
+        game.game_map.add_unit("PI", [13, 0], 0)
+        for location in [[13, 11], [13, 0]]:
+            view = game.game_map[location][0]
+            view.damage_i = 99
+            view.attackRange = 6.5
+            view.cost = [7, 1]
+            self.assertEqual((view.damage_i, view.attackRange, view.cost), (99, 6.5, [7, 1]))
+            self.assertEqual(99, copy.copy(view).damage_i)
+            other = game.game_map[location][0]
+            self.assertEqual(game.unit_specs.get(view.unit_type).damage_i, other.damage_i, "Setting a stat should not change other units of the type")
+            view.max_health = 200.0
+            self.assertEqual(200.0, game.game_map[location][0].max_health)
+        view = game.game_map[13, 11][0]
+        view.damage_i = 99
+        view.upgrade()
+        self.assertEqual(game.unit_specs.get("DF", True).damage_i, view.damage_i, "Upgrading should give back the shared upgraded stats")
+
+    def test_savepoint_rollback(self):
+        for array_map in [False, True]:
+            with self.subTest(array_map=array_map):
+                game = self.make_turn_0_map(array_map)
+                locations = list(game.game_map)
+                walls = [[12, 2], [14, 3], [16, 5], [11, 8]]
+                for location in walls:
+                    game.game_map.add_unit("DF", location, 0)
+                for location in [[13, 16], [15, 20]]:
+                    game.game_map.add_unit("FF", location, 1)
+                game.attempt_spawn("FF", [13, 2])
+                game.attempt_spawn("PI", [13, 0], 2)
+
+                def snapshot():
+                    return ([str(game.game_map[location]) for location in locations], game.get_resources(0), game.get_resources(1),
+                        game.find_path_to_edge([14, 0]), game.get_threat([13, 13], 1), str(game.get_attackers([13, 13], 1)))
+                before = snapshot()
+
+                outer = game.savepoint()
+                game.attempt_spawn("DF", [[10, 10], [11, 11], [17, 3]])
+                game.attempt_spawn("EI", [6, 7], 3)
+                middle = snapshot()
+                inner = game.savepoint()
+                game.attempt_upgrade(walls[:2])
+                game.attempt_remove(walls[2])
+                game.game_map.remove_unit(walls[3])
+                game.game_map.add_unit("DF", [13, 20], 1)
+                self.assertNotEqual(middle, snapshot())
+                game.rollback(inner)
+                self.assertEqual(middle, snapshot(), "Rolling back the inner savepoint should keep the outer changes")
+
+                game.savepoint()
+                game.attempt_spawn("FF", [12, 3])
+                game.release_savepoint()
+                game.rollback(outer)
+                self.assertEqual(before, snapshot(), "Rolling back the outer savepoint should undo everything")
+
+                with game.hypothetical():
+                    game.attempt_spawn("FF", [[12, 1], [15, 1]])
+                    self.assertNotEqual(before, snapshot())
+                self.assertEqual(before, snapshot())
+
+                version = game.game_map.wall_version
+                with game.hypothetical():
+                    game.attempt_upgrade(walls[0])
+                    self.assertNotEqual(before, snapshot())
+                self.assertEqual(version, game.game_map.wall_version, "Undoing an upgrade leaves the walls, and the cached paths, as they were")
+                self.assertEqual(before, snapshot())
+
+    def test_arena_geometry(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        locations = list(game_map)
+        self.assertEqual(420, len(locations))
+        self.assertEqual([13, 0], locations[0])
+        self.assertEqual([14, 27], locations[-1])
+        self.assertEqual(420 * 420, sum(1 for _ in game_map for _ in game_map), "Nested iterations should not interfere")
+        self.assertEqual(sorted(map(tuple, game_map.get_half_locations(0) + game_map.get_half_locations(1))), sorted(map(tuple, locations)))
+        self.assertTrue(all(location[1] < game.HALF_ARENA for location in game_map.get_half_locations(0)))
+        quadrants = [game_map.get_quadrant_locations(edge) for edge in [game_map.TOP_RIGHT, game_map.TOP_LEFT, game_map.BOTTOM_LEFT, game_map.BOTTOM_RIGHT]]
+        self.assertEqual(420, sum(len(quadrant) for quadrant in quadrants))
+        for edge, quadrant in enumerate(quadrants):
+            for location in game_map.get_edge_locations(edge):
+                self.assertIn(location, quadrant)
+        for x in range(-2, 30):
+            for y in range(-2, 30):
+                self.assertEqual([x, y] in locations, game_map.in_arena_bounds([x, y]))
+        self.assertTrue(game_map.in_arena_bounds([13.0, 0.0]))
+        self.assertFalse(game_map.in_arena_bounds([0.0, 0.0]))
+
+    def test_units_of(self):
+        for array_map in [False, True]:
+            with self.subTest(array_map=array_map):
+                game = self.make_turn_0_map(array_map)
+                game_map = game.game_map
+
+                def units_of(*args):
+                    return [(unit.unit_type, unit.player_index, unit.x, unit.y) for unit in game_map.units_of(*args)]
+
+                game.savepoint()
+                game_map.add_unit("DF", [13, 11], 0)
+                game_map.add_unit("FF", [5, 10], 0)
+                game_map.add_unit("DF", [10, 16], 1)
+                game_map.add_unit("PI", [13, 0], 0)
+                game_map.add_unit("PI", [13, 0], 0)
+                start = [("FF", 0, 5, 10), ("DF", 1, 10, 16), ("PI", 0, 13, 0), ("PI", 0, 13, 0), ("DF", 0, 13, 11)]
+                self.assertEqual(start, units_of())
+
+                middle = game.savepoint()
+                game_map.add_unit("DF", [14, 16], 1)
+                game_map.add_unit("SI", [14, 27], 1)
+                game_map.remove_unit([5, 10])
+                game_map[13, 11] = []
+                self.assertEqual([("DF", 1, 10, 16), ("DF", 1, 14, 16)], units_of(None, "DF"))
+                self.assertEqual([("DF", 1, 10, 16), ("DF", 1, 14, 16), ("SI", 1, 14, 27)], units_of(1))
+                self.assertEqual([("PI", 0, 13, 0), ("PI", 0, 13, 0)], units_of(0))
+                self.assertEqual([("DF", 1, 14, 16)], units_of(1, "DF", range(12, 20), [16]))
+                self.assertEqual([], units_of(0, "FF"))
+
+                game.rollback(middle)
+                self.assertEqual(start, units_of())
+                self.assertEqual([("DF", 0, 13, 11)], units_of(0, "DF"))
+                game.rollback()
+                self.assertEqual([], units_of())
+
+    def test_edges_and_spawnable_mask(self):
+        rng = random.Random(29)
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        locations = list(game_map)
+        edges = game_map.get_edges()
+        self.assertEqual([[13, 0], [12, 1]], edges[game_map.BOTTOM_LEFT][:2])
+        self.assertEqual([[14, 27], [15, 26]], edges[game_map.TOP_RIGHT][:2])
+        for location in locations:
+            expected = [edge for edge in range(4) if location in edges[edge]]
+            self.assertEqual(expected[0] if expected else None, game_map.get_location_edge(location))
+        edges[0].append([0, 0])
+        self.assertEqual(14, len(game_map.get_edge_locations(game_map.TOP_RIGHT)), "Edges handed out should be copies")
+
+        for location in rng.sample(locations, 80):
+            game_map.add_unit(rng.choice(["FF", "DF", "PI"]), location, 0 if location[1] < game.HALF_ARENA else 1)
+        for unit_type in ["FF", "DF", "EF", "PI", "EI", "SI"]:
+            mask = game.get_spawnable_mask(unit_type)
+            for x, y in locations:
+                self.assertEqual(game.can_spawn(unit_type, [x, y]), mask[x * game.ARENA_SIZE + y] == 1, "{} at {}".format(unit_type, [x, y]))
+        game.attempt_spawn("PI", [13, 0], 5)
+        self.assertEqual(0, sum(game.get_spawnable_mask("PI")))
+
+    def make_late_game_state(self, seed):
+        rng = random.Random(seed)
+        game = self.make_turn_0_map()
+        state = json.loads(game.serialized_string)
+        for player_index, key in enumerate(["p1Units", "p2Units"]):
+            units = [[] for _ in range(8)]
+            half = game.game_map.get_half_locations(player_index)
+            walls = rng.sample(half, 90)
+            for x, y in walls:
+                type_index = rng.choice([0, 0, 1, 2, 2])
+                units[type_index].append([x, y, rng.choice([0.0, 10.0, 45.5]), "{}".format(len(units[type_index]))])
+            for x, y in rng.sample(walls, 20):
+                units[rng.choice([6, 7])].append([x, y, 0.0, ""])
+            edge = game.game_map.get_edge_locations(game.game_map.BOTTOM_LEFT if player_index == 0 else game.game_map.TOP_RIGHT)
+            for x, y in rng.sample(edge, 3):
+                units[rng.choice([3, 4, 5])].append([x, y, 5.0, ""])
+            state[key] = units
+        return game.config, json.dumps(state)
+
+    def test_lazy_parser(self):
+        config, state_string = self.make_late_game_state(31)
+        game = GameState(config, state_string)
+        array_game = GameState(config, state_string, array_map=True)
+        for location in game.game_map:
+            self.assertEqual(str(game.game_map[location]), str(array_game.game_map[location]), "Tile {} differs".format(location))
+            for player_index in [0, 1]:
+                self.assertAlmostEqual(game.get_threat(location, player_index), array_game.get_threat(location, player_index), 7)
+        for player_index in [0, 1]:
+            for unit_type in [None, "DF", "PI"]:
+                self.assertEqual(str(game.game_map.units_of(player_index, unit_type)), str(array_game.game_map.units_of(player_index, unit_type)))
+        self.assertEqual(game.find_path_to_edge([13, 0]), array_game.find_path_to_edge([13, 0]))
+        self.assertEqual(json.loads(state_string), parse_json(state_string))
+        self.assertIsNot(parse_json(state_string), parse_json(state_string), "Each caller should get its own decoded state")
+        parsed_state = parse_json(state_string)
+        parsed_game = GameState(config, state_string, parsed_state=parsed_state)
+        for location in game.game_map:
+            self.assertEqual(str(game.game_map[location]), str(parsed_game.game_map[location]))
+        self.assertEqual(json.loads(state_string), parsed_state, "GameState should not modify the state it is given")
+
+    def test_get_targets(self):
+        expected = {
+            ("DF", 13, 12, 0): ("EI", 13, 14),  # The nearest mobile unit, the weaker of the two on its tile
+            ("PI", 12, 10, 0): ("EF", 10, 12),  # No mobile unit in range, the weaker of the nearest firewalls
+            ("EI", 13, 14, 1): ("PI", 12, 10),  # Mobile units before the nearer firewall
+            ("PI", 13, 14, 1): ("DF", 13, 12),
+            ("PI", 14, 14, 1): ("DF", 13, 12),
+            ("SI", 20, 16, 1): None,  # Only attacks mobile units and none are in range
+        }
+        for array_map in [False, True]:
+            with self.subTest(array_map=array_map):
+                game = self.make_turn_0_map(array_map)
+                game.game_map.add_unit("DF", [13, 12], 0)
+                game.game_map.add_unit("PI", [12, 10], 0)
+                game.game_map.add_unit("PI", [13, 14], 1)
+                game.game_map.add_unit("EI", [13, 14], 1)
+                game.game_map.add_unit("PI", [14, 14], 1, 5.0)
+                game.game_map.add_unit("FF", [14, 12], 1)
+                game.game_map.add_unit("EF", [10, 12], 1)
+                game.game_map.add_unit("FF", [20, 15], 1)
+                game.game_map.add_unit("SI", [20, 16], 1)
+
+                pairs = game.get_targets()
+                found = {(attacker.unit_type, attacker.x, attacker.y, attacker.player_index):
+                         None if target is None else (target.unit_type, target.x, target.y) for attacker, target in pairs}
+                self.assertEqual(found, expected)
+                for attacker, target in pairs:
+                    self.assertEqual(str(game.get_target(attacker)), str(target), "Different target for {}".format(attacker))
+                some = [attacker for attacker, _ in pairs][::-2]
+                self.assertEqual([attacker for attacker, _ in game.get_targets(some)], some)
+
+    def test_unit_specs(self):
+        game = self.make_turn_0_map()
+        specs = game.unit_specs
+        self.assertIs(specs, UnitSpecs.for_config(game.config), "The table should be built once per config")
+        self.assertIs(specs, UnitSpecs.for_config(json.loads(json.dumps(game.config))), "Equal configs should share a table")
+        edited = json.loads(json.dumps(game.config))
+        self.assertIs(specs, UnitSpecs.for_config(edited))
+        edited["unitInformation"][2]["attackRange"] = 4.0
+        self.assertEqual(4.0, UnitSpecs.for_config(edited).get("DF").attackRange, "Editing a config should not reuse its old table")
+        self.assertEqual(3.0, UnitSpecs.for_config(game.config).get("DF").attackRange)
+        constants = game_state.ALL_UNITS
+        self.make_turn_0_map()
+        self.assertIs(constants, game_state.ALL_UNITS, "The module constants should only be set when the unit information changes")
+        self.assertEqual(specs.firewall_types, ("FF", "EF", "DF"))
+        self.assertIsNone(specs.get("RM"))
+        for unit_type in ["FF", "EF", "DF", "PI", "EI", "SI"]:
+            info = game.config["unitInformation"][specs.type_indexes[unit_type]]
+            spec = specs.get(unit_type)
+            self.assertEqual(spec.max_health, info.get("startHealth", 0))
+            self.assertEqual(spec.speed, info.get("speed", 0))
+            self.assertEqual(game.type_cost(unit_type), [info.get("cost1", 0), info.get("cost2", 0)])
+
+            unit = GameUnit(unit_type, game.config)
+            self.assertEqual((unit.stationary, unit.damage_i, unit.attackRange, unit.cost),
+                             (spec.stationary, spec.damage_i, spec.attackRange, list(spec.cost)))
+            unit.upgrade()
+            upgraded = specs.get(unit_type, True)
+            self.assertEqual((unit.max_health, unit.damage_i, unit.attackRange, unit.shieldRange, unit.cost),
+                             (upgraded.max_health, upgraded.damage_i, upgraded.attackRange, upgraded.shieldRange, list(upgraded.cost)))
+        self.assertEqual(specs.get("DF", True).damage_i, 8)
+        self.assertEqual(game.type_cost("DF", upgrade=True), [6, 0])
+        self.assertEqual(specs.get("DF", True).cost, (9, 0))
+        self.assertEqual(game.type_cost("FF", upgrade=True), [1, 0], "Upgrades without a cost cost as much as the unit")
+
+    def test_unit_flyweight(self):
+        game = self.make_turn_0_map()
+        first = GameUnit("DF", game.config, 0, None, 3, 13)
+        second = GameUnit("DF", game.config, 1, 20.0, 24, 14)
+        self.assertFalse(hasattr(first, "__dict__"), "Units should only store their slots")
+        self.assertEqual(first.config, game.config)
+        self.assertEqual((first.unit_type, first.health, second.health), ("DF", 75.0, 20.0))
+
+        copied = copy.copy(first)
+        copied.health = 10.0
+        first.upgrade()
+        self.assertEqual((first.damage_i, first.upgraded, first.cost), (8, True, [9, 0]))
+        self.assertEqual((second.damage_i, second.upgraded), (4, False), "Upgrading a unit should not change others of its type")
+        self.assertEqual((copied.damage_i, copied.health, first.health), (4, 10.0, 75.0))
+        first.cost.append(1)
+        self.assertEqual(first.cost, [9, 0])
+
+        second.damage_i = 6
+        second.cost = [1, 2]
+        self.assertEqual((second.damage_i, second.cost), (6, [1, 2]))
+        self.assertEqual((game.unit_specs.get("DF").damage_i, GameUnit("DF", game.config).damage_i), (4, 4), "Setting a stat should not change the shared spec")
+        self.assertEqual(6, copy.copy(second).damage_i)
+        with self.assertRaises(AttributeError):
+            second.tag = "flank"
+
+    def test_project_resources(self):
+        game = self.make_turn_0_map()
+        projection = game.project_resources(20)
+        for player_index in [0, 1]:
+            for turns in range(1, 21):
+                self.assertEqual(projection[player_index][game.BITS][turns - 1], game.project_future_bits(turns, player_index))
+                self.assertEqual(projection[player_index][game.CORES][turns - 1], game.get_resource(game.CORES, player_index) + 5 * turns)
+        self.assertIs(game.project_resources(20), projection, "Projections should be cached during a turn")
+
+        spent = game.project_resources(20, [[0, 3], [0, 0]])
+        self.assertEqual(spent[0][game.BITS][4], game.project_future_bits(5, 0, game.get_resource(game.BITS) - 3))
+        self.assertLess(spent[0][game.BITS][0], projection[0][game.BITS][0])
+        self.assertEqual(spent[1], projection[1])
+        game.attempt_spawn("PI", [13, 0], 3)
+        self.assertEqual(game.project_resources(20), spent, "Spending should give the same projection as the what-if")
+
+    def test_simulate_action_phase(self):
+        game = self.make_turn_0_map()
+        game.attempt_spawn("PI", [13, 0], 2)
+        timeline, total_frames = game.get_path_timeline(game.find_path_to_edge([13, 0]), "PI")
+        board = str(game.game_map.units_of())
+
+        result = game.simulate_action_phase(build_stacks=[[("EF", 12, 2)], [("DF", 15, 16)]])
+        self.assertEqual([(frame.frame, [x, y]) for frame in result.frames for unit_id, x, y in frame.moves if unit_id == 1], timeline[1:])
+        self.assertEqual(len(result.frames), total_frames + 1)
+        self.assertEqual(result.frames[0].shields, [(0, 1, 3.0), (0, 2, 3.0)])
+        self.assertEqual((result.breaches, result.health, result.cores_gained), ([2, 0], [30, 28], [2, 0]))
+        self.assertEqual(str(game.game_map.units_of()), board, "Simulating should leave the game state unchanged")
+
+        # A tower next to the breach point kills the second wave, and breaches need the path to reach the edge
+        result = game.simulate_action_phase(build_stacks=[[], [("DF", 25, 15), ("DF", 26, 15)]], deploy_stacks=[[("PI", 13, 0)] * 2, []])
+        self.assertEqual(result.get_destroyed(0, False), result.units[:2] + result.units[4:6])
+        self.assertTrue(all(damage == 4 for frame in result.frames for _, _, damage in frame.attacks if damage != 1))
+        self.assertEqual(result.breaches, [0, 0])
+
+        # Frame 0 targets are the ones get_target picks
+        rng = random.Random(41)
+        locations = list(game.game_map)
+        for location in rng.sample(locations, 120):
+            if not game.contains_stationary_unit(location) and not game.game_map.get_location_edge(location):
+                stationary = rng.random() < 0.5
+                game.game_map.add_unit(rng.choice(["FF", "DF"] if stationary else ["PI", "EI", "SI"]), location, rng.randint(0, 1))
+        units = game.game_map.units_of()
+        frame = game.simulate_action_phase(max_frames=0).frames[0]
+        self.assertGreater(len(frame.attacks), 20)
+        for attacker_id, target_id, _ in frame.attacks:
+            if attacker_id not in [unit_id for unit_id, _, _ in frame.breaches + frame.self_destructs]:
+                self.assertIs(game.get_target(units[attacker_id]), units[target_id], "Different target for {}".format(units[attacker_id]))
+
+    def make_action_frame(self, game, units, health, frame):
+        state = {"turnInfo": [1, game.turn_number, frame], "p1Stats": [health[0], 25.0, 5.0, 0], "p2Stats": [health[1], 25.0, 5.0, 0],
+                 "p1Units": [[] for _ in range(8)], "p2Units": [[] for _ in range(8)], "events": {}}
+        for unit in units:
+            entries = state["p1Units" if unit.player_index == 0 else "p2Units"][game.unit_specs.type_indexes[unit.unit_type]]
+            entries.append([unit.x, unit.y, unit.health, str(len(entries))])
+        return json.dumps(state)
+
+    def test_replay_diff(self):
+        game = self.make_turn_0_map()
+        game.attempt_spawn("PI", [13, 0], 3)
+        game.game_map.add_unit("DF", [24, 15], 1)
+        frames = [self.make_action_frame(game, game.game_map.units_of(), [30.0, 30.0], 0)]
+        game.simulate_action_phase(on_frame=lambda outcome, units, health: frames.append(
+            self.make_action_frame(game, [unit for unit in units if unit.alive], health, outcome.frame + 1)))
+        recorder = ActionFrameRecorder(game.config)
+        for frame in frames:
+            recorder.record(frame)
+        with tempfile.TemporaryDirectory() as directory:
+            recorder.save(os.path.join(directory, "game.replay"))
+            report = compare_recordings([os.path.join(directory, "game.replay")])
+        self.assertEqual((report.frame_accuracy(), report.turn_accuracy()), (1.0, 1.0))
+        self.assertEqual(report.turns[0].frames_compared, len(frames) - 1)
+
+        state = json.loads(frames[20])
+        state["p1Units"][3][0][2] -= 1
+        state["p2Stats"][0] = 29.0
+        recorder.frames[0][20] = json.dumps(state)
+        recorder.frames[0].append(frames[-1])
+        diff = compare_recordings([recorder]).turns[0]
+        self.assertEqual(diff.first_divergence, 20)
+        x, y, health = state["p1Units"][3][0][:3]
+        self.assertEqual(diff.units, [UnitDifference(0, "PI", x, y, [health + 1] * 3, [health, health + 1, health + 1])])
+        self.assertEqual(diff.health[1], (30.0, 29.0))
+        self.assertEqual(diff.frames_matching, diff.frames_compared - 1)
 
     def test_print_unit(self):
         game = self.make_turn_0_map()
 
         game.game_map.add_unit("FF", [14,13], 1)
         got_string = str(game.game_map[14,13][0])
-        expected_string = "Enemy FF, health: 60.0 location: [14, 13] "
+        expected_string = "Enemy FF, health: 60.0 location: [14, 13] removal:  upgrade: False "
         self.assertEqual(got_string, expected_string, "Expected {} from print_unit test got {} ".format(expected_string, got_string))
 
     def test_future_bits(self):
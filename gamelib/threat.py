@@ -0,0 +1,269 @@
+import math
+from array import array
+
+
+_stencils = {}
+
+
+def range_stencil(attack_range, hit_radius):
+    """Gets the offsets of every tile a unit with attack_range covers, computed once per range
+
+    Args:
+        attack_range: The range of the unit
+        hit_radius: The getHitRadius from the config
+
+    Returns:
+        A tuple of (dx, dy) offsets whose tile centers are within attack_range + hit_radius
+
+    """
+    stencil = _stencils.get((attack_range, hit_radius))
+    if stencil is None:
+        reach = attack_range + hit_radius
+        search = math.ceil(attack_range)
+        stencil = tuple((dx, dy) for dx in range(-search, search + 1) for dy in range(-search, search + 1)
+                        if math.sqrt(dx * dx + dy * dy) < reach)
+        _stencils[(attack_range, hit_radius)] = stencil
+    return stencil
+
+
+_target_rings = {}
+
+
+def target_rings(attack_range, hit_radius):
+    """Groups the offsets of range_stencil by distance, nearest first, keeping their scan order within a group
+
+    Args:
+        attack_range: The range of the unit
+        hit_radius: The getHitRadius from the config
+
+    Returns:
+        A (rings, offsets) tuple, where rings is a list of lists of (dx, dy) offsets at the same distance
+        and offsets maps each offset to its (ring, position in ring)
+
+    """
+    rings = _target_rings.get((attack_range, hit_radius))
+    if rings is None:
+        by_distance = {}
+        for dx, dy in range_stencil(attack_range, hit_radius):
+            by_distance.setdefault(dx * dx + dy * dy, []).append((dx, dy))
+        rings = [by_distance[distance] for distance in sorted(by_distance)]
+        offsets = {offset: (ring_index, order) for ring_index, ring in enumerate(rings) for order, offset in enumerate(ring)}
+        rings = _target_rings[(attack_range, hit_radius)] = (rings, offsets)
+    return rings
+
+
+def target_priority(unit, player_index, center):
+    """Orders units the same distance from an attacker the way get_target does
+
+    Args:
+        unit: A unit the attacker could target
+        player_index: The player controlling the attacker
+        center: The x coordinate of the center of the arena
+
+    Returns:
+        A tuple that is lower for the unit targeted first: the lowest health, then the lowest y (highest
+        for player 1), then the furthest from the center column
+
+    """
+    return (unit.health, unit.y if player_index == 0 else -unit.y, -abs(center - unit.x))
+
+
+def nearest_target(x, y, player_index, attack_range, hit_radius, candidates, size, center):
+    """Finds the unit an attacker at (x, y) targets among the candidates, the nearest one and then by target_priority
+
+    Scans the rings of the range, nearest first, or when there are fewer candidates than tiles
+    in range, looks each candidate up instead.
+
+    Args:
+        x, y: The location of the attacker
+        player_index: The player controlling the attacker
+        attack_range: The range of the attacker
+        hit_radius: The getHitRadius from the config
+        candidates: A list of dicts from x * size + y to the unit that would be targeted on that tile
+        size: The ARENA_SIZE
+        center: The x coordinate of the center of the arena
+
+    Returns:
+        The targeted unit, or None if no candidate is in range
+
+    """
+    rings, offsets = target_rings(attack_range, hit_radius)
+    target = None
+    if sum(len(tiles) for tiles in candidates) < len(offsets):
+        found = []
+        for tiles in candidates:
+            for index, unit in tiles.items():
+                tx, ty = divmod(index, size)
+                key = offsets.get((tx - x, ty - y))
+                if key is not None:
+                    found.append((key, unit))
+        found.sort(key=lambda item: item[0])
+        for (ring, _), unit in found:
+            if ring != found[0][0][0]:
+                break
+            if target is None or target_priority(unit, player_index, center) < target_priority(target, player_index, center):
+                target = unit
+        return target
+
+    for ring in rings:
+        for dx, dy in ring:
+            tx, ty = x + dx, y + dy
+            if not (0 <= tx < size and 0 <= ty < size):
+                continue
+            for tiles in candidates:
+                unit = tiles.get(tx * size + ty)
+                if unit is not None and (target is None or target_priority(unit, player_index, center) < target_priority(target, player_index, center)):
+                    target = unit
+        if target is not None:
+            return target
+    return None
+
+
+class ThreatField:
+    """Tracks how much damage stationary units deal each frame to mobile units on every tile.
+
+    The field is kept per defending player: a unit controlled by player_index standing on a tile takes
+    the summed attack damage of every enemy stationary unit whose range covers that tile.
+    A unit covers a tile if the tile's center is within its attackRange plus the getHitRadius,
+    the same rule get_locations_in_range uses. Upgraded units contribute their upgraded damage and range.
+
+    It also indexes which of those units cover each tile, the attackers a unit there would face.
+
+    GameMap keeps it up to date as units are added, removed or upgraded through it,
+    so reading the threat or the number of attackers on a tile is a single array lookup.
+
+    Attributes :
+        * ARENA_SIZE (int): The size of the arena
+
+    """
+    def __init__(self, game_map):
+        """Builds the field from the units currently on game_map
+
+        Args:
+            game_map: The GameMap to track
+
+        """
+        self.game_map = game_map
+        self.ARENA_SIZE = game_map.ARENA_SIZE
+        self.__hit_radius = game_map.config["unitInformation"][0].get("getHitRadius", 0)
+        self.__damage = [array('d', [0.0]) * (self.ARENA_SIZE * self.ARENA_SIZE) for _ in range(2)]
+        self.__counts = [array('i', [0]) * (self.ARENA_SIZE * self.ARENA_SIZE) for _ in range(2)]
+        self.__attackers = [{} for _ in range(2)]
+        self.__towers = {}
+        for location in list(game_map):
+            self.update_location(location)
+
+    def __apply(self, x, y, tower, sign):
+        player_index, damage, attack_range = tower
+        field = self.__damage[1 - player_index]
+        counts = self.__counts[1 - player_index]
+        attackers = self.__attackers[1 - player_index]
+        size = self.ARENA_SIZE
+        bounds_mask = self.game_map.geometry.bounds_mask
+        for dx, dy in range_stencil(attack_range, self.__hit_radius):
+            tx, ty = x + dx, y + dy
+            index = tx * size + ty
+            if 0 <= tx < size and 0 <= ty < size and bounds_mask[index]:
+                counts[index] += sign
+                # Subtracting float damages can leave a residue, so a tile nothing attacks is reset to exactly 0
+                field[index] = field[index] + sign * damage if counts[index] else 0.0
+                if sign > 0:
+                    attackers.setdefault(index, set()).add((x, y))
+                else:
+                    attackers[index].discard((x, y))
+
+    def update_location(self, location):
+        """Recomputes the contribution of the stationary unit at a location.
+        Called by GameMap whenever a stationary unit there is added, removed or upgraded.
+
+        Args:
+            location: The location that changed
+
+        """
+        x, y = int(location[0]), int(location[1])
+        old_tower = self.__towers.pop((x, y), None)
+        if old_tower is not None:
+            self.__apply(x, y, old_tower, -1)
+        for unit in self.game_map[x, y]:
+            if unit.stationary and unit.damage_i > 0 and unit.attackRange > 0 and unit.player_index in (0, 1):
+                tower = (unit.player_index, unit.damage_i, unit.attackRange)
+                self.__towers[(x, y)] = tower
+                self.__apply(x, y, tower, 1)
+
+    def damage_at(self, location, player_index=0):
+        """Gets the damage per frame a unit of the given player would take at a location
+
+        Args:
+            location: The location of a hypothetical mobile unit
+            player_index: The player controlling that unit, 0 for you 1 for the enemy
+
+        Returns:
+            The summed damage per frame of the enemy stationary units in range of the location
+
+        """
+        return self.__damage[player_index][int(location[0]) * self.ARENA_SIZE + int(location[1])]
+
+    def attacker_count(self, location, player_index=0):
+        """Gets the number of enemy stationary units that would attack a unit of the given player at a location
+
+        Args:
+            location: The location of a hypothetical mobile unit
+            player_index: The player controlling that unit, 0 for you 1 for the enemy
+
+        Returns:
+            The number of enemy stationary units in range of the location
+
+        """
+        return self.__counts[player_index][int(location[0]) * self.ARENA_SIZE + int(location[1])]
+
+    def attacker_locations(self, location, player_index=0):
+        """Gets the locations of the enemy stationary units that would attack a unit of the given player at a location
+
+        Args:
+            location: The location of a hypothetical mobile unit
+            player_index: The player controlling that unit, 0 for you 1 for the enemy
+
+        Returns:
+            A sorted list of (x, y) tuples
+
+        """
+        return sorted(self.__attackers[player_index].get(int(location[0]) * self.ARENA_SIZE + int(location[1]), ()))
+
+    def get_attacker_counts(self, player_index=0):
+        """Gets a copy of the number of attackers on every tile for a defending player
+
+        Args:
+            player_index: The player controlling the hypothetical mobile units
+
+        Returns:
+            An array of ints indexed by x * ARENA_SIZE + y, 0 outside of the arena
+
+        """
+        return array('i', self.__counts[player_index])
+
+    def path_damage(self, path, player_index=0):
+        """Gets the summed damage per frame over every location of a path
+
+        Args:
+            path: A list of locations, for example from GameState.find_path_to_edge
+            player_index: The player controlling the unit walking the path
+
+        Returns:
+            The sum of damage_at over the path
+
+        """
+        field = self.__damage[player_index]
+        size = self.ARENA_SIZE
+        return sum(field[int(x) * size + int(y)] for x, y in path)
+
+    def get_field(self, player_index=0):
+        """Gets a copy of the whole field for a defending player
+
+        Args:
+            player_index: The player controlling the hypothetical mobile units
+
+        Returns:
+            An array of floats indexed by x * ARENA_SIZE + y, 0 outside of the arena
+
+        """
+        return array('d', self.__damage[player_index])
@@ -1,3 +1,7 @@
+from collections import namedtuple
+from operator import attrgetter
+
+
 def is_stationary(unit_type, firewall_types):
     """
         Args:
@@ -9,8 +13,117 @@ def is_stationary(unit_type, firewall_types):
     return unit_type in firewall_types
 
 
+class UnitSpec(namedtuple("UnitSpec", ["unit_type", "index", "stationary", "speed", "damage_f", "damage_i", "attackRange",
+                                       "shieldRange", "max_health", "shieldPerUnit", "cost", "upgraded"])):
+    """The stats of a unit type, either as spawned or after an upgrade. Immutable, see UnitSpecs.
+
+    Attributes :
+        * unit_type (string): The shorthand of the type
+        * index (integer): The position of the type in the config's unitInformation
+        * upgraded (bool): Whether these are the upgraded stats
+        * cost ((int, int)): The total cores and bits paid for a unit with these stats, including the upgrade
+        * The other attributes match those of GameUnit
+
+    """
+    __slots__ = ()
+
+
+class UnitSpecs:
+    """Unit information from the game config, compiled once into UnitSpec tuples.
+    AlgoCore builds it when the game starts, and GameState and the map share it through for_config, which
+    returns the same table for configs with the same unitInformation. The map hands it to the GameUnits it
+    creates, so setting up a turn or a unit costs lookups instead of reading the config.
+
+    Attributes :
+        * config (JSON): The config the table was built from
+        * types (tuple): The shorthand of every entry of unitInformation, in order
+        * type_indexes (dict): Maps a shorthand to its position in unitInformation
+        * firewall_types (tuple): The shorthands of the stationary types
+        * hit_radius (float): The getHitRadius used for ranges
+        * upgrade_costs (dict): Maps a shorthand to the [cores, bits] cost of upgrading it
+        * has_upgrade (dict): Maps a shorthand to whether the config defines an upgrade for it
+
+    """
+    MAX_CACHED = 8
+    _cache = {}
+
+    def __init__(self, config):
+        """Compiles the unit information of a config
+
+        Args:
+            config (JSON): Contains information about the game
+
+        """
+        unit_information = config["unitInformation"]
+        self.config = config
+        self.types = tuple(info.get("shorthand") for info in unit_information)
+        self.type_indexes = {unit_type: index for index, unit_type in enumerate(self.types)}
+        self.firewall_types = tuple(info.get("shorthand") for info in unit_information if info.get("unitCategory") == 0)
+        self.hit_radius = unit_information[0].get("getHitRadius", 0)
+        self.upgrade_costs = {}
+        self.has_upgrade = {}
+        self.__specs = {}
+        for index, info in enumerate(unit_information):
+            if "unitCategory" not in info:
+                continue
+            unit_type = info.get("shorthand")
+            base = UnitSpec(unit_type, index, info["unitCategory"] == 0, info.get("speed", 0), info.get("attackDamageTower", 0),
+                            info.get("attackDamageWalker", 0), info.get("attackRange", 0), info.get("shieldRange", 0),
+                            info.get("startHealth", 0), info.get("shieldPerUnit", 0), (info.get("cost1", 0), info.get("cost2", 0)), False)
+            upgrade = info.get("upgrade", {})
+            upgraded = base._replace(
+                speed=upgrade.get("speed", base.speed),
+                damage_f=upgrade.get("attackDamageTower", base.damage_f),
+                damage_i=upgrade.get("attackDamageWalker", base.damage_i),
+                attackRange=upgrade.get("attackRange", base.attackRange),
+                shieldRange=upgrade.get("shieldRange", base.shieldRange),
+                max_health=upgrade.get("startHealth", base.max_health),
+                shieldPerUnit=upgrade.get("shieldPerUnit", base.shieldPerUnit),
+                cost=(upgrade.get("cost1", 0) + base.cost[0], upgrade.get("cost2", 0) + base.cost[1]),
+                upgraded=True)
+            self.__specs[unit_type] = (base, upgraded)
+            self.upgrade_costs[unit_type] = [upgrade.get("cost1", base.cost[0]), upgrade.get("cost2", base.cost[1])]
+            self.has_upgrade[unit_type] = "upgrade" in info
+
+    @classmethod
+    def for_config(cls, config):
+        """Gets the table of a config, reusing one built from a config with the same unitInformation.
+        The unitInformation is compared by content, so editing a config builds a new table.
+
+        Args:
+            config (JSON): Contains information about the game
+
+        Returns:
+            The UnitSpecs of config
+
+        """
+        key = repr(config["unitInformation"])
+        specs = cls._cache.get(key)
+        if specs is None:
+            if len(cls._cache) >= cls.MAX_CACHED:
+                cls._cache.clear()
+            specs = cls._cache[key] = cls(config)
+        return specs
+
+    def get(self, unit_type, upgraded=False):
+        """Gets the stats of a unit type
+
+        Args:
+            unit_type: The shorthand of a unit type
+            upgraded: True for the stats after an upgrade
+
+        Returns:
+            A UnitSpec, or None for types that are not units, such as the remove and upgrade markers
+
+        """
+        specs = self.__specs.get(unit_type)
+        return specs[1 if upgraded else 0] if specs is not None else None
+
+
 class GameUnit:
     """Holds information about a Unit. 
+    Only the fields that differ between units of the same type are stored on the unit,
+    the stats are read from the UnitSpec of its type and upgrade.
 
     Attributes :
         * unit_type (string): This unit's type
@@ -31,48 +144,64 @@ class GameUnit:
         * pending_removal (boolean): If this unit is marked for removal by its owner
         * upgraded (boolean): If this unit is upgraded
 
+    The stats can still be assigned: the unit then gets its own copy of its UnitSpec, and upgrade() replaces it
+    with the shared upgraded stats. unit_type and config are read only. Units use __slots__,
+    so unlike in earlier versions they cannot be given extra attributes; keep such data in a dict keyed by location instead.
+
     """
+    __slots__ = ("player_index", "x", "y", "health", "pending_removal", "upgraded", "_specs", "_spec")
+
     def __init__(self, unit_type, config, player_index=None, health=None, x=-1, y=-1):
         """ Initialize unit variables using args passed
 
+        config can also be the UnitSpecs of the config, which skips looking the table up.
         """
-        self.unit_type = unit_type
-        self.config = config
         self.player_index = player_index
         self.pending_removal = False
         self.upgraded = False
         self.x = x
         self.y = y
-        self.__serialize_type()
+        self._specs = config if isinstance(config, UnitSpecs) else UnitSpecs.for_config(config)
+        self._spec = self._specs.get(unit_type)
         self.health = self.max_health if not health else health
 
-    def __serialize_type(self):
-        from .game_state import FIREWALL_TYPES, UNIT_TYPE_TO_INDEX, ENCRYPTOR
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]]
-        self.stationary = type_config["unitCategory"] == 0
-        self.speed = type_config.get("speed", 0)
-        self.damage_f = type_config.get("attackDamageTower", 0)
-        self.damage_i = type_config.get("attackDamageWalker", 0)
-        self.attackRange = type_config.get("attackRange", 0)
-        self.shieldRange = type_config.get("shieldRange", 0)
-        self.max_health = type_config.get("startHealth", 0)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", 0)
-        self.cost = [type_config.get("cost1", 0), type_config.get("cost2", 0)]
+    def _stat(name, convert=None):
+        """A property reading a stat from the unit's UnitSpec. Setting it gives the unit its own copy of the spec"""
+        def set_stat(self, value):
+            self._spec = self._spec._replace(**{name: convert(value) if convert else value})
+        if convert:
+            return property(lambda self: list(getattr(self._spec, name)), set_stat)
+        return property(attrgetter("_spec." + name), set_stat)
 
+    # Everything that only depends on the type and upgrade is read from the shared UnitSpec
+    unit_type = property(lambda self: self._spec.unit_type)
+    config = property(lambda self: self._specs.config)
+    stationary = _stat("stationary")
+    speed = _stat("speed")
+    damage_f = _stat("damage_f")
+    damage_i = _stat("damage_i")
+    attackRange = _stat("attackRange")
+    shieldRange = _stat("shieldRange")
+    max_health = _stat("max_health")
+    shieldPerUnit = _stat("shieldPerUnit")
+    cost = _stat("cost", tuple)
+    del _stat
 
     def upgrade(self):
-        from .game_state import UNIT_TYPE_TO_INDEX
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]].get("upgrade", {})
-        self.speed = type_config.get("speed", self.speed)
-        self.damage_f = type_config.get("attackDamageTower", self.damage_f)
-        self.damage_i = type_config.get("attackDamageWalker", self.damage_i)
-        self.attackRange = type_config.get("attackRange", self.attackRange)
-        self.shieldRange = type_config.get("shieldRange", self.shieldRange)
-        self.max_health = type_config.get("startHealth", self.max_health)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", self.shieldPerUnit)
-        self.cost = [type_config.get("cost1", 0) + self.cost[0], type_config.get("cost2", 0) + self.cost[1]]
+        self._spec = self._specs.get(self.unit_type, True)
         self.upgraded = True
 
+    def __copy__(self):
+        unit = GameUnit.__new__(GameUnit)
+        unit.player_index = self.player_index
+        unit.x = self.x
+        unit.y = self.y
+        unit.health = self.health
+        unit.pending_removal = self.pending_removal
+        unit.upgraded = self.upgraded
+        unit._specs = self._specs
+        unit._spec = self._spec
+        return unit
 
     def __toString(self):
         owner = "Friendly" if self.player_index == 0 else "Enemy"
@@ -1,5 +1,14 @@
+import json
 import sys
 
+try:
+    import orjson as fast_json
+except ImportError:
+    try:
+        import ujson as fast_json
+    except ImportError:
+        fast_json = None
+
 
 BANNER_TEXT = "---------------- Starting Your Algo --------------------"
 
@@ -21,6 +30,18 @@ def get_command():
         exit()
     return ret
 
+def parse_json(string):
+    """Decodes a JSON string, with orjson or ujson if one is installed and the json module otherwise.
+
+    Args:
+        string: The JSON text, for example a game state string from the engine
+
+    Returns:
+        The decoded object
+
+    """
+    return fast_json.loads(string) if fast_json is not None else json.loads(string)
+
 def send_command(cmd):
     """Sends your turn to standard output.
     Should usually only be called by 'GameState.submit_turn()'